@@ -0,0 +1,10 @@
+"""
+Benchmarks of the pychattr attribution models.
+
+`run` times the models on the seeded synthetic customer journeys of
+`pychattr.datasets.generate_journeys` across data sizes and writes
+the timings and peak memory as JSON, and `compare` compares two such
+files to find regressions between versions.
+"""
+# Author: Jason Wolosonovich <jason@refinerynet.com>
+# License: BSD 3-clause
@@ -0,0 +1,84 @@
+"""
+Compares two benchmark result files written by `benchmarks.run`.
+
+Usage
+-----
+    python -m benchmarks.compare old.json new.json --threshold 1.1
+
+Prints the ratio new/old of every phase of the cases found in both
+files, and exits with status 1 when a phase got slower by more than
+`threshold`, or the peak memory grew by more than `threshold`.
+"""
+# Author: Jason Wolosonovich <jason@refinerynet.com>
+# License: BSD 3-clause
+
+import argparse
+import json
+import sys
+
+
+def _key(result):
+    return (result["model"], result["n_paths"],
+            json.dumps(result["data"], sort_keys=True),
+            json.dumps(result["params"], sort_keys=True))
+
+
+def compare(old, new, threshold=1.1, min_seconds=0.01):
+    """
+    Compare the results of two runs.
+
+    Returns one row per phase of every case found in both runs, as
+    (model, n_paths, phase, old, new, ratio, regressed). Phases that
+    took less than `min_seconds` in both runs are too noisy to be
+    flagged.
+    """
+    old_results = {_key(r): r for r in old["results"]}
+    rows = []
+    for result in new["results"]:
+        before = old_results.get(_key(result))
+        if before is None:
+            continue
+        measures = [(phase, before["phases"].get(phase), seconds)
+                    for phase, seconds in result["phases"].items()]
+        measures.append(("peak_rss_mb", before.get("peak_rss_mb"),
+                         result.get("peak_rss_mb")))
+        for phase, a, b in measures:
+            if a is None or b is None:
+                continue
+            ratio = b / a if a > 0 else float("inf")
+            noisy = phase != "peak_rss_mb" and max(a, b) < min_seconds
+            rows.append((result["model"], result["n_paths"], phase, a, b,
+                         ratio, ratio > threshold and not noisy))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.compare",
+        description="Compare two benchmark result files."
+    )
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=1.1)
+    parser.add_argument("--min-seconds", type=float, default=0.01)
+    args = parser.parse_args(argv)
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    rows = compare(old, new, args.threshold, args.min_seconds)
+    print(f"{'model':>9} {'n_paths':>10} {'phase':>12} {'old':>10} "
+          f"{'new':>10} {'ratio':>7}")
+    for model, n_paths, phase, a, b, ratio, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{model:>9} {n_paths:>10} {phase:>12} {a:>10.4f} "
+              f"{b:>10.4f} {ratio:>7.2f}{flag}")
+    if not rows:
+        print("No common cases.")
+    return 1 if any(row[-1] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""
+Runs the benchmarks and writes the results as JSON.
+
+Every case (model and data size) runs in a fresh process, so that its
+peak memory is measured on its own. Each model is fitted through its
+public `fit`, and timed phase by phase with the phases of its
+`fit_stats_`, e.g. parsing the paths, counting the transitions and
+simulating (or solving) for the Markov model.
+
+The results are written to `benchmarks/results/` by default.
+
+Usage
+-----
+    python -m benchmarks.run --sizes 1e3 1e4 1e5 1e6 --output new.json
+    python -m benchmarks.compare old.json new.json
+"""
+# Author: Jason Wolosonovich <jason@refinerynet.com>
+# License: BSD 3-clause
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import pychattr
+from pychattr.channel_attribution import HeuristicModel, MarkovModel
+from pychattr.channel_attribution._profiling import peak_rss_mb
+from pychattr.datasets import generate_journeys
+
+
+MODELS = ("markov", "heuristic")
+
+# the default directory of the results
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "results")
+
+
+def time_markov(df, order=1, loops=True, n_simulations=100000,
+                engine="loop", sampler="cdf", backend="python",
+                random_state=0):
+    """Fit the Markov model on `df` and return the time spent in each
+    phase, in seconds, as reported by its `fit_stats_`."""
+    model = MarkovModel(
+        "path", "conversions", null_feature="nulls",
+        revenue_feature="revenue" if "revenue" in df.columns else None,
+        k_order=order, loops=loops, n_simulations=n_simulations,
+        engine=engine, sampler=sampler, backend=backend,
+        random_state=random_state
+    )
+    model.fit(df)
+    return _fit_timings(model.fit_stats_, (
+        "n_states", "n_transitions", "n_walks", "n_steps", "n_solves"
+    ))
+
+
+def time_heuristic(df):
+    """Fit the heuristic models on `df` and return the time spent in
+    each phase, in seconds, as reported by their `fit_stats_`."""
+    model = HeuristicModel(
+        "path", "conversions",
+        revenue_feature="revenue" if "revenue" in df.columns else None,
+        cost_feature="cost"
+    )
+    model.fit(df)
+    return _fit_timings(model.fit_stats_, ("n_paths", "n_touches"))
+
+
+def _fit_timings(fit_stats, names):
+    phases = dict(fit_stats["phases"])
+    phases["total"] = fit_stats["seconds"]
+    return phases, {k: fit_stats[k] for k in names if k in fit_stats}
+
+
+def run_case(case):
+    """Generate the data of `case` and time its model, keeping the
+    fastest of `repeat` runs."""
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    df = generate_journeys(case["n_paths"], **case["data"])
+    generate = time.perf_counter() - start
+
+    runs = []
+    for _ in range(case["repeat"]):
+        if case["model"] == "markov":
+            runs.append(time_markov(df, **case["params"]))
+        else:
+            runs.append(time_heuristic(df))
+    phases, stats = min(runs, key=lambda r: r[0]["total"])
+
+    result = dict(case)
+    result.update({
+        "phases": phases,
+        "stats": stats,
+        "generate_seconds": generate,
+        "baseline_rss_mb": baseline,
+        "peak_rss_mb": peak_rss_mb()
+    })
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(pychattr.__file__)),
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """The versions and machine the benchmarks ran on."""
+    return {
+        "pychattr": pychattr.__version__,
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc)
+        .isoformat(timespec="seconds")
+    }
+
+
+def run(cases, verbose=True):
+    """Run every case in its own process and return the results."""
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for case in cases:
+        with ProcessPoolExecutor(max_workers=1,
+                                 mp_context=context) as pool:
+            result = pool.submit(run_case, case).result()
+        results.append(result)
+        if verbose:
+            phases = ", ".join(f"{k}={v:.3f}s"
+                               for k, v in result["phases"].items())
+            print(f"{case['model']:>9} n={case['n_paths']:<10} {phases} "
+                  f"peak={result['peak_rss_mb']}MB", flush=True)
+    return results
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run",
+        description="Benchmark the pychattr attribution models."
+    )
+    parser.add_argument("--models", nargs="+", choices=MODELS,
+                        default=list(MODELS))
+    parser.add_argument("--sizes", nargs="+", type=float,
+                        default=[1e3, 1e4, 1e5, 1e6, 1e7],
+                        help="the numbers of paths")
+    parser.add_argument("--channels", type=int, default=10)
+    parser.add_argument("--order", type=int, default=1,
+                        help="the order of the generated journeys and of "
+                             "the Markov model")
+    parser.add_argument("--length-distribution", default="geometric",
+                        choices=("geometric", "poisson", "uniform"))
+    parser.add_argument("--mean-length", type=float, default=4)
+    parser.add_argument("--max-length", type=int, default=50)
+    parser.add_argument("--conversion-rate", type=float, default=0.05)
+    parser.add_argument("--revenue", default="lognormal",
+                        choices=("lognormal", "constant", "none"))
+    parser.add_argument("--n-simulations", type=int, default=100000)
+    parser.add_argument("--engine", default="loop",
+                        choices=("loop", "batch", "exact"))
+    parser.add_argument("--sampler", default="cdf",
+                        choices=("cdf", "alias"))
+    parser.add_argument("--backend", default="python",
+                        choices=("python", "numba"))
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output",
+                        default=os.path.join(RESULTS_DIR,
+                                             "benchmark_results.json"))
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    data = {
+        "n_channels": args.channels,
+        "length_distribution": args.length_distribution,
+        "mean_length": args.mean_length,
+        "max_length": args.max_length,
+        "conversion_rate": args.conversion_rate,
+        "revenue_distribution": None if args.revenue == "none"
+        else args.revenue,
+        "order": args.order,
+        "random_state": args.seed
+    }
+    markov_params = {
+        "order": args.order,
+        "n_simulations": args.n_simulations,
+        "engine": args.engine,
+        "sampler": args.sampler,
+        "backend": args.backend,
+        "random_state": args.seed
+    }
+    cases = [
+        {"model": model, "n_paths": int(size), "repeat": args.repeat,
+         "data": data,
+         "params": markov_params if model == "markov" else {}}
+        for model in args.models for size in args.sizes
+    ]
+
+    results = run(cases)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)),
+                exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({"environment": environment(), "results": results}, f,
+                  indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
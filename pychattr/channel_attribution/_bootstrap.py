@@ -0,0 +1,134 @@
+"""
+Contains the helpers used to bootstrap the attribution models.
+"""
+# Author: Jason Wolosonovich <jason@refinerynet.com>
+# License: BSD 3-clause
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from ._parallel import (attach_arrays, effective_n_jobs, share_arrays,
+                        spawn_seeds)
+
+
+def distinct_rows(df, columns):
+    """
+    Collapse the identical rows of `df`.
+
+    Returns the distinct rows, restricted to `columns` and in order of
+    first appearance, and the number of rows each of them stands for.
+    """
+    gb = df.loc[:, columns].groupby(columns, sort=False, dropna=False)
+    counts = gb.size()
+    rows = counts.index.to_frame(index=False)
+    return rows, counts.values.astype(float)
+
+
+def resample(rng, multiplicity, method="poisson"):
+    """
+    Draw the bootstrap weight of each distinct row.
+
+    With "multinomial" the weights are the counts of a resample of all
+    the rows with replacement, which is what resampling the DataFrame
+    would give. With "poisson" each row is drawn independently a
+    Poisson(1) number of times, so the total number of rows varies
+    slightly between replicates.
+    """
+    if method == "poisson":
+        return rng.poisson(multiplicity).astype(float)
+    if method == "multinomial":
+        n = int(round(multiplicity.sum()))
+        return rng.multinomial(n, multiplicity / multiplicity.sum()) \
+            .astype(float)
+    raise ValueError(f"Unknown bootstrap method: {method!r}")
+
+
+_worker_state = {}
+
+
+def _init_worker(replicate, shm_name, layout, context):
+    shm, arrays = attach_arrays(shm_name, layout)
+    # keep the shared memory mapped for the life of the worker
+    _worker_state["shm"] = shm
+    _worker_state["replicate"] = replicate
+    _worker_state["arrays"] = arrays
+    _worker_state["context"] = context
+
+
+def _run_worker(seeds):
+    return _run(_worker_state["replicate"], seeds,
+                _worker_state["arrays"], _worker_state["context"])
+
+
+def _run(replicate, seeds, arrays, context):
+    return [replicate(np.random.Generator(np.random.PCG64(seed)), arrays,
+                      context)
+            for seed in seeds]
+
+
+def run_replicates(replicate, n_boot, random_state, n_jobs, arrays,
+                   context):
+    """
+    Run `n_boot` bootstrap replicates, optionally in parallel.
+
+    `replicate(rng, arrays, context)` computes one replicate. It must be
+    a module-level function so that it can be sent to the worker
+    processes, where `arrays` are mapped from shared memory. Each
+    replicate gets its own random stream spawned from `random_state`,
+    so the results do not depend on `n_jobs`.
+    """
+    seeds = spawn_seeds(random_state, n_boot)
+    n_jobs = min(effective_n_jobs(n_jobs), n_boot)
+    if n_jobs == 1:
+        return _run(replicate, seeds, arrays, context)
+
+    shm, layout = share_arrays(arrays)
+    try:
+        with ProcessPoolExecutor(
+                max_workers=n_jobs, initializer=_init_worker,
+                initargs=(replicate, shm.name, layout, context)
+        ) as pool:
+            chunks = np.array_split(np.arange(n_boot), n_jobs)
+            futures = [pool.submit(_run_worker,
+                                   [seeds[i] for i in chunk])
+                       for chunk in chunks]
+            results = [r for f in futures for r in f.result()]
+    finally:
+        shm.close()
+        shm.unlink()
+    return results
+
+
+def percentile_intervals(names, replicates, ci=0.95, name="channel_name"):
+    """
+    Percentile intervals of the bootstrap replicates.
+
+    Parameters
+    ----------
+    names: sequence of str; required.
+      The channel names.
+
+    replicates: dict; required.
+      Mapping of metric name to an array of shape (n_boot, n_channels).
+
+    ci: float; default=0.95.
+      The coverage of the intervals.
+
+    name: str; default="channel_name".
+      The name of the channel column.
+
+    Returns
+    -------
+    intervals: pandas.DataFrame; one row per channel, with the lower
+      and upper bound of each metric.
+    """
+    alpha = (1 - ci) / 2
+    intervals = pd.DataFrame({name: list(names)})
+    for metric, v in replicates.items():
+        lower, upper = np.percentile(v, [100 * alpha, 100 * (1 - alpha)],
+                                     axis=0)
+        intervals[f"{metric}_lower"] = lower
+        intervals[f"{metric}_upper"] = upper
+    return intervals
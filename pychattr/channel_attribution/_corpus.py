@@ -0,0 +1,153 @@
+"""
+Contains the encoded paths shared by the fits of several models.
+"""
+# Author: Jason Wolosonovich <jason@refinerynet.com>
+# License: BSD 3-clause
+
+import numpy as np
+
+from ._io import get_column, numeric_values
+from ._markov import path_weights
+from ._paths import (factorize_paths, factorize_tokens, path_tokens,
+                     remap_tokens, tokenize_paths)
+
+
+class PathCorpus(object):
+    """
+    The paths of a dataset, tokenized and aggregated once so that the
+    fits of several models on it do not repeat the work.
+
+    Every model's `fit` accepts a corpus in place of the dataframe; the
+    results are the same as fitting on the dataframe. The sums of the
+    features over each distinct path are computed when first needed
+    and kept for the next fits.
+
+    Parameters
+    ----------
+    df: one of {pandas.DataFrame, pyarrow.Table, dict}; required.
+      The dataframe, or dict of feature name to column, containing the
+      path data. It is not copied.
+
+    path_feature: string; required.
+      The name of the feature containing the paths, as strings or
+      pre-tokenized (see `MarkovModel`).
+
+    separator: string; default=">>>".
+      The symbol used to separate the channels in each path.
+
+    Attributes
+    ----------
+    channels: The channel names, in order of first appearance.
+
+    codes: The channels of every distinct path, concatenated, as
+      indices into `channels`.
+
+    offsets: The channels of distinct path `i` are
+      `codes[offsets[i]:offsets[i + 1]]`.
+
+    path_codes: The distinct path of every row.
+    """
+
+    def __init__(self, df, path_feature, separator=">>>"):
+        self.path_feature = path_feature
+        self.separator = separator
+        self._df = df
+
+        paths = get_column(df, path_feature)
+        tokens = path_tokens(paths)
+        # empty channel names are only dropped from parsed strings
+        self._parsed = tokens is None
+        vocabulary = {}
+        if tokens is None:
+            self.path_codes, distinct_paths = factorize_paths(paths)
+            self.codes, self.offsets, _ = tokenize_paths(
+                distinct_paths, separator, vocabulary=vocabulary,
+                keep_empty=True
+            )
+        else:
+            codes, offsets, channels = tokens
+            codes = remap_tokens(codes, channels, vocabulary)
+            self.path_codes, self.codes, self.offsets = factorize_tokens(
+                codes, offsets, len(vocabulary)
+            )
+        self.channels = list(vocabulary)
+
+        self._columns = {}
+        self._path_sums = {}
+        self._path_weights = {}
+        self._markov_tokens = None
+
+    @property
+    def n_rows(self):
+        """The number of rows."""
+        return len(self.path_codes)
+
+    @property
+    def n_paths(self):
+        """The number of distinct paths."""
+        return len(self.offsets) - 1
+
+    @property
+    def vocabulary(self):
+        """Mapping of channel name to channel code."""
+        return {channel: k for k, channel in enumerate(self.channels)}
+
+    def check(self, path_feature, separator):
+        """Raise a ValueError when the corpus was not built from the
+        paths a model expects."""
+        if path_feature != self.path_feature:
+            raise ValueError(
+                f"The corpus holds the paths of {self.path_feature!r}, "
+                f"not {path_feature!r}."
+            )
+        if self._parsed and separator != self.separator:
+            raise ValueError(
+                f"The corpus paths were split on {self.separator!r}, "
+                f"not {separator!r}."
+            )
+        return self
+
+    def column(self, name):
+        """The values of the numeric feature `name` of every row."""
+        if name not in self._columns:
+            try:
+                values = get_column(self._df, name)
+            except KeyError:
+                raise ValueError(f"The corpus has no feature {name!r}.")
+            self._columns[name] = numeric_values(values)
+        return self._columns[name]
+
+    def path_sums(self, name):
+        """The sum of the feature `name` over the rows of each distinct
+        path."""
+        if name not in self._path_sums:
+            self._path_sums[name] = np.bincount(
+                self.path_codes, weights=self.column(name),
+                minlength=self.n_paths
+            )
+        return self._path_sums[name]
+
+    def path_weights(self, conversions, nulls=None):
+        """The conversions and nulls of each distinct path as counted
+        by the Markov model, see `path_weights`."""
+        key = (conversions, nulls)
+        if key not in self._path_weights:
+            vc = self.column(conversions)
+            vn = np.zeros_like(vc) if nulls is None else self.column(nulls)
+            self._path_weights[key] = path_weights(
+                self.path_codes, self.n_paths, vc, vn
+            )
+        return self._path_weights[key]
+
+    def markov_tokens(self):
+        """The distinct paths as tokenized for the Markov model, which
+        drops the empty channel names of parsed strings."""
+        if self._markov_tokens is None:
+            codes, offsets = self.codes, self.offsets
+            if self._parsed and "" in self.channels:
+                keep = codes != self.channels.index("")
+                kept = np.zeros(len(codes) + 1, dtype=np.int64)
+                np.cumsum(keep, out=kept[1:])
+                codes, offsets = codes[keep], kept[offsets]
+            self._markov_tokens = codes, offsets
+        return self._markov_tokens
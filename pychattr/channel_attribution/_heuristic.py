@@ -4,174 +4,315 @@ Contains the model-fitting logic used for the heuristic models.
 # Author: Jason Wolosonovich <jason@refinerynet.com>
 # License: BSD 3-clause
 
-import functools
-
+import numpy as np
 import pandas as pd
 
+from ._bootstrap import (distinct_rows, percentile_intervals, resample,
+                         run_replicates)
+from ._corpus import PathCorpus
+from ._io import get_column, numeric_values
+from ._paths import (factorize_paths, factorize_tokens, path_tokens,
+                     remap_tokens, take_paths, tokenize_paths)
+from ._profiling import FitProfiler
+from ._segments import segment_ids
+from ._windows import day_numbers, windows
+
+
+def _touches(offsets, heuristic):
+    """The positions of the touches credited by `heuristic`, the path
+    each belongs to and the share of the path's credit it receives."""
+    lengths = np.diff(offsets)
+    paths = np.flatnonzero(lengths > 0)
+
+    if heuristic == "first_touch":
+        return offsets[paths], paths, np.ones(len(paths))
+    if heuristic == "last_touch":
+        return offsets[paths + 1] - 1, paths, np.ones(len(paths))
+    if heuristic == "linear_touch":
+        path_id = np.repeat(np.arange(len(lengths)), lengths)
+        return (np.arange(offsets[-1]), path_id,
+                1.0 / lengths[path_id])
+    raise ValueError(f"Unknown heuristic: {heuristic!r}")
+
+
+def attribute_heuristics(codes, offsets, heuristics, values, nchannels):
+    """
+    Credit the values of every path to its channels.
 
-def _fit_heuristics(df, heuristic, paths, conversions, revenues=None,
-                    costs=None, has_rev=False, has_cost=False):
-    """Generates the specified heuristic model using partial
-    application."""
-
-    def first_touch(d, path_f, conv_f, rev_f=None, cost_f=None,
-                    rev=False, cost=False):
-        """First-touch attribution model."""
-        results = []
-        ps = d.loc[:, path_f].values
-
-        for i, path in enumerate(ps):
-            df_ = pd.DataFrame({"channel": path})
-
-            df_.loc[0, "first_touch_conversions"] = \
-                d.loc[i, conv_f].copy()
-            df_.loc[1:, "first_touch_conversions"] = 0
-
-            if rev:
-                df_.loc[0, "first_touch_revenue"] = \
-                    d.loc[i, rev_f].copy()
-                df_.loc[1:, "first_touch_revenue"] = 0
-            if cost:
-                df_.loc[0, "first_touch_cost"] = \
-                    d.loc[i, cost_f].copy()
-                df_.loc[1:, "first_touch_cost"] = 0
-
-            results.append(df_)
-
-        # combine the results
-        df_ = pd.concat(results).reset_index(drop=True)
-
-        agg = {feature: "sum" for feature in df_.columns}.pop("channel")
-
-        # aggregate the results
-        return df_.groupby(["channel"], as_index=False).agg(agg)
-
-    def last_touch(d, path_f, conv_f, rev_f=None, cost_f=None,
-                   rev=False, cost=False):
-        """Last-touch attribution model."""
-        results = []
-        ps = d.loc[:, path_f].values
-
-        for i, path in enumerate(ps):
-            df_ = pd.DataFrame({"channel": path})
-            idx = len(path) - 1
-
-            df_.loc[idx, "last_touch_conversions"] = \
-                d.loc[i, conv_f].copy()
-            df_.loc[0: idx - 1, "last_touch_conversions"] = 0
-
-            if rev:
-                df_.loc[idx, "last_touch_revenue"] = \
-                    d.loc[i, rev_f].copy()
-                df_.loc[0: idx - 1, "last_touch_revenue"] = 0
-            if cost:
-                df_.loc[0, "last_touch_cost"] = \
-                    d.loc[i, cost_f].copy()
-                df_.loc[0: idx - 1, "last_touch_cost"] = 0
-
-            results.append(df_)
-
-            # combine the results
-        df_ = pd.concat(results).reset_index(drop=True)
-
-        agg = {feature: "sum" for feature in df_.columns}.pop("channel")
-
-        # aggregate the results
-        return df_.groupby(["channel"], as_index=False).agg(agg)
-
-    def linear_touch(d, path_f, conv_f, rev_f=None, cost_f=None,
-                     rev=False, cost=False):
-        """Linear touch attribution model."""
-        # container to hold the resulting dataframes
-        results = []
-        ps = d.loc[:, path_f].values
-
-        for i, path in enumerate(ps):
-            df_ = pd.DataFrame({"channel": path})
-
-            df_.loc[:, "linear_touch_conversions"] = \
-                d.loc[i, conv_f].copy() / len(path)
-
-            if rev:
-                df_.loc[:, "linear_touch_revenue"] = \
-                    d.loc[i, rev_f].copy() / len(path)
-
-            if cost:
-                df_.loc[:, "linear_touch_cost"] = \
-                    d.loc[i, cost_f].copy() / len(path)
+    Parameters
+    ----------
+    codes, offsets: numpy.ndarray; required.
+      The tokenized paths, as returned by `tokenize_paths`.
 
-            # append the result for aggregation later on
-            results.append(df_)
+    heuristics: list of str; required.
+      The heuristic models to compute; "ensemble" sums the others.
 
-        # combine the results
-        df_ = pd.concat(results).reset_index(drop=True)
+    values: dict; required.
+      Mapping of metric name (e.g. "conversions") to the value of each
+      path.
 
-        # columns to aggregate
-        aggs = {feature: "sum" for feature in df_.columns}.pop(
-            "channel")
+    nchannels: int; required.
+      The number of channels in the vocabulary.
 
-        return df_.groupby(["channel"], as_index=False).agg(aggs)
+    Returns
+    -------
+    credit: dict; mapping of "{heuristic}_{metric}" to the credit of
+      each channel, in vocabulary order.
+    """
+    credit = {}
+    for heuristic in heuristics:
+        if heuristic == "ensemble":
+            continue
+        positions, path_id, share = _touches(offsets, heuristic)
+        channels = codes[positions]
+        for metric, v in values.items():
+            credit[f"{heuristic}_{metric}"] = np.bincount(
+                channels, weights=v[path_id] * share, minlength=nchannels
+            )
 
-    f = functools.partial(eval(heuristic), df, paths, conversions,
-                          rev_f=revenues, cost_f=costs, rev=has_rev,
-                          cost=has_cost)
-    return f
+    if "ensemble" in heuristics:
+        models = [h for h in heuristics if h != "ensemble"]
+        for metric in values:
+            credit[f"ensemble_{metric}"] = np.sum(
+                [credit[f"{h}_{metric}"] for h in models], axis=0
+            )
+    return credit
+
+
+def _encode(df, paths, conversions, revenues, costs, sep):
+    """Tokenize the distinct paths and collect the metrics of the
+    rows; pre-tokenized paths are not parsed."""
+    tokens = path_tokens(get_column(df, paths))
+    if tokens is None:
+        path_codes, distinct_paths = factorize_paths(get_column(df, paths))
+        codes, offsets, vocabulary = tokenize_paths(distinct_paths, sep,
+                                                    keep_empty=True)
+    else:
+        codes, offsets, channels = tokens
+        vocabulary = {}
+        codes = remap_tokens(codes, channels, vocabulary)
+        path_codes, codes, offsets = factorize_tokens(codes, offsets,
+                                                      len(vocabulary))
+
+    metrics = {"conversions": numeric_values(get_column(df, conversions))}
+    if revenues:
+        metrics["revenue"] = numeric_values(get_column(df, revenues))
+    if costs:
+        metrics["cost"] = numeric_values(get_column(df, costs))
+    return path_codes, codes, offsets, vocabulary, metrics
+
+
+def _path_values(path_codes, n_paths, metrics, weights=None):
+    """Sum the metrics of the rows of each distinct path."""
+    return {
+        metric: np.bincount(path_codes,
+                            weights=v if weights is None else v * weights,
+                            minlength=n_paths)
+        for metric, v in metrics.items()
+    }
+
+
+def _credit_frame(credit, vocabulary):
+    """Arrange the credits in a DataFrame sorted by channel."""
+    channels = np.asarray(list(vocabulary.keys()), dtype=object)
+    order = np.argsort(channels, kind="stable")
+    results = pd.DataFrame({"channel": channels[order]})
+    for column, v in credit.items():
+        results[column] = v[order]
+    return results
 
 
-def _ensemble_results(d, heuristics, rev=None, cost=None):
-    """Blended version of all the selected heuristic models."""
-    df_ = d.copy()
+def fit_heuristic_models(heuristics, df, paths,
+                         conversions, revenues=None, costs=None,
+                         has_rev=False, has_cost=False, sep=">>>",
+                         profiler=None):
+    """
+    Unified interface for fitting the heuristic models; the phases are
+    timed by `profiler` when given.
+    """
+    if profiler is None:
+        profiler = FitProfiler()
+
+    if isinstance(df, PathCorpus):
+        # the paths are already tokenized, and the sums by distinct path
+        # are shared with the other fits on the corpus
+        df.check(paths, sep)
+        path_codes, codes, offsets = df.path_codes, df.codes, df.offsets
+        vocabulary = df.vocabulary
+        features = {"conversions": conversions,
+                    "revenue": revenues if has_rev else None,
+                    "cost": costs if has_cost else None}
+        with profiler.phase("parse"):
+            values = {metric: df.path_sums(feature)
+                      for metric, feature in features.items() if feature}
+    else:
+        with profiler.phase("parse"):
+            path_codes, codes, offsets, vocabulary, metrics = _encode(
+                df, paths, conversions, revenues if has_rev else None,
+                costs if has_cost else None, sep
+            )
+        values = None
+    profiler.count(n_rows=len(path_codes), n_paths=len(offsets) - 1,
+                   n_channels=len(vocabulary), n_touches=len(codes))
+
+    with profiler.phase("credit"):
+        if values is None:
+            values = _path_values(path_codes, len(offsets) - 1, metrics)
+        credit = attribute_heuristics(codes, offsets, heuristics, values,
+                                      len(vocabulary))
+
+    with profiler.phase("assemble"):
+        return _credit_frame(credit, vocabulary)
+
+
+def fit_heuristic_segments(heuristics, df, by, paths, conversions,
+                           revenues=None, costs=None, has_rev=False,
+                           has_cost=False, sep=">>>"):
+    """
+    Fit the heuristic models on every segment of `df` in one pass.
 
-    convs = []
-    # these may not be needed
-    revs = []
-    costs = []
+    The paths are tokenized once. The credits of all the segments are
+    summed together, each (segment, channel) pair being credited as a
+    channel of its own, so each segment gets the results of fitting it
+    on its own. Returns them in long format, prefixed with the segment
+    keys.
+    """
+    ids, keys = segment_ids(df, by)
+    path_codes, codes, offsets, vocabulary, metrics = _encode(
+        df, paths, conversions, revenues if has_rev else None,
+        costs if has_cost else None, sep
+    )
+    n_paths = len(offsets) - 1
+
+    # the distinct (segment, path) pairs, in order of first appearance
+    pair_codes, pairs = pd.factorize(ids * n_paths + path_codes)
+    pair_segment = pairs // n_paths
+    codes, offsets = take_paths(codes, offsets, pairs % n_paths)
+
+    # number the (segment, channel) pairs met in the paths
+    nchannels = len(vocabulary)
+    segment = np.repeat(pair_segment, np.diff(offsets))
+    keys_sc, codes = np.unique(segment * nchannels + codes,
+                               return_inverse=True)
+    values = _path_values(pair_codes, len(pairs), metrics)
+    credit = attribute_heuristics(codes.ravel(), offsets, heuristics,
+                                  values, len(keys_sc))
+
+    # sort by segment, then channel name
+    channels = np.asarray(list(vocabulary.keys()), dtype=object)
+    rank = np.empty(nchannels, dtype=np.int64)
+    rank[np.argsort(channels, kind="stable")] = np.arange(nchannels)
+    seg_of = keys_sc // nchannels
+    channel_of = keys_sc % nchannels
+    order = np.lexsort((rank[channel_of], seg_of))
+    results = keys.iloc[seg_of[order]].reset_index(drop=True)
+    results["channel"] = channels[channel_of[order]]
+    for column, v in credit.items():
+        results[column] = v[order]
+    return results
 
-    # get the features we're ensembling
-    for heuristic in heuristics:
-        convs.append(f"{heuristic}_conversions")
-        # these might not be needed
-        revs.append(f"{heuristic}_revenue")
-        costs.append(f"{heuristic}_cost")
 
-    df_.loc[:, "ensemble_conversions"] = df_.loc[:, convs].copy().sum(
-        axis=1)
+def fit_heuristic_windows(heuristics, df, dates, window, step, paths,
+                          conversions, revenues=None, costs=None,
+                          has_rev=False, has_cost=False, sep=">>>"):
+    """
+    Fit the heuristic models on every sliding window of days of `df`.
 
-    if rev:
-        df_.loc[:, "ensemble_revenue"] = df_.loc[:, revs].copy().sum(
-            axis=1)
+    The credits of every (day, channel) pair are summed in one pass,
+    and the credits of a window are the running sum of its days, each
+    window adding the day that enters it and subtracting the day that
+    leaves it. Returns them in long format, prefixed with the first and
+    last day of the window.
+    """
+    days, first = day_numbers(df.loc[:, dates])
+    n_days = int(days.max()) + 1 if len(days) else 0
+    ends, window, keys = windows(first, n_days, window, step)
+    path_codes, codes, offsets, vocabulary, metrics = _encode(
+        df, paths, conversions, revenues if has_rev else None,
+        costs if has_cost else None, sep
+    )
+    n_paths = len(offsets) - 1
+    nchannels = len(vocabulary)
+
+    # the distinct (day, path) pairs, each channel of a path being
+    # credited as the channel (day, channel)
+    pair_codes, pairs = pd.factorize(days * n_paths + path_codes)
+    codes, offsets = take_paths(codes, offsets, pairs % n_paths)
+    codes = codes + nchannels * np.repeat(pairs // n_paths,
+                                          np.diff(offsets))
+    values = _path_values(pair_codes, len(pairs), metrics)
+    credit = attribute_heuristics(codes, offsets, heuristics, values,
+                                  n_days * nchannels)
+    touches = np.bincount(codes, minlength=n_days * nchannels)
+
+    def rolling(v):
+        # the sums over the windows, as differences of running sums
+        running = np.zeros((n_days + 1, nchannels), dtype=v.dtype)
+        np.cumsum(v.reshape(n_days, nchannels), axis=0, out=running[1:])
+        return running[ends + 1] - running[ends + 1 - window]
+
+    present = rolling(touches) > 0
+    win, channel = np.nonzero(present)
+    channels = np.asarray(list(vocabulary.keys()), dtype=object)
+    rank = np.empty(nchannels, dtype=np.int64)
+    rank[np.argsort(channels, kind="stable")] = np.arange(nchannels)
+    order = np.lexsort((rank[channel], win))
+    win = win[order]
+    channel = channel[order]
+
+    results = keys.iloc[win].reset_index(drop=True)
+    results["channel"] = channels[channel]
+    for column, v in credit.items():
+        results[column] = rolling(v)[win, channel]
+    return results
 
-    if cost:
-        df_.loc[:, "ensemble_cost"] = df_.loc[:, costs].copy().sum(
-            axis=1)
 
-    return df_
+def _bootstrap_replicate(rng, arrays, context):
+    heuristics, method, nchannels = context
+    metrics = {k[len("metric."):]: v for k, v in arrays.items()
+               if k.startswith("metric.")}
+    weights = resample(rng, arrays["multiplicity"], method)
+    values = _path_values(arrays["path_codes"], len(arrays["offsets"]) - 1,
+                          metrics, weights=weights)
+    return attribute_heuristics(arrays["codes"], arrays["offsets"],
+                                heuristics, values, nchannels)
 
 
-def fit_heuristic_models(heuristics, df, paths,
-                         conversions, revenues=None, costs=None,
-                         has_rev=False, has_cost=False):
-    """
-    Unified interface for fitting the heuristic models.
+def bootstrap_heuristic_models(heuristics, df, paths, conversions,
+                               revenues=None, costs=None, has_rev=False,
+                               has_cost=False, sep=">>>", n_boot=200,
+                               ci=0.95, method="poisson",
+                               random_state=None, n_jobs=None):
     """
-    results = []
-    for heuristic in heuristics:
-        if heuristic != "ensemble":
-            model = _fit_heuristics(df, heuristic, paths, conversions,
-                                    revenues=revenues, costs=costs,
-                                    has_rev=has_rev,
-                                    has_cost=has_cost)
+    Percentile bootstrap intervals of the heuristic models.
 
-            # the results of the current model to the results dict
-            results.append(model())
-
-    # combine the results
-    results = [result.set_index("channel") for result in results]
-    results = pd.concat(results, axis=1).reset_index(drop=False)
-
-    # ensemble results
-    if "ensemble" in heuristics:
-        heuristics.pop(-1)
-        results = _ensemble_results(results, heuristics,
-                                    rev=has_rev, cost=has_cost)
-    return results
+    The rows are resampled through random weights on the distinct rows,
+    so the paths are tokenized once and each replicate only re-weights
+    and re-sums the credits.
+    """
+    columns = [paths, conversions]
+    columns += [c for c, flag in ((revenues, has_rev), (costs, has_cost))
+                if flag]
+    rows, multiplicity = distinct_rows(df, columns)
+    path_codes, codes, offsets, vocabulary, metrics = _encode(
+        rows, paths, conversions, revenues if has_rev else None,
+        costs if has_cost else None, sep
+    )
+
+    arrays = {"path_codes": path_codes, "codes": codes, "offsets": offsets,
+              "multiplicity": multiplicity}
+    arrays.update({"metric." + k: np.asarray(v, dtype=float)
+                   for k, v in metrics.items()})
+    replicates = run_replicates(
+        _bootstrap_replicate, n_boot, random_state, n_jobs, arrays,
+        (heuristics, method, len(vocabulary))
+    )
+
+    channels = np.asarray(list(vocabulary.keys()), dtype=object)
+    order = np.argsort(channels, kind="stable")
+    return percentile_intervals(
+        channels[order],
+        {k: np.asarray([r[k] for r in replicates])[:, order]
+         for k in replicates[0]},
+        ci, name="channel"
+    )
@@ -0,0 +1,122 @@
+"""
+Contains the helpers used to read path data, in chunks or straight
+from Arrow buffers.
+"""
+# Author: Jason Wolosonovich <jason@refinerynet.com>
+# License: BSD 3-clause
+
+import os
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+_PARQUET_SUFFIXES = (".parquet", ".pq")
+
+
+def iter_frames(source, columns, chunksize=1000000):
+    """
+    Iterate over the path data in chunks.
+
+    Parameters
+    ----------
+    source: one of {str, os.PathLike, pandas.DataFrame, pyarrow.Table,
+      dict, iterable}; required.
+      A path to a CSV or Parquet file, a single DataFrame, Table or
+      mapping of feature name to column, or an iterable of them.
+      Parquet files are read as pyarrow record batches.
+
+    columns: list of str; required.
+      The columns to read; the other columns of a file are skipped.
+
+    chunksize: int; default=1000000.
+      The number of rows read from a file at a time.
+
+    Yields
+    ------
+    chunk: one of {pandas.DataFrame, pyarrow.Table, pyarrow.RecordBatch,
+      dict}
+    """
+    if isinstance(source, (pd.DataFrame, Mapping)) or \
+            _is_arrow_table(source):
+        yield source
+    elif isinstance(source, (str, os.PathLike)):
+        if os.fspath(source).lower().endswith(_PARQUET_SUFFIXES):
+            yield from _iter_parquet(source, columns, chunksize)
+        else:
+            yield from pd.read_csv(source, usecols=columns,
+                                   chunksize=chunksize)
+    else:
+        for chunk in source:
+            yield chunk
+
+
+def _iter_parquet(source, columns, chunksize):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError(
+            "Reading Parquet files in chunks requires pyarrow."
+        )
+
+    parquet_file = pq.ParquetFile(source)
+    # the batches are not converted to pandas, so the paths stay in
+    # Arrow buffers
+    yield from parquet_file.iter_batches(batch_size=chunksize,
+                                         columns=columns)
+
+
+def _is_arrow_table(data):
+    return pa is not None and isinstance(data, (pa.Table, pa.RecordBatch))
+
+
+def get_column(data, name):
+    """The column `name` of a DataFrame, of a pyarrow Table or
+    RecordBatch, or of a mapping of feature name to column, without
+    copying it."""
+    if _is_arrow_table(data):
+        return data.column(name)
+    if isinstance(data, Mapping):
+        return data[name]
+    return data.loc[:, name]
+
+
+def arrow_array(values):
+    """
+    The pyarrow ChunkedArray holding `values`, or None when `values` is
+    not backed by Arrow.
+
+    pyarrow arrays and the pandas columns with an ArrowDtype or the
+    "string[pyarrow]" dtype are backed by Arrow; their buffers are
+    shared, not copied.
+    """
+    if pa is None:
+        return None
+    if isinstance(values, pa.ChunkedArray):
+        return values
+    if isinstance(values, pa.Array):
+        return pa.chunked_array([values])
+    array = getattr(values, "array", None)
+    if isinstance(array, pd.arrays.ArrowExtensionArray):
+        return array.__arrow_array__()
+    return None
+
+
+def numeric_values(values):
+    """
+    The values of a numeric column as a NumPy array.
+
+    NumPy-backed columns are returned without copying; Arrow-backed
+    columns are copied only when they are split in several chunks or
+    hold missing values.
+    """
+    chunked = arrow_array(values)
+    if chunked is not None:
+        return chunked.to_numpy()
+    return np.asarray(values)
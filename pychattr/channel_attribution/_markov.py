@@ -4,399 +4,945 @@ Contains the model-fitting logic used for the Markov model.
 # Author: Jason Wolosonovich <jason@refinerynet.com>
 # License: BSD 3-clause
 
-import math
-import collections
+import bisect
+import copy
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import numpy as np
 import pandas as pd
+from scipy import sparse
+from scipy.sparse import linalg as splinalg
+
+from . import _numba
+from ._bootstrap import (distinct_rows, percentile_intervals, resample,
+                         run_replicates)
+from ._parallel import (attach_arrays, effective_n_jobs, share_arrays,
+                        spawn_seeds, split_evenly)
+from ._io import get_column, numeric_values
+from ._paths import (factorize_paths, factorize_tokens, path_tokens,
+                     remap_tokens, take_paths, tokenize_paths)
+from ._profiling import FitProfiler
+from ._segments import long_frame, segment_ids, segment_rows
+from ._windows import day_numbers, windows
 
 
 class Fx(object):
-    """Transition Matrix."""
+    """
+    Transition Matrix.
 
-    def __init__(self, nrows, ncols):
+    The counts are stored in compressed sparse row (CSR) form: the
+    successors of row `i` are `indices[indptr[i]:indptr[i + 1]]`, kept
+    in order of first insertion, and their counts are the matching
+    slice of `data`. Memory therefore scales with the number of
+    observed transitions rather than with `nrows * ncols`.
+    """
 
-        # TODO: use scipy sparse matrices
-        self.S = np.zeros((nrows, ncols), dtype=int)
-        self.S0 = np.zeros((nrows, ncols), dtype=int)
-        self.S1 = np.zeros((nrows, ncols), dtype=int)
-        self.lrS0 = np.zeros((nrows,), dtype=int)
-        self.lrS = np.zeros((nrows,), dtype=int)
-        self.non_zeros = 0
+    def __init__(self, nrows, ncols):
+        self.indptr = np.zeros((nrows + 1,), dtype=np.int64)
+        self.indices = np.zeros((0,), dtype=np.int64)
+        self.data = np.zeros((0,), dtype=float)
+        self.S1 = np.zeros((0,), dtype=float)
+        self.lrS0 = np.zeros((nrows,), dtype=np.int64)
+        self.lrS = np.zeros((nrows,), dtype=float)
+        self.gS1 = np.zeros((0,), dtype=float)
+        self.alias_prob = None
+        self.alias_idx = None
         self.nrows = nrows
         self.ncols = ncols
 
+        # additions not yet merged into the CSR arrays
+        self._pending = []
+        self._scalars = []
+        self._indptr = None
+
+    @property
+    def non_zeros(self):
+        self._compact()
+        return len(self.indices)
+
     def add(self, ichannel_old, ichannel, vxi):
-        val0 = int(self.S[ichannel_old, ichannel])
-        if val0 == 0:
-            lval0 = self.lrS0[ichannel_old]
-            self.S0[ichannel_old, lval0] = ichannel
-            self.lrS0[ichannel_old] = lval0 + 1
-            self.non_zeros += 1
-        self.S[ichannel_old, ichannel] = val0 + vxi
+        """Add `vxi` to the count of each (ichannel_old, ichannel)
+        transition; accepts scalars or equal-length arrays."""
+        if np.ndim(ichannel_old) == 0:
+            self._scalars.append((ichannel_old, ichannel, vxi))
+        else:
+            self._flush_scalars()
+            self._pending.append((
+                np.asarray(ichannel_old, dtype=np.int64),
+                np.asarray(ichannel, dtype=np.int64),
+                np.asarray(vxi, dtype=float)
+            ))
         return self
 
-    def cum(self):
-        for i in range(self.nrows):
-            lrs0i = self.lrS0[i]
+    def _flush_scalars(self):
+        if self._scalars:
+            rows, cols, vals = zip(*self._scalars)
+            self._pending.append((
+                np.asarray(rows, dtype=np.int64),
+                np.asarray(cols, dtype=np.int64),
+                np.asarray(vals, dtype=float)
+            ))
+            self._scalars = []
+
+    def _compact(self):
+        """Merge the pending additions into the CSR arrays."""
+        self._flush_scalars()
+        if not self._pending:
+            return self
+
+        rows, cols, vals = zip(*self._pending)
+        rows = np.concatenate((self.row_indices(),) + rows)
+        cols = np.concatenate((self.indices,) + cols)
+        vals = np.concatenate((self.data,) + vals)
+        self._pending = []
+
+        ncols = max(self.ncols, 1)
+        keys, first, inverse = np.unique(rows * ncols + cols,
+                                         return_index=True,
+                                         return_inverse=True)
+        sums = np.bincount(inverse.ravel(), weights=vals,
+                           minlength=len(keys))
+
+        # group by row, keeping the successors in insertion order
+        rows = keys // ncols
+        order = np.lexsort((first, rows))
+        self.indices = (keys % ncols)[order]
+        self.data = sums[order]
+        self.indptr = np.zeros((self.nrows + 1,), dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=self.nrows),
+                  out=self.indptr[1:])
+        return self
 
-            if lrs0i > 0:
-                self.S1[i, 0] = self.S[i, self.S0[i, 0]]
-                j = 1
-                while j < lrs0i:
-                    self.S1[i, j] = self.S1[i, j - 1] + \
-                                    self.S[i, self.S0[i, j]]
+    def resize(self, nrows, ncols, col_map=None):
+        """Grow the matrix to `nrows` x `ncols`, optionally moving the
+        stored columns to `col_map[column]`."""
+        self._compact()
+        if col_map is not None:
+            self.indices = np.asarray(col_map)[self.indices]
+        self.indptr = np.concatenate((
+            self.indptr,
+            np.full((nrows - self.nrows,), self.indptr[-1], dtype=np.int64)
+        ))
+        self.nrows = nrows
+        self.ncols = ncols
+        return self
 
-                    j += 1
-                self.lrS[i] = self.S1[i, lrs0i - 1]
+    def scale(self, factor):
+        """Multiply every count by `factor`."""
+        self._compact()
+        self.data = self.data * factor
         return self
 
-    def sim(self, c, uni):
-        s0 = math.floor(uni * self.lrS[c] + 1)
-        for k in range(self.lrS0[c]):
-            if self.S1[c, k] >= s0:
-                return int(self.S0[c, k])
-        return 0
+    def row_indices(self):
+        """The row of every stored transition."""
+        return np.repeat(np.arange(self.nrows, dtype=np.int64),
+                         np.diff(self.indptr))
+
+    def cum(self, alias=False, backend="python"):
+        """
+        Prepare the rows for sampling.
+
+        With `alias=True` an alias table is also built for every row,
+        so that `sim` and `sim_batch` draw a successor in constant time
+        regardless of the number of successors of the row.
+        """
+        self._compact()
+
+        # cumulative counts within each row
+        csum = np.cumsum(self.data)
+        base = np.concatenate(([0.0], csum))[self.indptr[:-1]]
+        self.lrS0 = np.diff(self.indptr)
+        self.S1 = csum - np.repeat(base, self.lrS0)
+        self.lrS = np.concatenate(([0.0], csum))[self.indptr[1:]] - base
+
+        # cumulative probabilities offset by the row, so that the
+        # successors of many rows can be found with one searchsorted
+        rows = self.row_indices()
+        lrs = self.lrS[rows]
+        self.gS1 = rows + np.divide(self.S1, lrs,
+                                    out=np.ones_like(self.S1),
+                                    where=lrs > 0)
+
+        if alias:
+            build = _numba.alias_tables if backend == "numba" \
+                else _alias_tables
+            self.alias_prob, self.alias_idx = build(
+                self.indptr, self.indices, self.data, self.lrS
+            )
+        else:
+            self.alias_prob = self.alias_idx = None
+        self._indptr = None
+        return self
 
-    def tran_matx(self, vchannels):
-        vsm = []
-        vk = []
-        channel_from = []
-        channel_to = []
-        num_transitions = []
-        k = 0
-        for i in range(self.nrows):
-            sm3 = 0
-            # j = 0
-            for j in range(self.lrS0[i]):
-                mij = self.S[i, int(self.S0[i, j])]
-                if mij > 0:
-                    channel_from.append(vchannels[i])
-                    channel_to.append(vchannels[int(self.S0[i, j])])
-                    num_transitions.append(mij)
-                    sm3 += mij
-                    k += 1
-            vsm.append(sm3)
-            vk.append(k)
-
-        num_transitions = np.asarray(num_transitions, dtype=float)
-        vsm = np.asarray(vsm)
-        vk = np.asarray(vk)
-
-        w = 0
-
-        for k in range(self.non_zeros):
-            if k == vk[w]:
-                w += 1
-            num_transitions[k] /= vsm[w]
-
-        trans_probs = num_transitions
-        tmat_data = {
-            "channel_from": channel_from,
-            "channel_to": channel_to,
-            "transition_probability": trans_probs
+    def sampling_arrays(self):
+        """The arrays used by `sim` and `sim_batch` after `cum`."""
+        arrays = {
+            "indptr": self.indptr,
+            "indices": self.indices,
+            "S1": self.S1,
+            "lrS": self.lrS,
+            "gS1": self.gS1
         }
-        return pd.DataFrame(tmat_data)
-
-
-def fit_markov(df, paths, convs, conv_val, nulls, nsim, max_step,
-               out_more, sep, order, random_state, loops):
-    var_path = df.loc[:, paths].values.tolist()
-    conv = df.loc[:, convs].values.tolist()
-    if conv_val:
-        var_value = df.loc[:, conv_val].values.tolist()
-    else:
-        var_value = []
-    if nulls:
-        var_null = df.loc[:, nulls].values.tolist()
-    else:
-        var_null = []
-
-    if random_state:
-        np.random.seed(random_state)
-
-    # do we have revenues?
-    flg_var_value = True if len(var_value) > 0 else False
-
-    # do we have nulls?
-    flg_var_null = True if len(var_null) > 0 else False
-
-    # do we allow loops?
-    flg_equal = loops
-
-    # get the list of paths
-    vy = var_path
-
-    # get the list of conversions
-    vc = conv
-
-    if flg_var_value:
-        vv = var_value
-
-    if flg_var_null:
-        vn = var_null
-
-    # how many paths do we have?
-    lvy = len(vy)
-    l_vui = 0
-    mp_vui = collections.defaultdict(int)
-    v_vui = []
-    vui = 0.0
-    rchannels = []
-    lrchannels = j0 = z = 0
-    channel_j = ""
-
-    vchannels_sim_id = [0] * order
-    mp_channels_sim_id = {}
-
-    nchannels = 0
-    nchannels_sim = 0
-
-    vy2 = []
-
-    mp_channels = collections.defaultdict(int)
-    mp_channels_sim = {}
-    mp_npassi = {}
-    vnpassi = []
-
-    mp_channels["(start)"] = 0
-    vchannels = []
-    vchannels.append("(start)")
-    nchannels += 1
-
-    vchannels_sim = []
-
-    ##### BEGIN PROGRAM
-    # ####################################################
-    ########################################################################
-    ########################################################################
-    for z in range(order):
-        vchannels_sim_id[z] = -1
-
-    if order > 1:
-        mp_channels_sim["(start)"] = nchannels_sim
-        vchannels_sim.append("(start)")
-        vchannels_sim_id[0] = nchannels_sim
-        mp_channels_sim_id[nchannels_sim] = vchannels_sim_id.copy()
-        nchannels_sim += 1
-
-    if flg_var_value:
-        i = 0
-        for i in range(lvy):
-            if vc[i] > 0:
-                vui = vv[i] / vc[i]
-                if vui not in list(mp_vui.keys()):
-                    mp_vui[vui] = l_vui
-                    v_vui.append(vui)
-                    l_vui += 1
-            i = i + 1
-
-    for i in range(lvy):
-        s = vy[i]
-
-        s += sep[0]
-        ssize = len(s)
-        channel = ""
-        path = ""
-        j = 0
-        npassi = 0
-        rchannels = []
-
-        while j < ssize:
-            cfirst = 1
-            while s[j] != sep[0]:
-                if cfirst == 0:
-                    if s[j] != " ":
-                        end_pos = j
-                elif cfirst == 1 and s[j] != " ":
-                    cfirst = 0
-                    start_pos = j
-                    end_pos = j
-                j += 1
-
-            if cfirst == 0:
-                channel = s[start_pos:end_pos+1]
-
-                if channel not in mp_channels.keys():
-                    mp_channels[channel] = nchannels
-                    vchannels.append(channel)
-                    nchannels += 1
-
-                if order == 1:
-                    if npassi == 0:
-                        path = "0 "
-                    else:
-                        path += " "
-                    path = path + str(mp_channels[channel])
-                    npassi += 1
-                else:
-                    rchannels.append(channel)
-            channel = ""
-            j += 1
-
-        if order > 1:
-            lrchannels = len(rchannels)
-            for z in range(order):
-                vchannels_sim_id[z] = -1
-
-            if lrchannels > (order - 1):
-                npassi = lrchannels - order + 1
-
-                for k in range(npassi):
-                    channel = ""
-                    channel_j = ""
-                    z = 0
-                    j0 = k + order
-
-                    for j in range(k, j0):
-                        channel_j = rchannels[j]
-                        channel += channel_j
-                        vchannels_sim_id[z] = mp_channels[channel_j]
-                        z += 1
-
-                        if j < (j0 - 1):
-                            channel += ","
-
-                    if channel not in list(mp_channels_sim.keys()):
-                        mp_channels_sim[channel] = nchannels_sim
-                        vchannels_sim.append(channel)
-
-                        mp_channels_sim_id[nchannels_sim] = \
-                            vchannels_sim_id.copy()
-                        nchannels_sim += 1
-
-                    path += str(mp_channels_sim[channel])
-                    path += " "
-
-            else:
-                npassi = 1
-                channel = ""
-                channel_j = ""
-                for j in range(lrchannels):
-                    channel_j = rchannels[j]
-                    channel += channel_j
-                    vchannels_sim_id[j] = mp_channels[channel_j]
-                    if j < (lrchannels - 1):
-                        channel += ","
-
-                if channel not in list(mp_channels_sim.keys()):
-                    mp_channels_sim[channel] = nchannels_sim
-                    vchannels_sim.append(channel)
-                    mp_channels_sim_id[nchannels_sim] = \
-                        vchannels_sim_id.copy()
-                    nchannels_sim += 1
-                path += str(mp_channels_sim[channel])
-                path += " "
-            path = "0 " + path
-        else:  # end order > 1
-            path += " "
-        vy2.append(path + "e")
-        npassi += 1
-
-    mp_channels["(conversion)"] = nchannels
-    nchannels += 1
-    vchannels.append("(conversion)")
-
-    mp_channels["(null)"] = nchannels
-    nchannels += 1
-    vchannels.append("(null)")
-
-    if order > 1:
-        mp_channels_sim["(conversion)"] = nchannels_sim
-        vchannels_sim.append("(conversion)")
-        for z in range(order):
-            vchannels_sim_id[0] = nchannels_sim
-        mp_channels_sim_id[nchannels_sim] = vchannels_sim_id.copy()
-        nchannels_sim += 1
-
-        mp_channels_sim["(null)"] = nchannels_sim
-        vchannels_sim.append("(null)")
-        for z in range(order):
-            vchannels_sim_id[0] = nchannels_sim
-
-        mp_channels_sim_id[nchannels_sim] = vchannels_sim_id.copy()
-        nchannels_sim += 1
-
-    if order == 1:
-        nchannels_sim = nchannels
-
-    npassi = 0
-
-    S = Fx(nchannels_sim, nchannels_sim)
-    fV = Fx(nchannels_sim, l_vui)
-
-    for i in range(lvy):
-        s = vy2[i]
-        s += " "
-        ssize = len(s)
-
-        channel = ""
-        channel_old = ""
-        ichannel_old = 0
-        ichannel = 0
-
-        j = 0
-        npassi = 0
+        if self.alias_prob is not None:
+            arrays["alias_prob"] = self.alias_prob
+            arrays["alias_idx"] = self.alias_idx
+        return arrays
+
+    @classmethod
+    def from_sampling_arrays(cls, nrows, ncols, arrays):
+        """Rebuild a sampling-ready matrix from `sampling_arrays`,
+        without copying the arrays."""
+        fx = cls(nrows, 0)
+        fx.ncols = ncols
+        fx.indptr = arrays["indptr"]
+        fx.indices = arrays["indices"]
+        fx.S1 = arrays["S1"]
+        fx.lrS = arrays["lrS"]
+        fx.gS1 = arrays["gS1"]
+        fx.lrS0 = np.diff(fx.indptr)
+        fx.alias_prob = arrays.get("alias_prob")
+        fx.alias_idx = arrays.get("alias_idx")
+        fx._indptr = None
+        return fx
+
+    @classmethod
+    def from_keys(cls, nrows, ncols, keys, data):
+        """Build a matrix from the sorted keys `row * ncols + column` of
+        its transitions and their counts; zero counts are dropped."""
+        fx = cls(nrows, ncols)
+        mask = data > 0
+        keys = keys[mask]
+        fx.indices = keys % ncols
+        fx.data = np.asarray(data[mask], dtype=float)
+        np.cumsum(np.bincount(keys // ncols, minlength=nrows),
+                  out=fx.indptr[1:])
+        return fx
+
+    def _cache_lists(self):
+        # plain lists keep the per-step lookups in sim cheap
+        self._indices = self.indices.tolist()
+        self._S1 = self.S1.tolist()
+        self._lrS = self.lrS.tolist()
+        if self.alias_prob is not None:
+            self._alias_prob = self.alias_prob.tolist()
+            self._alias_idx = self.alias_idx.tolist()
+        self._indptr = self.indptr.tolist()
 
-        vci = vc[i]
+    def sim(self, c, uni):
+        if self._indptr is None:
+            self._cache_lists()
+        lo = self._indptr[c]
+        hi = self._indptr[c + 1]
+        if self.alias_prob is not None:
+            if hi == lo or self._lrS[c] <= 0:
+                return 0
+            x = uni * (hi - lo)
+            j = min(int(x), hi - lo - 1)
+            if x - j < self._alias_prob[lo + j]:
+                return self._indices[lo + j]
+            return self._alias_idx[lo + j]
+        k = bisect.bisect_right(self._S1, uni * self._lrS[c], lo, hi)
+        if k < hi:
+            return self._indices[k]
+        return 0
 
-        if flg_var_null:
-            vni = vn[i]
-        else:
-            vni = 0
-        vpi = vci + vni
-
-        while j < ssize:
-            start_j = j
-            while s[j] != " ":
-                if j < ssize:
-                    channel = s[start_j:(j+1)]
-                j = j + 1
-                continue
-            j = j + 1
-
-            if flg_equal or channel != channel_old:
-                if channel[0] != "0":
-                    if channel[0] == "e":
-                        npassi += 1
-                        if vci > 0:
-                            ichannel = nchannels_sim - 2
-                            S.add(ichannel_old, ichannel, vci)
-                            if flg_var_value:
-                                vui = vv[i] / vci
-                                fV.add(ichannel_old, mp_vui[vui], vci)
-                            if vni > 0:
-                                ichannel = nchannels_sim - 1
-                                S.add(ichannel_old, ichannel, vni)
-                                continue
-                            else:
-                                continue
-                        if vni > 0:
-                            ichannel = nchannels_sim - 1
-                            S.add(ichannel_old, ichannel, vni)
-                        else:
-                            continue
-                    else:
-                        if vpi > 0:
-                            ichannel = int(channel)
-                            S.add(ichannel_old, ichannel, vpi)
-                    npassi += 1
-                else:
-                    ichannel = 0
-                channel_old = channel
-                ichannel_old = ichannel
+    def sim_batch(self, c, uni):
+        """Vectorized version of `sim` for arrays of rows and draws."""
+        lo = self.indptr[c]
+        hi = self.indptr[c + 1]
+        has_next = (hi > lo) & (self.lrS[c] > 0)
+        if self.alias_prob is not None:
+            x = uni * (hi - lo)
+            j = np.minimum(x.astype(np.int64), hi - lo - 1)
+            k = np.maximum(lo + j, 0)
+            nxt = np.where(x - j < self.alias_prob[k], self.indices[k],
+                           self.alias_idx[k])
+            return np.where(has_next, nxt, 0)
+        k = np.searchsorted(self.gS1, c + uni, side="right")
+        k = np.maximum(np.minimum(k, hi - 1), 0)
+        return np.where(has_next, self.indices[k], 0)
+
+    def tran_matx(self):
+        """The transition probabilities of the stored transitions, as
+        (row, column, probability) arrays."""
+        self._compact()
+
+        mask = self.data > 0
+        rows = self.row_indices()[mask]
+        cols = self.indices[mask]
+        num_transitions = self.data[mask]
+
+        vsm = np.bincount(rows, weights=num_transitions,
+                          minlength=self.nrows)
+        trans_probs = num_transitions / vsm[rows]
+        return rows, cols, trans_probs
+
+
+class TransitionProbs(object):
+    """
+    The transition probabilities of a fitted model as sparse arrays.
+
+    The probability of moving from state `rows[k]` to state `cols[k]`
+    is `probs[k]`; `states` names each state index. The names of the
+    states and the labeled DataFrame are only built when first
+    accessed.
+    """
+    def __init__(self, rows, cols, probs, counts):
+        self.rows = rows
+        self.cols = cols
+        self.probs = probs
+        self.n_states = counts.nchannels_sim
+        self._counts = counts
+        self._states = None
+        self._frame = None
+
+    @property
+    def states(self):
+        if self._states is None:
+            # the states only grow by appending before (conversion) and
+            # (null), so the names can be read after further updates
+            names = self._counts.vchannels_sim
+            self._states = np.asarray(
+                names[:self.n_states - 2] + names[-2:], dtype=object
+            )
+            self._counts = None
+        return self._states
+
+    def to_sparse(self):
+        """The probabilities as a scipy.sparse CSR matrix."""
+        return sparse.csr_matrix((self.probs, (self.rows, self.cols)),
+                                 shape=(self.n_states, self.n_states))
+
+    def to_frame(self):
+        """The probabilities as a DataFrame of labeled transitions."""
+        if self._frame is None:
+            states = self.states
+            self._frame = pd.DataFrame({
+                "channel_from": states[self.rows],
+                "channel_to": states[self.cols],
+                "transition_probability": self.probs
+            })
+        return self._frame
+
+
+def _alias_tables(indptr, indices, data, totals):
+    """
+    Build the alias table of every row of a CSR matrix (Vose's method).
+
+    Entry `k` of row `i` is kept with probability `prob[k]` when slot
+    `k - indptr[i]` is drawn, otherwise the successor `alias[k]` is
+    used instead.
+    """
+    prob = np.ones(data.shape, dtype=float)
+    alias = indices.copy()
+
+    degree = np.diff(indptr)
+    for i in np.flatnonzero(degree > 1):
+        lo = indptr[i]
+        hi = indptr[i + 1]
+        total = totals[i]
+        if total <= 0:
             continue
+        p = (data[lo:hi] * ((hi - lo) / total)).tolist()
+        small = [k for k, pk in enumerate(p) if pk < 1.0]
+        large = [k for k, pk in enumerate(p) if pk >= 1.0]
+        while small and large:
+            ks = small.pop()
+            kl = large[-1]
+            prob[lo + ks] = p[ks]
+            alias[lo + ks] = indices[lo + kl]
+            p[kl] = (p[kl] + p[ks]) - 1.0
+            if p[kl] < 1.0:
+                small.append(large.pop())
+        # the entries left over keep their full slot
+
+    return prob, alias
+
+
+class CompoundStates(object):
+    """
+    The compound states of a higher-order model.
+
+    Each state is a window of up to `order` consecutive channels. The
+    channels of every state are stored in one contiguous integer array,
+    padded with -1. Each window is packed into a single integer key, or
+    into its raw bytes when the vocabulary is too large for the keys to
+    fit in 64 bits, and the keys are looked up through a hash table, so
+    encoding a batch of paths has no per-window Python loop.
+    """
+    def __init__(self, order):
+        self.order = order
+        self.n_states = 1
+        self.members = np.full((16, order), -1, dtype=np.int64)
+        # (start) is state 0
+        self.members[0, 0] = 0
+        self._names = ["(start)"]
+        self._base = None
+        self._lookup = None
+
+    @property
+    def names(self):
+        """The name of each state; the channel names joined by ','."""
+        if len(self._names) < self.n_states:
+            windows = self.members[len(self._names):self.n_states]
+            vchannels = self._vchannels
+            for window in windows.tolist():
+                self._names.append(
+                    ",".join([vchannels[c] for c in window if c >= 0])
+                )
+        return self._names
+
+    def _keys(self, windows):
+        base = self._base
+        if base ** self.order < 2 ** 63:
+            weights = base ** np.arange(self.order, dtype=np.int64)
+            return (windows + 1) @ weights
+        return np.ascontiguousarray(windows).view(
+            np.dtype((np.void, windows.itemsize * self.order))
+        ).ravel().astype(object)
+
+    def encode(self, channels, offsets, vchannels):
+        """
+        Map every window of `order` consecutive channels of a path onto
+        a compound state, adding the windows not seen before in order of
+        first appearance. Paths shorter than `order` form a single
+        shorter window and empty paths have no states.
+
+        Returns the states of every path, concatenated, and their
+        offsets.
+        """
+        order = self.order
+        self._vchannels = vchannels
+        lengths = np.diff(offsets)
+        n_windows = np.where(lengths >= order, lengths - order + 1,
+                             np.minimum(lengths, 1))
+        state_offsets = np.zeros(len(offsets), dtype=np.int64)
+        np.cumsum(n_windows, out=state_offsets[1:])
+        n_total = state_offsets[-1]
+        if n_total == 0:
+            return np.zeros(0, dtype=np.int64), state_offsets
+
+        # the windows of all the paths as rows of a matrix
+        path_id = np.repeat(np.arange(len(lengths)), n_windows)
+        starts = offsets[path_id] + np.arange(n_total) - \
+            state_offsets[path_id]
+        ends = offsets[path_id + 1]
+        idx = starts[:, None] + np.arange(order)
+        windows = np.where(idx < ends[:, None],
+                           channels[np.minimum(idx, len(channels) - 1)],
+                           -1)
+
+        # the keys depend on the size of the vocabulary, so the keys of
+        # the known states are rebuilt when it grows
+        if len(vchannels) != self._base:
+            self._base = len(vchannels)
+            self._lookup = pd.Index(
+                self._keys(self.members[:self.n_states])
+            )
 
-        channel = ""
-        j = j + 1
+        window_codes, uniques = pd.factorize(self._keys(windows))
+        ids = self._lookup.get_indexer(uniques)
+        new = np.flatnonzero(ids < 0)
+        if len(new):
+            # pd.factorize numbers the keys in order of first appearance
+            first = np.empty(len(uniques), dtype=np.int64)
+            first[window_codes[::-1]] = np.arange(n_total - 1, -1, -1)
+            ids[new] = self.n_states + np.arange(len(new))
+            self._append(windows[first[new]])
+            self._lookup = self._lookup.append(pd.Index(uniques[new]))
+
+        return ids[window_codes], state_offsets
+
+    def _append(self, windows):
+        n_new = self.n_states + len(windows)
+        if n_new > len(self.members):
+            capacity = max(n_new, 2 * len(self.members))
+            members = np.full((capacity, self.order), -1, dtype=np.int64)
+            members[:self.n_states] = self.members[:self.n_states]
+            self.members = members
+        self.members[self.n_states:n_new] = windows
+        self.n_states = n_new
+
+    def member_array(self):
+        """The channels of every state, followed by the two absorbing
+        states, which have no channels."""
+        members = np.full((self.n_states + 2, self.order), -1,
+                          dtype=np.int64)
+        members[:self.n_states] = self.members[:self.n_states]
+        return members
+
+
+def _transition_structure(states, offsets, nchannels_sim, loops):
+    """
+    List the transitions of every path.
+
+    Each path contributes (start) -> first state and every transition
+    between consecutive states, weighted by conversions + nulls (kind
+    0), then last state -> (conversion), weighted by conversions (kind
+    1), and last state -> (null), weighted by nulls (kind 2).
+
+    Returns the row, column, path, kind and step in the path of every
+    transition.
+    """
+    n_paths = len(offsets) - 1
+    lengths = np.diff(offsets)
+    path_id = np.repeat(np.arange(n_paths), lengths)
+
+    if not loops:
+        # collapse repeated consecutive states within a path
+        keep = np.ones(len(states), dtype=bool)
+        keep[1:] = (states[1:] != states[:-1]) | \
+                   (path_id[1:] != path_id[:-1])
+        states = states[keep]
+        path_id = path_id[keep]
+        lengths = np.bincount(path_id, minlength=n_paths)
+        offsets = np.zeros(n_paths + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+    non_empty = np.flatnonzero(lengths > 0)
+
+    # (start) precedes the first state of each path
+    prev = np.empty_like(states)
+    prev[1:] = states[:-1]
+    prev[offsets[non_empty]] = 0
+
+    last = states[offsets[non_empty + 1] - 1]
+    end_slot = lengths[non_empty]
+
+    rows = np.concatenate((prev, last, last))
+    cols = np.concatenate((states,
+                           np.full(len(last), nchannels_sim - 2),
+                           np.full(len(last), nchannels_sim - 1)))
+    paths = np.concatenate((path_id, non_empty, non_empty))
+    kinds = np.repeat(np.arange(3), [len(states), len(last), len(last)])
+    slots = np.concatenate((np.arange(len(states)) - offsets[path_id],
+                            end_slot, end_slot + 1))
+    return rows, cols, paths, kinds, slots
+
+
+def _path_transitions(states, offsets, vc, vn, nchannels_sim, loops,
+                      first_rows=None):
+    """
+    Derive the weighted transitions of every path.
+
+    The transitions are those of `_transition_structure`, returned in
+    the order in which they are met when walking the paths.
+
+    When the paths are distinct paths aggregated from several rows,
+    `first_rows` gives, for each path, the first row at which each of
+    the three kinds of weights is positive, so that the transitions are
+    returned in the order in which they are met when walking the rows.
+    """
+    rows, cols, paths, kinds, slots = _transition_structure(
+        states, offsets, nchannels_sim, loops
+    )
+    if first_rows is None:
+        first_rows = np.tile(np.arange(len(offsets) - 1), (3, 1))
+
+    weights = np.stack((vc + vn, vc, vn))[kinds, paths]
+    mask = weights > 0
+    # the row that adds each transition first and its step in the path
+    first = np.asarray(first_rows)[kinds[mask], paths[mask]]
+    order = np.lexsort((slots[mask], first))
+
+    return rows[mask][order], cols[mask][order], weights[mask][order]
+
+
+def _first_rows(path_codes, n_paths, *weights):
+    """The first row of each path at which each weight is positive."""
+    first_rows = np.zeros((len(weights), n_paths), dtype=np.int64)
+    for k, w in enumerate(weights):
+        rows = np.flatnonzero(w > 0)
+        codes, first = np.unique(path_codes[rows], return_index=True)
+        first_rows[k, codes] = rows[first]
+    return first_rows
+
+
+def path_weights(path_codes, n_paths, vc, vn):
+    """
+    Aggregate the conversions and nulls of the rows by distinct path.
+
+    Returns the conversions and nulls of each of the `n_paths` distinct
+    paths, and the first rows of each path as used by
+    `_path_transitions`.
+    """
+    vc_path = np.bincount(path_codes, weights=vc, minlength=n_paths)
+    vn_path = np.bincount(path_codes, weights=vn, minlength=n_paths)
+    first_rows = _first_rows(path_codes, n_paths, vc + vn, vc, vn)
+    return vc_path, vn_path, first_rows
+
+
+class TransitionCounts(object):
+    """
+    The transition counts of a Markov model.
+
+    The counts are accumulated over one or more batches of paths with
+    `update`; the state vocabulary grows as new channels (or compound
+    states) are met. (conversion) and (null) are always the last two
+    states, as expected by the simulation.
+
+    Parameters
+    ----------
+    order: int; default=1.
+      The order, or "memory" of the Markov model.
+
+    loops: bool; default=True.
+      Whether to count transitions from a state to itself.
+
+    sep: str; default=">>>".
+      The symbol used to separate the channels in each path.
+
+    has_value: bool; default=False.
+      Whether the conversion values are tracked.
+    """
+
+    def __init__(self, order=1, loops=True, sep=">>>", has_value=False):
+        self.order = order
+        self.loops = loops
+        self.sep = sep
+        self.has_value = has_value
+
+        # channel name -> channel code; (start) is channel 0 and the
+        # codes in the vocabulary are offset by one
+        self.mp_channels = {}
+
+        # the compound states of higher-order models; (start) is state 0
+        self.compound_states = CompoundStates(order)
+
+        # conversion value -> column of fV
+        self.v_vui = np.zeros((0,), dtype=float)
+        self.mp_vui = pd.Index(self.v_vui)
+
+        self.S = Fx(3, 3)
+        self.fV = Fx(3, 0)
+
+        # total conversions, total value and rows seen
+        self.sn = 0.0
+        self.sv = 0.0
+        self.n_rows = 0
+
+    @property
+    def vchannels(self):
+        return ["(start)"] + list(self.mp_channels.keys()) + \
+               ["(conversion)", "(null)"]
+
+    @property
+    def nchannels(self):
+        return len(self.mp_channels) + 3
+
+    @property
+    def vchannels_sim(self):
+        if self.order == 1:
+            return self.vchannels
+        return self.compound_states.names + ["(conversion)", "(null)"]
+
+    @property
+    def nchannels_sim(self):
+        if self.order == 1:
+            return self.nchannels
+        return self.compound_states.n_states + 2
+
+    @property
+    def mp_channels_sim_id(self):
+        """The channels of each compound state, padded with -1; None for
+        first-order models, whose states are the channels."""
+        if self.order == 1:
+            return None
+        return self.compound_states.member_array()
+
+    def scale(self, decay):
+        """Multiply every count and total by `decay`."""
+        self.S.scale(decay)
+        self.fV.scale(decay)
+        self.sn *= decay
+        self.sv *= decay
+        return self
 
-    if out_more:
-        if order == 1:
-            trans_mat = S.tran_matx(vchannels)
+    def update(self, var_path, vc, vn=None, vv=None, decay=None):
+        """
+        Add the transitions of a batch of paths.
+
+        Parameters
+        ----------
+        var_path: one of {sequence of str, pyarrow array, tuple};
+          required.
+          The paths of the batch; Arrow-backed paths are encoded on
+          their buffers and pre-tokenized paths (see `path_tokens`) are
+          not parsed.
+
+        vc: array-like; required.
+          The conversions of each path.
+
+        vn: array-like; default=None; optional.
+          The non-conversions of each path.
+
+        vv: array-like; default=None; optional.
+          The conversion value of each path; required when the counts
+          track values.
+
+        decay: float; default=None; optional.
+          When given, the counts accumulated so far are multiplied by
+          `decay` before the batch is added.
+
+        Returns
+        -------
+        self
+        """
+        if decay is not None:
+            self.scale(decay)
+
+        path_codes, states, state_offsets = self.encode(var_path)
+        return self.add(path_codes, states, state_offsets, vc, vn=vn,
+                        vv=vv)
+
+    def encode(self, var_path):
+        """
+        Encode a batch of paths as states, growing the vocabulary.
+
+        Identical paths are parsed once, see `factorize_paths`.
+        Pre-tokenized paths (see `path_tokens`) skip the parsing.
+        Returns the distinct path of every row, and the states of every
+        distinct path, concatenated, with their offsets.
+        """
+        tokens = path_tokens(var_path)
+        if tokens is not None:
+            codes, offsets, channels = tokens
+            codes = remap_tokens(codes, channels, self.mp_channels)
+            path_codes, codes, offsets = factorize_tokens(
+                codes, offsets, len(self.mp_channels)
+            )
+            states, state_offsets = self._encode_states(codes, offsets)
+            return path_codes, states, state_offsets
+
+        path_codes, distinct_paths = factorize_paths(var_path)
+
+        # encode the paths as channel codes
+        codes, offsets, _ = tokenize_paths(distinct_paths, self.sep,
+                                           vocabulary=self.mp_channels)
+        states, state_offsets = self._encode_states(codes, offsets)
+        return path_codes, states, state_offsets
+
+    def encode_tokens(self, codes, offsets, channels):
+        """
+        Encode a batch of already tokenized paths as states, growing
+        the vocabulary.
+
+        `codes` index the channel names `channels`. The channels are
+        added to the vocabulary in order of first appearance, as
+        `encode` would add them, so the counts are the same as when the
+        paths are given as strings. Returns the states of every path,
+        concatenated, and their offsets.
+        """
+        codes = remap_tokens(codes, channels, self.mp_channels)
+        return self._encode_states(codes, offsets)
+
+    def _encode_states(self, codes, offsets):
+        if self.order == 1:
+            states = codes + 1
+            state_offsets = offsets
         else:
-            trans_mat = S.tran_matx(vchannels_sim)
+            states, state_offsets = self.compound_states.encode(
+                codes + 1, offsets, self.vchannels
+            )
+        self._grow()
+        return states, state_offsets
+
+    def add(self, path_codes, states, state_offsets, vc, vn=None, vv=None,
+            totals=None):
+        """Add the transitions of a batch of paths encoded by `encode`;
+        the conversions and nulls of the rows of each distinct path are
+        counted together. `totals` are the `path_weights` of the batch,
+        when already computed."""
+        n_distinct = len(state_offsets) - 1
+        vc = np.asarray(vc)
+        vn = np.zeros_like(vc) if vn is None else np.asarray(vn)
+
+        if totals is None:
+            totals = path_weights(path_codes, n_distinct, vc, vn)
+        vc_path, vn_path, first_rows = totals
+        rows, cols, weights = _path_transitions(states, state_offsets,
+                                                vc_path, vn_path,
+                                                self.nchannels_sim,
+                                                self.loops,
+                                                first_rows=first_rows)
+        self.S.add(rows, cols, weights)
+
+        if self.has_value:
+            vv = np.asarray(vv)
+            # the value of each conversion is drawn from the values of
+            # the rows that converted from the same last state, so these
+            # are kept per row rather than per distinct path
+            lengths = np.diff(state_offsets)
+            last = states[state_offsets[1:] - 1]
+            conv_rows = np.flatnonzero((vc > 0) &
+                                       (lengths[path_codes] > 0))
+            vui = vv[conv_rows] / vc[conv_rows]
+            vui_codes, uniques = pd.factorize(vui, use_na_sentinel=False)
+            ids = self.mp_vui.get_indexer(uniques)
+            new = np.flatnonzero(ids < 0)
+            if len(new):
+                ids[new] = len(self.v_vui) + np.arange(len(new))
+                self.v_vui = np.concatenate((self.v_vui, uniques[new]))
+                self.mp_vui = pd.Index(self.v_vui)
+            self.fV.resize(self.S.nrows, len(self.v_vui))
+            self.fV.add(last[path_codes[conv_rows]], ids[vui_codes],
+                        vc[conv_rows])
+            self.sv += vv.sum()
+
+        self.sn += vc.sum()
+        self.n_rows += len(vc)
+        return self
 
-    S = S.cum()
+    def copy_empty(self):
+        """A copy that shares the vocabulary but has no counts."""
+        counts = copy.copy(self)
+        counts.S = Fx(self.S.nrows, self.S.ncols)
+        counts.fV = Fx(self.fV.nrows, self.fV.ncols)
+        counts.sn = 0.0
+        counts.sv = 0.0
+        counts.n_rows = 0
+        return counts
+
+    def to_arrays(self):
+        """
+        The state of the counts as flat arrays and JSON-serializable
+        scalars, as read by `from_arrays`.
+        """
+        arrays = {
+            "channels": np.asarray(list(self.mp_channels.keys()),
+                                   dtype=object),
+            "members": self.compound_states.members[
+                :self.compound_states.n_states],
+            "v_vui": self.v_vui
+        }
+        for name in ("S", "fV"):
+            fx = getattr(self, name)._compact()
+            arrays.update({f"{name}.indptr": fx.indptr,
+                           f"{name}.indices": fx.indices,
+                           f"{name}.data": fx.data})
+        meta = {
+            "order": self.order,
+            "loops": self.loops,
+            "sep": self.sep,
+            "has_value": self.has_value,
+            "sn": self.sn,
+            "sv": self.sv,
+            "n_rows": self.n_rows,
+            "S.shape": [self.S.nrows, self.S.ncols],
+            "fV.shape": [self.fV.nrows, self.fV.ncols]
+        }
+        return arrays, meta
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        """
+        Rebuild the counts saved by `to_arrays`.
+
+        The arrays are used as they are, so they can be read-only views
+        of a memory-mapped file; later updates replace them with new
+        arrays rather than writing into them.
+        """
+        counts = cls(meta["order"], meta["loops"], meta["sep"],
+                     has_value=meta["has_value"])
+        counts.mp_channels = {c: i for i, c
+                              in enumerate(arrays["channels"].tolist())}
+        states = counts.compound_states
+        states.members = arrays["members"]
+        states.n_states = len(states.members)
+        states._vchannels = counts.vchannels
+        counts.v_vui = arrays["v_vui"]
+        counts.mp_vui = pd.Index(counts.v_vui)
+        for name in ("S", "fV"):
+            fx = Fx(*meta[f"{name}.shape"])
+            fx.indptr = arrays[f"{name}.indptr"]
+            fx.indices = arrays[f"{name}.indices"]
+            fx.data = arrays[f"{name}.data"]
+            setattr(counts, name, fx)
+        counts.sn = meta["sn"]
+        counts.sv = meta["sv"]
+        counts.n_rows = meta["n_rows"]
+        return counts
+
+    def _grow(self):
+        """Make room for the states added to the vocabulary, keeping
+        (conversion) and (null) as the last two states."""
+        n_old = self.S.nrows
+        n_new = self.nchannels_sim
+        if n_new == n_old:
+            return
+
+        col_map = np.arange(n_old)
+        col_map[n_old - 2:] += n_new - n_old
+        self.S.resize(n_new, n_new, col_map=col_map)
+        self.fV.resize(n_new, self.fV.ncols)
+
+
+def _bin_values(fV, v_vui, n_bins):
+    """
+    Compress the conversion values into at most `n_bins` values per
+    state.
+
+    The distinct values are split into `n_bins` quantile bins weighted
+    by their conversions, and each state draws from the mean value of
+    each of its bins, weighted by the conversions of the state in that
+    bin. The mean value of every state is therefore unchanged.
+
+    Returns the sampling matrix, with one column per (state, bin)
+    pair, and the value of each column.
+    """
+    fV._compact()
+    v_vui = np.asarray(v_vui, dtype=float)
+
+    # quantile bin of each distinct value, from the conversions below it
+    weights = np.bincount(fV.indices, weights=fV.data,
+                          minlength=len(v_vui))
+    order = np.argsort(v_vui, kind="stable")
+    below = np.cumsum(weights[order]) - weights[order]
+    total = max(weights.sum(), np.finfo(float).tiny)
+    bins = np.empty(len(v_vui), dtype=np.int64)
+    bins[order] = np.minimum((below / total * n_bins).astype(np.int64),
+                             n_bins - 1)
+
+    rows = fV.row_indices()
+    keys, inverse = np.unique(rows * n_bins + bins[fV.indices],
+                              return_inverse=True)
+    inverse = inverse.ravel()
+    counts = np.bincount(inverse, weights=fV.data, minlength=len(keys))
+    sums = np.bincount(inverse, weights=fV.data * v_vui[fV.indices],
+                       minlength=len(keys))
+
+    binned = Fx(fV.nrows, len(keys))
+    binned.indices = np.arange(len(keys), dtype=np.int64)
+    binned.data = counts
+    np.cumsum(np.bincount(keys // n_bins, minlength=fV.nrows),
+              out=binned.indptr[1:])
+    values = np.divide(sums, counts, out=np.zeros_like(sums),
+                       where=counts > 0)
+    return binned, values
+
+
+def _check_random_state(random_state):
+    """Turn `random_state` into a random number generator."""
+    if random_state is None:
+        return np.random.mtrand._rand
+    if isinstance(random_state, (np.random.RandomState,
+                                 np.random.Generator)):
+        return random_state
+    return np.random.RandomState(random_state)
+
+
+def _simulate_loop(S, fV, v_vui, mp_channels_sim_id, nchannels, nsim,
+                   max_npassi, random_state, progress=None):
+    """Simulate the paths one at a time; `progress` is called with the
+    walks and steps done every time a block of random numbers is
+    drawn."""
+    rng = _check_random_state(random_state)
+    nchannels_sim = S.nrows
+    flg_var_value = v_vui is not None
+    if isinstance(mp_channels_sim_id, np.ndarray):
+        mp_channels_sim_id = mp_channels_sim_id.tolist()
 
     nuf = int(1e6)
     nconv = 0
@@ -404,23 +950,13 @@ def fit_markov(df, paths, convs, conv_val, nulls, nsim, max_step,
     ssval = 0
     c_last = 0
     iu = 0
-    vunif = np.random.uniform(size=nuf)
+    n_steps = 0
+    vunif = rng.uniform(size=nuf)
 
     C = [0] * nchannels
     T = [0] * nchannels
     V = [0] * nchannels
 
-    if flg_var_value:
-        fV.cum()
-
-    if max_step == 0:
-        max_npassi = nchannels_sim * 10
-    else:
-        max_npassi = int(1e6)
-
-    if nsim == 0:
-        nsim = int(1e6)
-
     for i in range(nsim):
         c = 0
         npassi = 0
@@ -430,21 +966,23 @@ def fit_markov(df, paths, convs, conv_val, nulls, nsim, max_step,
         C[c] = 1
         while npassi <= max_npassi:
             if iu >= nuf:
-                vunif = np.random.uniform(size=nuf)
+                vunif = rng.uniform(size=nuf)
                 iu = 0
+                if progress is not None:
+                    progress(n_walks=i, n_steps=n_steps)
             c = S.sim(c, vunif[iu])
             iu += 1
+            n_steps += 1
 
             if c == (nchannels_sim - 2):
                 break
             elif c == (nchannels_sim - 1):
                 break
-            if order == 1:
+            if mp_channels_sim_id is None:
                 C[c] = 1
 
             else:
-                for k in range(order):
-                    id0 = mp_channels_sim_id[c][k]
+                for id0 in mp_channels_sim_id[c]:
                     if id0 >= 0:
                         C[id0] = 1
                     else:
@@ -457,7 +995,7 @@ def fit_markov(df, paths, convs, conv_val, nulls, nsim, max_step,
 
             if flg_var_value:
                 if iu >= nuf:
-                    vunif = np.random.uniform(size=nuf)
+                    vunif = rng.uniform(size=nuf)
                     iu = 0
                 sval0 = v_vui[fV.sim(c_last, vunif[iu])]
                 iu += 1
@@ -469,102 +1007,1061 @@ def fit_markov(df, paths, convs, conv_val, nulls, nsim, max_step,
                     if flg_var_value:
                         V[k] = V[k] + sval0
 
-    T[0] = 0
-    nch0 = nchannels - 3
-    T[nchannels - 2] = 0
-    T[nchannels - 1] = 0
+    return T, V, nconv, ssval, n_steps
+
 
-    sn = 0
+def _simulate_batch(S, fV, v_vui, mp_channels_sim_id, nchannels, nsim,
+                    max_npassi, random_state, batch_size, progress=None):
+    """Simulate `batch_size` paths at a time in lockstep; `progress` is
+    called with the walks and steps done after every batch."""
+    rng = _check_random_state(random_state)
+    nchannels_sim = S.nrows
+    flg_var_value = v_vui is not None
 
-    for i in range(lvy):
-        sn = sn + vc[i]
+    # the channels visited when entering each state
+    if mp_channels_sim_id is None:
+        members = np.arange(nchannels_sim).reshape(-1, 1)
+    else:
+        members = np.asarray(mp_channels_sim_id, dtype=np.int64)
+    order = members.shape[1]
+    if flg_var_value:
+        v_vui = np.asarray(v_vui, dtype=float)
 
-    sm = 0
+    nconv = 0
+    ssval = 0
+    n_steps = 0
+    T = np.zeros((nchannels,), dtype=np.int64)
+    V = np.zeros((nchannels,), dtype=float)
+
+    for start in range(0, nsim, batch_size):
+        n = min(batch_size, nsim - start)
+        c = np.zeros((n,), dtype=np.int64)
+        c_last = np.zeros((n,), dtype=np.int64)
+        C = np.zeros((n, nchannels), dtype=bool)
+        C[:, 0] = True
+
+        # the walks that have not been absorbed yet
+        walks = np.arange(n)
+        npassi = 0
+        while walks.size > 0 and npassi <= max_npassi:
+            c_new = S.sim_batch(c[walks], rng.uniform(size=walks.size))
+            n_steps += walks.size
+            c[walks] = c_new
+
+            moving = c_new < (nchannels_sim - 2)
+            walks = walks[moving]
+            c_new = c_new[moving]
+
+            ids = members[c_new]
+            visited = ids >= 0
+            C[np.repeat(walks, order)[visited.ravel()], ids[visited]] = True
+            c_last[walks] = c_new
+            npassi += 1
+
+        converted = np.flatnonzero(c == (nchannels_sim - 2))
+        nconv += converted.size
+        T += C[converted].sum(axis=0)
+
+        if flg_var_value:
+            sval = v_vui[fV.sim_batch(c_last[converted],
+                                      rng.uniform(size=converted.size))]
+            ssval = ssval + sval.sum()
+            V += sval @ C[converted]
+
+        if progress is not None:
+            progress(n_walks=start + n, n_steps=n_steps)
+
+    return T, V, nconv, ssval, n_steps
+
+
+def _simulate(engine, S, fV, v_vui, mp_channels_sim_id, nchannels, nsim,
+              max_npassi, random_state, batch_size, backend="python",
+              progress=None):
+    if engine == "loop" and backend == "numba":
+        return _numba.simulate_loop(S, fV, v_vui, mp_channels_sim_id,
+                                    nchannels, nsim, max_npassi,
+                                    _check_random_state(random_state),
+                                    progress=progress)
+    if engine == "loop":
+        return _simulate_loop(S, fV, v_vui, mp_channels_sim_id, nchannels,
+                              nsim, max_npassi, random_state,
+                              progress=progress)
+    return _simulate_batch(S, fV, v_vui, mp_channels_sim_id, nchannels,
+                           nsim, max_npassi, random_state, batch_size,
+                           progress=progress)
+
+
+# the transition tables mapped by each worker process
+_worker_tables = {}
+
+
+def _init_worker(shm_name, layout, nrows, ncols_v):
+    shm, arrays = attach_arrays(shm_name, layout)
+    _worker_tables["shm"] = shm
+    _worker_tables["S"] = Fx.from_sampling_arrays(
+        nrows, nrows,
+        {k[2:]: v for k, v in arrays.items() if k.startswith("S.")}
+    )
+    if "v_vui" in arrays:
+        _worker_tables["fV"] = Fx.from_sampling_arrays(
+            nrows, ncols_v,
+            {k[3:]: v for k, v in arrays.items() if k.startswith("fV.")}
+        )
+        _worker_tables["v_vui"] = arrays["v_vui"]
+    else:
+        _worker_tables["fV"] = _worker_tables["v_vui"] = None
+    _worker_tables["members"] = arrays.get("members")
+
+
+def _simulate_worker(engine, nchannels, nsim, max_npassi, seed,
+                     batch_size, backend):
+    members = _worker_tables["members"]
+    if members is not None and engine == "loop" and backend == "python":
+        members = members.tolist()
+    rng = np.random.Generator(np.random.PCG64(seed))
+    T, V, nconv, ssval, n_steps = _simulate(
+        engine, _worker_tables["S"], _worker_tables["fV"],
+        _worker_tables["v_vui"], members, nchannels, nsim, max_npassi,
+        rng, batch_size, backend=backend
+    )
+    return np.asarray(T), np.asarray(V, dtype=float), nconv, ssval, n_steps
+
+
+def _simulate_parallel(engine, S, fV, v_vui, mp_channels_sim_id, nchannels,
+                       nsim, max_npassi, random_state, batch_size, n_jobs,
+                       backend="python", progress=None):
+    """
+    Split the simulations over `n_jobs` processes.
+
+    The sampling tables are placed once in shared memory and mapped
+    read-only by every worker. Each share of the simulations gets its
+    own random stream spawned from `random_state`, and the counters are
+    summed in a fixed order, so the results only depend on
+    `random_state` and `n_jobs`. `progress` is called with the walks
+    and steps done as the shares finish.
+    """
+    arrays = {"S." + k: v for k, v in S.sampling_arrays().items()}
+    if v_vui is not None:
+        arrays.update({"fV." + k: v
+                       for k, v in fV.sampling_arrays().items()})
+        arrays["v_vui"] = np.asarray(v_vui, dtype=float)
+    if mp_channels_sim_id is not None:
+        arrays["members"] = np.asarray(mp_channels_sim_id, dtype=np.int64)
+
+    seeds = spawn_seeds(random_state, n_jobs)
+    sizes = split_evenly(nsim, n_jobs)
+
+    shm, layout = share_arrays(arrays)
+    try:
+        with ProcessPoolExecutor(
+                max_workers=n_jobs, initializer=_init_worker,
+                initargs=(shm.name, layout, S.nrows,
+                          fV.ncols if v_vui is not None else 0)
+        ) as pool:
+            futures = [
+                pool.submit(_simulate_worker, engine, nchannels, size,
+                            max_npassi, seed, batch_size, backend)
+                for size, seed in zip(sizes, seeds)
+            ]
+            if progress is not None:
+                n_walks = n_steps = 0
+                for future in as_completed(futures):
+                    n_walks += sizes[futures.index(future)]
+                    n_steps += future.result()[4]
+                    progress(n_walks=n_walks, n_steps=n_steps)
+            results = [f.result() for f in futures]
+    finally:
+        shm.close()
+        shm.unlink()
+
+    T = np.zeros((nchannels,), dtype=np.int64)
+    V = np.zeros((nchannels,), dtype=float)
+    nconv = 0
+    ssval = 0
+    n_steps = 0
+    for T_i, V_i, nconv_i, ssval_i, n_steps_i in results:
+        T += T_i
+        V += V_i
+        nconv += nconv_i
+        ssval = ssval + ssval_i
+        n_steps += n_steps_i
+    return T, V, nconv, ssval, n_steps
+
+
+# the fewest batches whose spread is trusted to estimate the error
+_MIN_BATCHES = 4
+
+
+def _batch_means_error(v_T, total):
+    """The estimate of `total` split over the channels in proportion to
+    the counters, and its batch-means standard error."""
+    v_T = np.asarray(v_T, dtype=float)[:, 1:-2]
+    sums = v_T.sum(axis=1, keepdims=True)
+    shares = np.divide(v_T, sums, out=np.zeros_like(v_T), where=sums > 0)
+    pooled = v_T.sum(axis=0)
+    estimate = pooled / pooled.sum() * total if pooled.sum() > 0 \
+        else np.zeros_like(pooled)
+    if len(v_T) < 2:
+        return estimate, np.full_like(estimate, np.inf)
+    se = (shares * total).std(axis=0, ddof=1) / np.sqrt(len(v_T))
+    return estimate, se
+
+
+def _simulate_adaptive(engine, S, fV, v_vui, mp_channels_sim_id, nchannels,
+                       nsim, max_npassi, random_state, batch_size, n_jobs,
+                       tol, sn, sv, n_batches=20, backend="python",
+                       progress=None):
+    """
+    Simulate the `nsim` paths in `n_batches` batches, stopping once the
+    standard error of every channel's conversions is within `tol` of
+    the estimate after at least `_MIN_BATCHES` batches.
+
+    The standard errors are estimated by batch means: the spread of the
+    estimates of the individual batches, divided by the square root of
+    the number of batches. `batch_size` only bounds the paths the
+    "batch" engine advances at once.
+    """
+    if n_batches < _MIN_BATCHES:
+        raise ValueError(f"n_batches must be at least {_MIN_BATCHES}.")
+    walks_per_batch = -(-nsim // n_batches)
+    if n_jobs > 1:
+        seed = spawn_seeds(random_state, 1)[0]
+    else:
+        rng = _check_random_state(random_state)
 
-    for i in range(nchannels - 1):
-        sm = sm + T[i]
+    v_T = []
+    v_V = []
+    nconv = 0
+    ssval = 0
+    n_steps = 0
+    n_walks = 0
+    converged = False
+    rel_error = np.inf
+    while n_walks < nsim:
+        nsim_b = min(walks_per_batch, nsim - n_walks)
+        if progress is None:
+            progress_b = None
+        else:
+            # the progress within the batch, counted from its start
+            def progress_b(n_walks, n_steps, done=(n_walks, n_steps)):
+                progress(n_walks=done[0] + n_walks,
+                         n_steps=done[1] + n_steps)
+        if n_jobs > 1:
+            res = _simulate_parallel(
+                engine, S, fV, v_vui, mp_channels_sim_id, nchannels,
+                nsim_b, max_npassi, seed.spawn(1)[0], batch_size, n_jobs,
+                backend=backend, progress=progress_b
+            )
+        else:
+            res = _simulate(
+                engine, S, fV, v_vui, mp_channels_sim_id, nchannels,
+                nsim_b, max_npassi, rng, batch_size, backend=backend,
+                progress=progress_b
+            )
+        v_T.append(np.asarray(res[0], dtype=float))
+        v_V.append(np.asarray(res[1], dtype=float))
+        nconv += res[2]
+        ssval = ssval + res[3]
+        n_steps += res[4]
+        n_walks += nsim_b
+
+        estimate, se = _batch_means_error(v_T, sn)
+        rel_error = np.max(
+            np.divide(se, estimate, out=np.where(se > 0, np.inf, 0.0),
+                      where=estimate > 0),
+            initial=0.0
+        )
+        if len(v_T) >= _MIN_BATCHES and rel_error <= tol:
+            converged = True
+            break
+
+    T = np.sum(v_T, axis=0)
+    V = np.sum(v_V, axis=0)
+    se_conv = se
+    se_value = _batch_means_error(v_V, sv)[1] if v_vui is not None \
+        else None
+    stats = {
+        "n_walks": n_walks,
+        "n_batches": len(v_T),
+        "converged": converged,
+        "max_relative_error": float(rel_error)
+    }
+    return T, V, nconv, ssval, n_steps, se_conv, se_value, stats
+
+
+def _solve_exact(S, fV, v_vui, mp_channels_sim_id, nchannels,
+                 progress=None):
+    """
+    Compute the quantities estimated by the simulation exactly.
+
+    The transition matrix defines an absorbing Markov chain, so the
+    probability of reaching (conversion) from (start) is found with a
+    sparse linear solve. Removing a channel turns every state that
+    contains it into a dead end; the drop in the conversion probability
+    is the (unnormalized) share of conversions that visit the channel,
+    i.e. the expectation of the simulated `T`. With revenue, the
+    expected value collected on conversion is solved for the same way.
+    `progress` is called with the number of solves done after each.
+    """
+    nchannels_sim = S.nrows
+    n = nchannels_sim - 2
+    flg_var_value = v_vui is not None
+
+    rows = S.row_indices()
+    cols = S.indices
+    tot = np.bincount(rows, weights=S.data, minlength=nchannels_sim)
+    prob = S.data / tot[rows]
+
+    to_conv = cols == nchannels_sim - 2
+    transient = cols < n
+    Q = sparse.csr_matrix(
+        (prob[transient], (rows[transient], cols[transient])),
+        shape=(n, n)
+    )
+    b = np.bincount(rows[to_conv], weights=prob[to_conv], minlength=n)[:n]
+
+    B = [b]
+    if flg_var_value:
+        # mean value of the conversions from each state
+        v_rows = fV.row_indices()
+        v_sum = np.bincount(v_rows,
+                            weights=fV.data * np.asarray(v_vui)[fV.indices],
+                            minlength=nchannels_sim)[:n]
+        v_cnt = np.bincount(v_rows, weights=fV.data,
+                            minlength=nchannels_sim)[:n]
+        mu = np.divide(v_sum, v_cnt, out=np.zeros_like(v_sum),
+                       where=v_cnt > 0)
+        B.append(b * mu)
+    B = np.column_stack(B)
+
+    def solve(keep):
+        # expected absorption rewards starting from (start)
+        D = sparse.diags(keep.astype(float))
+        A = (sparse.identity(n, format="csc") - D @ Q).tocsc()
+        x = splinalg.splu(A).solve(B * keep[:, None])
+        return x[0]
+
+    if mp_channels_sim_id is None:
+        members = np.arange(n).reshape(-1, 1)
+    else:
+        members = np.asarray(mp_channels_sim_id, dtype=np.int64)[:n]
+
+    full = solve(np.ones(n, dtype=bool))
+    T = np.zeros((nchannels,), dtype=float)
+    V = np.zeros((nchannels,), dtype=float)
+    for k in range(1, nchannels - 2):
+        removed = solve(~(members == k).any(axis=1))
+        T[k] = full[0] - removed[0]
+        if flg_var_value:
+            V[k] = full[1] - removed[1]
+        if progress is not None:
+            progress(n_solves=k + 1)
+
+    nconv = full[0]
+    ssval = full[1] if flg_var_value else 0
+    return T, V, nconv, ssval, nchannels - 2
+
+
+def attribute_markov(counts, nsim, max_step, out_more, random_state,
+                     engine="loop", batch_size=100000, sampler="cdf",
+                     n_jobs=None, sim_stats=None, revenue_bins=None,
+                     tol=None, n_batches=20, backend="python",
+                     profiler=None):
+    """Compute the attribution and removal effects from the transition
+    counts; the phases are timed by `profiler` when given."""
+    if profiler is None:
+        profiler = FitProfiler()
+    flg_var_value = counts.has_value
+    nchannels = counts.nchannels
+    nchannels_sim = counts.nchannels_sim
+    vchannels = counts.vchannels
+    mp_channels_sim_id = counts.mp_channels_sim_id
+    S = counts.S
+    fV = counts.fV
+    v_vui = counts.v_vui
+    if nchannels <= 3:
+        # only (start), (conversion) and (null)
+        raise ValueError("The paths have no channels to attribute.")
+
+    profiler.count(n_channels=nchannels - 3, n_states=nchannels_sim,
+                   n_transitions=S.non_zeros)
 
-    TV = [0] * nch0
-    rTV = [0] * (nch0)
+    if out_more:
+        with profiler.phase("transition_matrix"):
+            trans_probs = TransitionProbs(*S.tran_matx(), counts)
+
+    if sampler not in ("cdf", "alias"):
+        raise ValueError(f"Unknown sampler: {sampler!r}")
+    backend = _numba.resolve_backend(backend)
+    with profiler.phase("samplers"):
+        S = S.cum(alias=sampler == "alias", backend=backend)
+
+        if flg_var_value:
+            if revenue_bins is not None:
+                fV, v_vui = _bin_values(fV, v_vui, revenue_bins)
+            fV.cum(alias=sampler == "alias", backend=backend)
+        else:
+            v_vui = None
 
-    for k in range(nch0 + 1):
-        if sm > 0:
-            TV[k - 1] = (T[k] / sm) * sn
-            if out_more:
-                # removal effects
-                rTV[k - 1] = T[k] / nconv
+    if max_step == 0:
+        max_npassi = nchannels_sim * 10
+    else:
+        max_npassi = int(1e6)
 
-    VV = [0] * nch0
+    if nsim == 0:
+        nsim = int(1e6)
 
-    rVV = [0] * nch0
+    n_jobs = effective_n_jobs(n_jobs)
 
-    if flg_var_value:
-        V[0] = 0
-        V[nchannels - 2] = 0
-        V[nchannels - 1] = 0
+    se_conv = se_value = None
+    adaptive_stats = {}
 
-        sn = 0
-        for i in range(lvy):
-            sn = sn + vv[i]
+    t_start = time.perf_counter()
+    with profiler.phase("solve" if engine == "exact" else "simulate"):
+        if engine in ("loop", "batch") and tol is not None:
+            (T, V, nconv, ssval, n_steps, se_conv, se_value,
+             adaptive_stats) = _simulate_adaptive(
+                engine, S, fV, v_vui, mp_channels_sim_id, nchannels, nsim,
+                max_npassi, random_state, batch_size, n_jobs, tol, counts.sn,
+                counts.sv, n_batches=n_batches, backend=backend,
+                progress=profiler.progress
+            )
+            nsim = adaptive_stats.pop("n_walks")
+        elif engine in ("loop", "batch") and n_jobs > 1:
+            T, V, nconv, ssval, n_steps = _simulate_parallel(
+                engine, S, fV, v_vui, mp_channels_sim_id, nchannels, nsim,
+                max_npassi, random_state, batch_size, n_jobs, backend=backend,
+                progress=profiler.progress
+            )
+        elif engine in ("loop", "batch"):
+            T, V, nconv, ssval, n_steps = _simulate(
+                engine, S, fV, v_vui, mp_channels_sim_id, nchannels, nsim,
+                max_npassi, random_state, batch_size, backend=backend,
+                progress=profiler.progress
+            )
+        elif engine == "exact":
+            T, V, nconv, ssval, n_solves = _solve_exact(
+                S, fV, v_vui, mp_channels_sim_id, nchannels,
+                progress=profiler.progress
+            )
+        else:
+            raise ValueError(f"Unknown simulation engine: {engine!r}")
+    seconds = time.perf_counter() - t_start
+
+    if engine == "exact":
+        if sim_stats is not None:
+            sim_stats.update({
+                "engine": engine,
+                "n_solves": n_solves,
+                "seconds": seconds
+            })
+    elif sim_stats is not None:
+        sim_stats.update({
+            "engine": engine,
+            "backend": backend,
+            "n_jobs": n_jobs,
+            "n_walks": nsim,
+            "n_steps": int(n_steps),
+            "seconds": seconds,
+            "walks_per_second": nsim / seconds if seconds > 0 else None,
+            "steps_per_second": n_steps / seconds if seconds > 0 else None
+        })
+        sim_stats.update(adaptive_stats)
+
+    with profiler.phase("assemble"):
+        T[0] = 0
+        nch0 = nchannels - 3
+        T[nchannels - 2] = 0
+        T[nchannels - 1] = 0
+
+        sn = counts.sn
 
         sm = 0
+
         for i in range(nchannels - 1):
-            sm = sm + V[i]
+            sm = sm + T[i]
+
+        TV = [0] * nch0
+        rTV = [0] * (nch0)
 
         for k in range(nch0 + 1):
             if sm > 0:
-                VV[k - 1] = (V[k] / sm) * sn
+                TV[k - 1] = (T[k] / sm) * sn
                 if out_more:
                     # removal effects
-                    rVV[k - 1] = V[k] / ssval
+                    rTV[k - 1] = T[k] / nconv
 
-    vchannels0 = list(range(nch0))
+        VV = [0] * nch0
 
-    for k in range(nch0 + 1):
-        vchannels0[k - 1] = vchannels[k]
+        rVV = [0] * nch0
 
-    if flg_var_value:
-        if not out_more:
-            df = pd.DataFrame(
-                {
+        if flg_var_value:
+            V[0] = 0
+            V[nchannels - 2] = 0
+            V[nchannels - 1] = 0
+
+            sn = counts.sv
+
+            sm = 0
+            for i in range(nchannels - 1):
+                sm = sm + V[i]
+
+            for k in range(nch0 + 1):
+                if sm > 0:
+                    VV[k - 1] = (V[k] / sm) * sn
+                    if out_more:
+                        # removal effects
+                        rVV[k - 1] = V[k] / ssval
+
+        vchannels0 = list(range(nch0))
+
+        for k in range(nch0 + 1):
+            vchannels0[k - 1] = vchannels[k]
+
+        if se_conv is not None and sim_stats is not None:
+            # standard errors of the attributed totals
+            errors = pd.DataFrame({
+                "channel_name": vchannels0,
+                "total_conversions": se_conv
+            })
+            if flg_var_value:
+                errors["total_revenue"] = se_value
+            sim_stats["attribution_error"] = errors
+
+        if flg_var_value:
+            if not out_more:
+                df = pd.DataFrame(
+                    {
+                        "channel_name": vchannels0,
+                        "total_conversions": TV,
+                        "total_revenue": VV
+                    }
+                )
+                result = df
+            else:
+                df = pd.DataFrame({
                     "channel_name": vchannels0,
                     "total_conversions": TV,
                     "total_revenue": VV
-                }
-            )
-            return df
-        else:
-            df = pd.DataFrame({
-                "channel_name": vchannels0,
-                "total_conversions": TV,
-                "total_revenue": VV
-            })
+                })
 
-            re_df = pd.DataFrame({
-                "channel_name": vchannels0,
-                "removal_effect": rTV,
-                "removal_effect_value": rVV
-            })
+                re_df = pd.DataFrame({
+                    "channel_name": vchannels0,
+                    "removal_effect": rTV,
+                    "removal_effect_value": rVV
+                })
 
-            tmat = trans_mat.copy()
-            return df, re_df, tmat
-    else:
-        if not out_more:
-            df = pd.DataFrame({
-                "channel_name": vchannels0,
-                "total_conversions": TV
-            })
-            return df
+                result = df, re_df, trans_probs
         else:
-            df = pd.DataFrame({
-                "channel_name": vchannels0,
-                "total_conversions": TV
-            })
+            if not out_more:
+                df = pd.DataFrame({
+                    "channel_name": vchannels0,
+                    "total_conversions": TV
+                })
+                result = df
+            else:
+                df = pd.DataFrame({
+                    "channel_name": vchannels0,
+                    "total_conversions": TV
+                })
 
-            re_df = pd.DataFrame({
-                "channel_name": vchannels0,
-                "removal_effect": rTV
-            })
+                re_df = pd.DataFrame({
+                    "channel_name": vchannels0,
+                    "removal_effect": rTV
+                })
+
+                result = df, re_df, trans_probs
+
+    return result
+
+
+def _bootstrap_replicate(rng, arrays, context):
+    template, method, kwargs = context
+    weights = resample(rng, arrays["multiplicity"], method)
+    vc = arrays["vc"] * weights
+    vn = arrays["vn"] * weights
+    n_paths = len(arrays["state_offsets"]) - 1
+    vc_path = np.bincount(arrays["path_codes"], weights=vc,
+                          minlength=n_paths)
+    vn_path = np.bincount(arrays["path_codes"], weights=vn,
+                          minlength=n_paths)
+
+    # the counts are linear in the weights, so each replicate only sums
+    # the re-weighted transitions onto the transitions of the template
+    counts = template.copy_empty()
+    S_keys = arrays["S.keys"]
+    S_weights = np.stack((vc_path + vn_path, vc_path, vn_path))[
+        arrays["S.kinds"], arrays["S.paths"]
+    ]
+    counts.S = Fx.from_keys(
+        template.S.nrows, template.S.ncols, S_keys,
+        np.bincount(arrays["S.inverse"], weights=S_weights,
+                    minlength=len(S_keys))
+    )
+    if template.has_value:
+        fV_keys = arrays["fV.keys"]
+        counts.fV = Fx.from_keys(
+            template.fV.nrows, template.fV.ncols, fV_keys,
+            np.bincount(arrays["fV.inverse"],
+                        weights=vc[arrays["fV.rows"]],
+                        minlength=len(fV_keys))
+        )
+        counts.sv = (arrays["vv"] * weights).sum()
+    counts.sn = vc.sum()
+    counts.n_rows = weights.sum()
+
+    df = attribute_markov(counts, out_more=False, random_state=rng,
+                          n_jobs=None, **kwargs)
+    return {column: df[column].values for column in df.columns
+            if column != "channel_name"}
+
+
+def bootstrap_markov(df, paths, convs, conv_val, nulls, order, loops, sep,
+                     n_boot=200, ci=0.95, method="poisson",
+                     random_state=None, n_jobs=None, **kwargs):
+    """
+    Percentile bootstrap intervals of the Markov model.
+
+    The rows are resampled through random weights on the distinct rows.
+    The paths are tokenized and their transitions listed once, and each
+    replicate only sums the re-weighted transitions before attributing
+    them. `kwargs` are passed on to `attribute_markov`; the simulations
+    of each replicate draw from the replicate's own random stream.
+    """
+    columns = [paths, convs] + [c for c in (nulls, conv_val) if c]
+    rows, multiplicity = distinct_rows(df, columns)
+    vc = rows.loc[:, convs].values.astype(float)
+    vn = rows.loc[:, nulls].values.astype(float) if nulls \
+        else np.zeros_like(vc)
+    vv = rows.loc[:, conv_val].values.astype(float) if conv_val \
+        else np.zeros_like(vc)
+
+    # the template holds the vocabulary, the states and the conversion
+    # values of the full data
+    template = TransitionCounts(order, loops, sep, has_value=bool(conv_val))
+    path_codes, states, state_offsets = template.encode(rows.loc[:, paths])
+    template.add(path_codes, states, state_offsets, vc, vn=vn,
+                 vv=vv if conv_val else None)
+
+    ncols = template.nchannels_sim
+    t_rows, t_cols, t_paths, t_kinds, _ = _transition_structure(
+        states, state_offsets, ncols, loops
+    )
+    S_keys, S_inverse = np.unique(t_rows * ncols + t_cols,
+                                  return_inverse=True)
+    arrays = {
+        "path_codes": path_codes,
+        "state_offsets": state_offsets,
+        "multiplicity": multiplicity,
+        "vc": vc,
+        "vn": vn,
+        "vv": vv,
+        "S.keys": S_keys,
+        "S.inverse": S_inverse.ravel(),
+        "S.paths": t_paths,
+        "S.kinds": t_kinds
+    }
+    if conv_val:
+        lengths = np.diff(state_offsets)
+        last = np.zeros(len(lengths), dtype=np.int64)
+        last[lengths > 0] = states[state_offsets[1:][lengths > 0] - 1]
+        conv_rows = np.flatnonzero((vc > 0) & (lengths[path_codes] > 0))
+        vui_codes = template.mp_vui.get_indexer(vv[conv_rows] /
+                                                vc[conv_rows])
+        fV_keys, fV_inverse = np.unique(
+            last[path_codes[conv_rows]] * template.fV.ncols + vui_codes,
+            return_inverse=True
+        )
+        arrays.update({"fV.keys": fV_keys,
+                       "fV.inverse": fV_inverse.ravel(),
+                       "fV.rows": conv_rows})
+
+    replicates = run_replicates(
+        _bootstrap_replicate, n_boot, random_state, n_jobs, arrays,
+        (template.copy_empty(), method, kwargs)
+    )
+
+    names = template.vchannels[1:-2]
+    return percentile_intervals(
+        names,
+        {k: np.asarray([r[k] for r in replicates]) for k in replicates[0]},
+        ci
+    )
+
+
+def _row_alphabets(counts):
+    """
+    The number of states each state of `counts` can move to: the
+    channels and the two absorbing states from a state holding a full
+    window of channels, only the absorbing states from the shorter
+    windows of the paths shorter than the order, and every window of
+    up to `order` channels from (start).
+    """
+    n_channels = len(counts.mp_channels)
+    alphabets = np.full(counts.nchannels_sim, n_channels + 2.0)
+    if counts.order > 1:
+        members = counts.mp_channels_sim_id
+        alphabets[members[:, -1] < 0] = 2.0
+    alphabets[0] = sum(float(n_channels) ** k
+                       for k in range(1, counts.order + 1))
+    return alphabets
+
+
+def markov_order_statistics(path_codes, codes, offsets, channels, vc, vn,
+                            max_order, loops=True, sep=">>>",
+                            test_size=0.2, alpha=1.0, random_state=None):
+    """
+    Compare the Markov models of orders 1 to `max_order`.
+
+    The paths are tokenized once by the caller; each order only maps
+    the windows of the distinct paths onto its states and lists their
+    transitions, and every statistic is a weighted sum over them.
+
+    For each order, the log-likelihood of the observed transitions
+    under their maximum-likelihood probabilities gives the AIC and BIC,
+    the free parameters being the observed transitions less one per
+    state left. The held-out log-likelihood is that of the transitions
+    of a random `test_size` fraction of the rows, under the
+    probabilities counted on the other rows with additive smoothing
+    `alpha`, spread over the states each state can move to (see
+    `_row_alphabets`).
+
+    Returns
+    -------
+    stats: pandas.DataFrame; one row per order.
+    """
+    if alpha <= 0:
+        raise ValueError("alpha must be positive.")
+    rng = _check_random_state(random_state)
+    vc = np.asarray(vc, dtype=float)
+    vn = np.zeros_like(vc) if vn is None else np.asarray(vn, dtype=float)
+    n_paths = len(offsets) - 1
+
+    test = rng.random(len(vc)) < test_size
+
+    def by_path(mask):
+        # the three kinds of weights of every distinct path
+        w_c = np.bincount(path_codes, weights=vc * mask,
+                          minlength=n_paths)
+        w_n = np.bincount(path_codes, weights=vn * mask,
+                          minlength=n_paths)
+        return np.stack((w_c + w_n, w_c, w_n))
+
+    weights = {"all": by_path(np.ones(len(vc))), "train": by_path(~test),
+               "test": by_path(test)}
+
+    stats = []
+    for order in range(1, max_order + 1):
+        counts = TransitionCounts(order, loops, sep)
+        states, state_offsets = counts.encode_tokens(codes, offsets,
+                                                     channels)
+        ncols = counts.nchannels_sim
+        t_rows, t_cols, t_paths, t_kinds, _ = _transition_structure(
+            states, state_offsets, ncols, loops
+        )
+        inverse, keys = pd.factorize(t_rows * ncols + t_cols)
+        key_rows = keys // ncols
+        n = {name: np.bincount(inverse, weights=w[t_kinds, t_paths],
+                               minlength=len(keys))
+             for name, w in weights.items()}
+        totals = {name: np.bincount(key_rows, weights=v, minlength=ncols)
+                  for name, v in n.items()}
+
+        seen = n["all"] > 0
+        log_likelihood = np.sum(n["all"][seen] * np.log(
+            n["all"][seen] / totals["all"][key_rows[seen]]
+        ))
+        n_parameters = int(seen.sum() - np.count_nonzero(totals["all"]))
+        n_observations = n["all"].sum()
+
+        held_out = n["test"] > 0
+        alphabets = _row_alphabets(counts)[key_rows[held_out]]
+        probs = (n["train"][held_out] + alpha) / \
+            (totals["train"][key_rows[held_out]] + alpha * alphabets)
+
+        stats.append({
+            "order": order,
+            "n_states": ncols,
+            "n_transitions": int(seen.sum()),
+            "n_parameters": n_parameters,
+            "log_likelihood": log_likelihood,
+            "aic": 2 * n_parameters - 2 * log_likelihood,
+            "bic": n_parameters * np.log(max(n_observations, 1.0)) -
+            2 * log_likelihood,
+            "heldout_log_likelihood": np.sum(n["test"][held_out] *
+                                             np.log(probs))
+        })
+    return pd.DataFrame(stats)
+
+
+def _attribute_task(args):
+    counts, kwargs = args
+    return attribute_markov(counts, **kwargs)
+
+
+def _attribute_all(tasks, n_jobs=None):
+    """
+    Attribute the counts of every `(counts, kwargs)` task, in order.
+
+    The tasks are spread over `n_jobs` processes. They are consumed in
+    batches, so `tasks` may be a generator that builds the counts
+    lazily, and only a few of them are held in memory at a time.
+    """
+    n_jobs = effective_n_jobs(n_jobs)
+    tasks = iter(tasks)
+    if n_jobs == 1:
+        for task in tasks:
+            yield _attribute_task(task)
+        return
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        while True:
+            batch = list(itertools.islice(tasks, 4 * n_jobs))
+            if not batch:
+                break
+            yield from pool.map(_attribute_task, batch)
+
+
+def fit_markov_segments(df, by, paths, convs, conv_val, nulls, order,
+                        loops, sep, out_more=True, n_jobs=None, **kwargs):
+    """
+    Fit a Markov model on every segment of `df`.
+
+    The paths of all the segments are tokenized once. The counts of
+    each segment are built from the shared tokens with the segment's
+    own vocabulary, so every segment gets the results of fitting it on
+    its own, and the segments are attributed in parallel over `n_jobs`
+    processes. `kwargs` are passed on to `attribute_markov`.
+
+    Returns the attribution and removal effects of all the segments in
+    long format, prefixed with the segment keys; the removal effects
+    are None unless `out_more`.
+    """
+    ids, keys = segment_ids(df, by)
+    path_codes, distinct_paths = factorize_paths(df.loc[:, paths])
+    codes, offsets, vocabulary = tokenize_paths(distinct_paths, sep)
+    channels = list(vocabulary.keys())
+    vc = df.loc[:, convs].values
+    vn = df.loc[:, nulls].values if nulls else None
+    vv = df.loc[:, conv_val].values if conv_val else None
+
+    def segment_tasks():
+        # the counts of each segment are built as the segment is
+        # attributed, so only a few of them are held at a time
+        for rows in segment_rows(ids, len(keys)):
+            seg_codes, seg_paths = pd.factorize(path_codes[rows])
+            counts = TransitionCounts(order, loops, sep,
+                                      has_value=bool(conv_val))
+            states, state_offsets = counts.encode_tokens(
+                *take_paths(codes, offsets, seg_paths), channels
+            )
+            counts.add(seg_codes, states, state_offsets, vc[rows],
+                       vn=None if vn is None else vn[rows],
+                       vv=None if vv is None else vv[rows])
+            # every segment starts from the same random state, as when
+            # the segments are fitted one by one
+            yield counts, dict(kwargs, out_more=out_more,
+                               random_state=copy.deepcopy(
+                                   kwargs.get("random_state")))
+
+    results = list(_attribute_all(segment_tasks(), n_jobs))
+    if not out_more:
+        return long_frame(keys, results), None
+    return (long_frame(keys, [r[0] for r in results]),
+            long_frame(keys, [r[1] for r in results]))
+
+
+def _present_channels(counts):
+    """The channels of the states that have transitions."""
+    S = counts.S
+    rows = S.row_indices()
+    present = np.bincount(rows, weights=S.data, minlength=S.nrows) + \
+        np.bincount(S.indices, weights=S.data, minlength=S.nrows) > 0
+    if counts.order == 1:
+        channels = np.flatnonzero(present)
+    else:
+        channels = np.unique(counts.mp_channels_sim_id[present])
+    # (start), (conversion) and (null) are not channels
+    channels = channels[(channels > 0) & (channels < counts.nchannels - 2)]
+    return channels - 1
+
+
+def fit_markov_windows(df, dates, window, step, paths, convs, conv_val,
+                       nulls, order, loops, sep, out_more=True,
+                       n_jobs=None, **kwargs):
+    """
+    Fit a Markov model on every sliding window of days of `df`.
+
+    The paths are encoded once with a shared vocabulary and the
+    transitions of every distinct path are listed once. The counts of
+    a window are then kept as a running sum, adding the transitions of
+    the day that enters the window and subtracting those of the day
+    that leaves it. The counts of each day are computed once and kept,
+    sparse, while the day is in the window, so the data is only gone
+    through once whatever the number of windows; each window is then
+    attributed,
+    in parallel over `n_jobs` processes. `kwargs` are passed on to
+    `attribute_markov`.
+
+    Returns the attribution and removal effects of all the windows in
+    long format, prefixed with the first and last day of the window;
+    the removal effects are None unless `out_more`. Channels without
+    transitions in a window are left out of it.
+    """
+    days, first = day_numbers(df.loc[:, dates])
+    n_days = int(days.max()) + 1 if len(days) else 0
+    ends, window, keys = windows(first, n_days, window, step)
+
+    vc = df.loc[:, convs].values.astype(float)
+    vn = df.loc[:, nulls].values.astype(float) if nulls \
+        else np.zeros_like(vc)
+    vv = df.loc[:, conv_val].values.astype(float) if conv_val \
+        else np.zeros_like(vc)
+
+    # the template holds the vocabulary, the states and the conversion
+    # values of all the days
+    template = TransitionCounts(order, loops, sep, has_value=bool(conv_val))
+    path_codes, states, state_offsets = template.encode(df.loc[:, paths])
+    template.add(path_codes, states, state_offsets, vc,
+                 vn=vn if nulls else None, vv=vv if conv_val else None)
+    n_paths = len(state_offsets) - 1
+
+    # the transitions of every distinct path, grouped by path
+    ncols = template.nchannels_sim
+    t_rows, t_cols, t_paths, t_kinds, _ = _transition_structure(
+        states, state_offsets, ncols, loops
+    )
+    S_keys, S_inverse = np.unique(t_rows * ncols + t_cols,
+                                  return_inverse=True)
+    S_inverse = S_inverse.ravel()
+    t_order = np.argsort(t_paths, kind="stable")
+    t_ptr = np.zeros(n_paths + 1, dtype=np.int64)
+    np.cumsum(np.bincount(t_paths, minlength=n_paths), out=t_ptr[1:])
 
-            tmat = trans_mat.copy()
-            return df, re_df, tmat
+    if conv_val:
+        lengths = np.diff(state_offsets)
+        last = np.zeros(len(lengths), dtype=np.int64)
+        last[lengths > 0] = states[state_offsets[1:][lengths > 0] - 1]
+        conv_rows = np.flatnonzero((vc > 0) & (lengths[path_codes] > 0))
+        vui_codes = template.mp_vui.get_indexer(vv[conv_rows] /
+                                                vc[conv_rows])
+        fV_keys, fV_inverse = np.unique(
+            last[path_codes[conv_rows]] * template.fV.ncols + vui_codes,
+            return_inverse=True
+        )
+        fV_inverse = fV_inverse.ravel()
+        fV_days = segment_rows(days[conv_rows], n_days)
+
+    day_rows = segment_rows(days, n_days)
+
+    def day_counts(d):
+        """The transition counts, value counts and totals of day `d`,
+        the counts as (index, count) pairs of their nonzero entries."""
+        rows = day_rows[d]
+        day_paths, distinct = pd.factorize(path_codes[rows])
+        vc_path = np.bincount(day_paths, weights=vc[rows],
+                              minlength=len(distinct))
+        vn_path = np.bincount(day_paths, weights=vn[rows],
+                              minlength=len(distinct))
+        idx, idx_offsets = take_paths(t_order, t_ptr, distinct)
+        local = np.repeat(np.arange(len(distinct)), np.diff(idx_offsets))
+        weights = np.stack((vc_path + vn_path, vc_path, vn_path))[
+            t_kinds[idx], local
+        ]
+        S_day = _nonzero(np.bincount(S_inverse[idx], weights=weights,
+                                     minlength=len(S_keys)))
+        fV_day = None
+        if conv_val:
+            k = fV_days[d]
+            fV_day = _nonzero(np.bincount(fV_inverse[k],
+                                          weights=vc[conv_rows[k]],
+                                          minlength=len(fV_keys)))
+        totals = np.array([vc[rows].sum(), vv[rows].sum(), len(rows)])
+        return S_day, fV_day, totals
+
+    present = []
+
+    def window_tasks():
+        S_win = np.zeros(len(S_keys))
+        fV_win = np.zeros(len(fV_keys)) if conv_val else None
+        totals = np.zeros(3)
+        # the counts of the days in the window, until they leave it
+        kept = {}
+        entered = 0
+        for end in ends:
+            # add the days entering the window and subtract those
+            # leaving it
+            for d in range(max(entered, end - window + 1), end + 1):
+                kept[d] = S_day, fV_day, day_totals = day_counts(d)
+                S_win[S_day[0]] += S_day[1]
+                if conv_val:
+                    fV_win[fV_day[0]] += fV_day[1]
+                totals += day_totals
+            for d in range(max(entered - window, 0),
+                           min(end - window + 1, entered)):
+                S_day, fV_day, day_totals = kept.pop(d)
+                S_win[S_day[0]] -= S_day[1]
+                if conv_val:
+                    fV_win[fV_day[0]] -= fV_day[1]
+                totals -= day_totals
+            entered = end + 1
+
+            counts = template.copy_empty()
+            counts.S = Fx.from_keys(ncols, ncols, S_keys,
+                                    _drop_residue(S_win))
+            if conv_val:
+                counts.fV = Fx.from_keys(template.fV.nrows,
+                                         template.fV.ncols, fV_keys,
+                                         _drop_residue(fV_win))
+            counts.sn, counts.sv, counts.n_rows = totals.tolist()
+            present.append(_present_channels(counts))
+            # every window starts from the same random state
+            yield counts, dict(kwargs, out_more=out_more,
+                               random_state=copy.deepcopy(
+                                   kwargs.get("random_state")))
+
+    attribution = []
+    removal_effects = []
+    for i, result in enumerate(_attribute_all(window_tasks(), n_jobs)):
+        keep = present[i]
+        if out_more:
+            result, re_df = result[0], result[1]
+            removal_effects.append(re_df.iloc[keep]
+                                   .reset_index(drop=True))
+        attribution.append(result.iloc[keep].reset_index(drop=True))
+
+    return (long_frame(keys, attribution),
+            long_frame(keys, removal_effects) if out_more else None)
+
+
+def _nonzero(counts):
+    """The indices and values of the nonzero entries of `counts`."""
+    idx = np.flatnonzero(counts)
+    return idx, counts[idx]
+
+
+def _drop_residue(counts):
+    """Zero the rounding residue left by subtracting counts."""
+    counts = counts.copy()
+    counts[counts <= 1e-9 * max(np.abs(counts).max(initial=0.0), 1.0)] = 0
+    return counts
+
+
+def fit_markov(df, paths, convs, conv_val, nulls, nsim, max_step,
+               out_more, sep, order, random_state, loops, engine="loop",
+               batch_size=100000, sampler="cdf", n_jobs=None,
+               sim_stats=None, revenue_bins=None, tol=None,
+               n_batches=20, backend="python"):
+    counts = TransitionCounts(order, loops, sep, has_value=bool(conv_val))
+    counts.update(
+        get_column(df, paths),
+        numeric_values(get_column(df, convs)),
+        vn=numeric_values(get_column(df, nulls)) if nulls else None,
+        vv=numeric_values(get_column(df, conv_val)) if conv_val else None
+    )
+    return attribute_markov(counts, nsim, max_step, out_more,
+                            random_state, engine=engine,
+                            batch_size=batch_size, sampler=sampler,
+                            n_jobs=n_jobs, sim_stats=sim_stats,
+                            revenue_bins=revenue_bins, tol=tol,
+                            n_batches=n_batches, backend=backend)
@@ -11,13 +11,14 @@ import abc
 class AttributionModelBase(metaclass=abc.ABCMeta):
     def __init__(self, path_feature, conversion_feature,
                  null_feature=None, revenue_feature=None,
-                 cost_feature=None, separator=">>>"):
+                 cost_feature=None, separator=">>>", callbacks=None):
         self.paths = path_feature
         self.conversions = conversion_feature
         self.nulls = null_feature
         self.revenues = revenue_feature
         self.costs = cost_feature
         self.sep = separator
+        self.callbacks = callbacks
 
     def fit(self, df):
         """
@@ -25,18 +26,27 @@ class AttributionModelBase(metaclass=abc.ABCMeta):
 
         Parameters
         ----------
-        df: pandas.DataFrame; required.
+        df: one of {pandas.DataFrame, pyarrow.Table, dict}; required.
           NOTE: Each row in the DataFrame should contain a single
           path. Aggregation among paths will be handled during the
           model-fitting process.
 
+          The data is not copied: only the modeled columns are read,
+          and Arrow-backed columns (a pyarrow Table, or pandas columns
+          with an ArrowDtype or the "string[pyarrow]" dtype) are read
+          from their buffers.
+
         Returns
         -------
         self
         """
 
-        self._df = df.copy()
+        self._df = df
+        self._init_features()
+
+        return self
 
+    def _init_features(self):
         # used in various places by both models
         self._has_rev = True if self.revenues else False
         self._has_cost = True if self.costs else False
@@ -49,13 +59,14 @@ class HeuristicModelMixin(AttributionModelBase, metaclass=abc.ABCMeta):
                  null_feature=None, revenue_feature=None,
                  cost_feature=None, separator=">>>", first_touch=True,
                  last_touch=True, linear_touch=True,
-                 ensemble_results=True):
+                 ensemble_results=True, callbacks=None):
 
         super().__init__(path_feature, conversion_feature,
                          null_feature=null_feature,
                          revenue_feature=revenue_feature,
                          cost_feature=cost_feature,
-                         separator=separator)
+                         separator=separator,
+                         callbacks=callbacks)
 
         self.first = first_touch
         self.last = last_touch
@@ -67,45 +78,8 @@ class HeuristicModelMixin(AttributionModelBase, metaclass=abc.ABCMeta):
 
         self._get_heuristics()
 
-        # aggregate by path
-        if df.loc[:, self.paths].max() == 1:
-            self._aggregate_paths(self._df)
-        else:
-            self._df = self._split_paths(df)
-
         return self
 
-    def _aggregate_paths(self, df):
-        """Aggregate the unique paths."""
-        aggs = {
-            self.conversions: "sum"
-        }
-
-        if self._has_rev:
-            aggs[self.revenues] = "sum"
-        if self._has_cost:
-            aggs[self.costs] = "sum"
-
-        # aggregate the values by path
-        gb = df.groupby([self.paths], as_index=False).agg(aggs)
-
-        self._df = self._split_paths(gb)
-
-        return self
-
-    def _split_paths(self, df):
-        # split the paths into lists of channels
-        df.loc[:, self.paths] = df.loc[:, self.paths].apply(
-            lambda s: s.split(self.sep)
-        )
-
-        # remove whitespace around channel names
-        df.loc[:, self.paths] = df.loc[:, self.paths].apply(
-            lambda s: [ss.strip() for ss in s]
-        )
-
-        return df
-
     def _get_heuristics(self):
         """Get the heuristic models to build."""
         heuristics = []
@@ -129,12 +103,16 @@ class MarkovModelMixin(AttributionModelBase, metaclass=abc.ABCMeta):
                  null_feature=None, revenue_feature=None,
                  cost_feature=None, separator=">>>", k_order=1,
                  n_simulations=10000, max_steps=None,
-                 return_transition_probs=True, random_state=None, loops=True):
+                 return_transition_probs=True, random_state=None, loops=True,
+                 engine="loop", batch_size=100000, sampler="cdf",
+                 n_jobs=None, revenue_bins=None, tol=None,
+                 n_batches=20, backend="python", callbacks=None):
         super().__init__(path_feature, conversion_feature,
                          null_feature=null_feature,
                          revenue_feature=revenue_feature,
                          cost_feature=cost_feature,
-                         separator=separator)
+                         separator=separator,
+                         callbacks=callbacks)
 
         self.order = k_order
         self.n_sim = n_simulations
@@ -142,6 +120,14 @@ class MarkovModelMixin(AttributionModelBase, metaclass=abc.ABCMeta):
         self.trans_probs = return_transition_probs
         self.random_state = random_state
         self.loops = loops
+        self.engine = engine
+        self.batch_size = batch_size
+        self.sampler = sampler
+        self.n_jobs = n_jobs
+        self.revenue_bins = revenue_bins
+        self.tol = tol
+        self.n_batches = n_batches
+        self.backend = backend
 
     def fit(self, df):
         super().fit(df)
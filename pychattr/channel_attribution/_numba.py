@@ -0,0 +1,291 @@
+"""
+Contains the optional Numba kernels used by the Markov model.
+
+The kernels follow the Python implementations step by step and consume
+the random numbers in the same order, so both backends give identical
+results for a given `random_state`.
+"""
+# Author: Jason Wolosonovich <jason@refinerynet.com>
+# License: BSD 3-clause
+
+import warnings
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+BACKENDS = ("python", "numba")
+
+
+def resolve_backend(backend):
+    """Check `backend`, falling back to "python" with a warning when
+    Numba is not installed."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend!r}")
+    if backend == "numba" and numba is None:
+        warnings.warn("Numba is not installed; falling back to the "
+                      "Python backend.", RuntimeWarning)
+        return "python"
+    return backend
+
+
+def _njit(f=None, **options):
+    if f is None:
+        return lambda f: _njit(f, **options)
+    if numba is None:
+        return f
+    return numba.njit(cache=True, nogil=True, **options)(f)
+
+
+@_njit
+def alias_tables(indptr, indices, data, totals):
+    """Compiled version of `_markov._alias_tables`."""
+    prob = np.ones(data.shape, dtype=np.float64)
+    alias = indices.copy()
+    nrows = len(indptr) - 1
+    width = 0
+    for i in range(nrows):
+        width = max(width, indptr[i + 1] - indptr[i])
+    p = np.empty(width, dtype=np.float64)
+    small = np.empty(width, dtype=np.int64)
+    large = np.empty(width, dtype=np.int64)
+
+    for i in range(nrows):
+        lo = indptr[i]
+        hi = indptr[i + 1]
+        if hi - lo <= 1 or totals[i] <= 0:
+            continue
+        scale = (hi - lo) / totals[i]
+        n_small = 0
+        n_large = 0
+        for k in range(hi - lo):
+            p[k] = data[lo + k] * scale
+            if p[k] < 1.0:
+                small[n_small] = k
+                n_small += 1
+            else:
+                large[n_large] = k
+                n_large += 1
+        while n_small > 0 and n_large > 0:
+            n_small -= 1
+            ks = small[n_small]
+            kl = large[n_large - 1]
+            prob[lo + ks] = p[ks]
+            alias[lo + ks] = indices[lo + kl]
+            p[kl] = (p[kl] + p[ks]) - 1.0
+            if p[kl] < 1.0:
+                n_large -= 1
+                small[n_small] = kl
+                n_small += 1
+
+    return prob, alias
+
+
+@_njit(inline="always")
+def _sim(indptr, indices, S1, lrS, alias_prob, alias_idx, use_alias, c,
+         uni):
+    """Compiled version of `Fx.sim`."""
+    lo = indptr[c]
+    hi = indptr[c + 1]
+    if use_alias:
+        if hi == lo or lrS[c] <= 0:
+            return 0
+        x = uni * (hi - lo)
+        j = min(int(x), hi - lo - 1)
+        if x - j < alias_prob[lo + j]:
+            return indices[lo + j]
+        return alias_idx[lo + j]
+
+    # bisect.bisect_right
+    target = uni * lrS[c]
+    a = lo
+    b = hi
+    while a < b:
+        mid = (a + b) // 2
+        if target < S1[mid]:
+            b = mid
+        else:
+            a = mid + 1
+    if a < hi:
+        return indices[a]
+    return 0
+
+
+# the positions in the state of an interrupted simulation
+_I, _C, _NPASSI, _C_LAST, _PHASE, _IU, _NCONV, _NSTEPS = range(8)
+
+
+@_njit
+def _walk(state, fstate, C, T, V, vunif,
+          indptr, indices, S1, lrS, alias_prob, alias_idx,
+          v_indptr, v_indices, v_S1, v_lrS, v_alias_prob, v_alias_idx,
+          v_vui, use_alias, flg_var_value, members, nchannels, nsim,
+          max_npassi):
+    """
+    The simulation loop of `_markov._simulate_loop`.
+
+    Returns False when the block of random numbers `vunif` runs out;
+    the caller then draws the next block and resumes the simulation
+    from `state`, exactly where it stopped.
+    """
+    nchannels_sim = len(indptr) - 1
+    order = members.shape[1]
+    nuf = len(vunif)
+    i = state[_I]
+    c = state[_C]
+    npassi = state[_NPASSI]
+    c_last = state[_C_LAST]
+    phase = state[_PHASE]
+    iu = state[_IU]
+    nconv = state[_NCONV]
+    n_steps = state[_NSTEPS]
+    sval0 = fstate[0]
+    ssval = fstate[1]
+    done = True
+
+    while i < nsim:
+        if phase == 0:
+            c = 0
+            npassi = 0
+            for k in range(nchannels):
+                C[k] = 0
+            C[c] = 1
+            phase = 1
+
+        if phase == 1:
+            while npassi <= max_npassi:
+                if iu >= nuf:
+                    done = False
+                    break
+                # the body of `_sim`, written out: Numba does not
+                # optimize the walk as well through the call
+                lo = indptr[c]
+                hi = indptr[c + 1]
+                uni = vunif[iu]
+                if use_alias:
+                    if hi == lo or lrS[c] <= 0:
+                        c = 0
+                    else:
+                        x = uni * (hi - lo)
+                        j = min(int(x), hi - lo - 1)
+                        if x - j < alias_prob[lo + j]:
+                            c = indices[lo + j]
+                        else:
+                            c = alias_idx[lo + j]
+                else:
+                    target = uni * lrS[c]
+                    a = lo
+                    b = hi
+                    while a < b:
+                        mid = (a + b) // 2
+                        if target < S1[mid]:
+                            b = mid
+                        else:
+                            a = mid + 1
+                    c = indices[a] if a < hi else 0
+                iu += 1
+                n_steps += 1
+
+                if c == (nchannels_sim - 2):
+                    break
+                elif c == (nchannels_sim - 1):
+                    break
+                for j in range(order):
+                    id0 = members[c, j]
+                    if id0 >= 0:
+                        C[id0] = 1
+                    else:
+                        break
+                c_last = c
+                npassi = npassi + 1
+            if not done:
+                break
+            phase = 2
+
+        if c == (nchannels_sim - 2):
+            if flg_var_value:
+                if iu >= nuf:
+                    done = False
+                    break
+                sval0 = v_vui[_sim(v_indptr, v_indices, v_S1, v_lrS,
+                                   v_alias_prob, v_alias_idx, use_alias,
+                                   c_last, vunif[iu])]
+                iu += 1
+            nconv += 1
+            ssval = ssval + sval0
+
+            for k in range(nchannels):
+                if C[k] == 1:
+                    T[k] = T[k] + 1
+                    if flg_var_value:
+                        V[k] = V[k] + sval0
+        phase = 0
+        i += 1
+
+    state[_I] = i
+    state[_C] = c
+    state[_NPASSI] = npassi
+    state[_C_LAST] = c_last
+    state[_PHASE] = phase
+    state[_IU] = iu
+    state[_NCONV] = nconv
+    state[_NSTEPS] = n_steps
+    fstate[0] = sval0
+    fstate[1] = ssval
+    return done
+
+
+def _sampling_arrays(fx):
+    empty_f = np.zeros(0, dtype=np.float64)
+    empty_i = np.zeros(0, dtype=np.int64)
+    return (
+        np.asarray(fx.indptr, dtype=np.int64),
+        np.asarray(fx.indices, dtype=np.int64),
+        np.asarray(fx.S1, dtype=np.float64),
+        np.asarray(fx.lrS, dtype=np.float64),
+        empty_f if fx.alias_prob is None
+        else np.asarray(fx.alias_prob, dtype=np.float64),
+        empty_i if fx.alias_idx is None
+        else np.asarray(fx.alias_idx, dtype=np.int64)
+    )
+
+
+def simulate_loop(S, fV, v_vui, mp_channels_sim_id, nchannels, nsim,
+                  max_npassi, rng, progress=None):
+    """Compiled counterpart of `_markov._simulate_loop`, drawing the
+    random numbers from `rng` in blocks of the same size."""
+    nuf = int(1e6)
+    flg_var_value = v_vui is not None
+    if mp_channels_sim_id is None:
+        members = np.arange(S.nrows, dtype=np.int64).reshape(-1, 1)
+    else:
+        members = np.asarray(mp_channels_sim_id, dtype=np.int64)
+
+    s_arrays = _sampling_arrays(S)
+    if flg_var_value:
+        v_arrays = _sampling_arrays(fV)
+        v_vui = np.asarray(v_vui, dtype=np.float64)
+    else:
+        v_arrays = s_arrays
+        v_vui = np.zeros(1, dtype=np.float64)
+
+    state = np.zeros(8, dtype=np.int64)
+    fstate = np.zeros(2, dtype=np.float64)
+    C = np.zeros(nchannels, dtype=np.int64)
+    T = np.zeros(nchannels, dtype=np.int64)
+    V = np.zeros(nchannels, dtype=np.float64)
+
+    vunif = rng.uniform(size=nuf)
+    while not _walk(state, fstate, C, T, V, vunif, *s_arrays, *v_arrays,
+                    v_vui, S.alias_prob is not None, flg_var_value,
+                    members, nchannels, nsim, max_npassi):
+        vunif = rng.uniform(size=nuf)
+        state[_IU] = 0
+        if progress is not None:
+            progress(n_walks=int(state[_I]), n_steps=int(state[_NSTEPS]))
+
+    return T, V, int(state[_NCONV]), float(fstate[1]), int(state[_NSTEPS])
@@ -0,0 +1,77 @@
+"""
+Contains the helpers used to spread model fitting over processes.
+"""
+# Author: Jason Wolosonovich <jason@refinerynet.com>
+# License: BSD 3-clause
+
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def effective_n_jobs(n_jobs):
+    """The number of processes to use; negative values count back from
+    the number of CPUs, so -1 means all of them."""
+    if n_jobs is None or n_jobs == 0:
+        return 1
+    if n_jobs < 0:
+        return max(os.cpu_count() + 1 + n_jobs, 1)
+    return n_jobs
+
+
+def spawn_seeds(random_state, n):
+    """Derive `n` independent random streams from `random_state`."""
+    if isinstance(random_state, np.random.SeedSequence):
+        return random_state.spawn(n)
+    if isinstance(random_state, np.random.RandomState):
+        random_state = random_state.randint(np.iinfo(np.int32).max)
+    elif isinstance(random_state, np.random.Generator):
+        random_state = int(random_state.integers(np.iinfo(np.int64).max))
+    return np.random.SeedSequence(random_state).spawn(n)
+
+
+def split_evenly(total, n):
+    """Split `total` into `n` parts whose sizes differ by at most 1."""
+    sizes = np.full(n, total // n, dtype=np.int64)
+    sizes[:total % n] += 1
+    return sizes.tolist()
+
+
+def share_arrays(arrays):
+    """
+    Copy a dict of arrays into a single block of shared memory.
+
+    Returns the shared memory block, which the caller must close and
+    unlink, and the layout needed by `attach_arrays`.
+    """
+    layout = {}
+    offset = 0
+    for name, arr in arrays.items():
+        arr = np.asarray(arr)
+        # keep every array aligned on a cache line
+        offset = -(-offset // 64) * 64
+        layout[name] = (offset, arr.dtype.str, arr.shape)
+        offset += arr.nbytes
+
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for name, arr in arrays.items():
+        view = _view(shm, layout[name])
+        view[...] = arr
+    return shm, layout
+
+
+def attach_arrays(name, layout):
+    """Map the arrays of a block created by `share_arrays` without
+    copying them. The arrays are read-only."""
+    shm = shared_memory.SharedMemory(name=name)
+    arrays = {}
+    for key, spec in layout.items():
+        arrays[key] = _view(shm, spec)
+        arrays[key].flags.writeable = False
+    return shm, arrays
+
+
+def _view(shm, spec):
+    offset, dtype, shape = spec
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
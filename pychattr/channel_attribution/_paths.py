@@ -0,0 +1,331 @@
+"""
+Contains the path encoders shared by the attribution models.
+"""
+# Author: Jason Wolosonovich <jason@refinerynet.com>
+# License: BSD 3-clause
+
+import itertools
+import operator
+
+import numpy as np
+import pandas as pd
+
+from ._io import arrow_array, pa
+
+
+def factorize_paths(paths):
+    """
+    Encode a column of paths as the index of its distinct paths.
+
+    Arrow-backed columns (see `arrow_array`) are dictionary-encoded on
+    their buffers, so only the distinct paths are turned into Python
+    strings; other columns are factorized with pandas. Either way the
+    distinct paths are in order of first appearance, and the missing
+    paths are one more distinct path, None, which `tokenize_paths`
+    encodes as an empty path.
+
+    Returns
+    -------
+    path_codes: numpy.ndarray of int64; the distinct path of every
+      row.
+
+    distinct_paths: numpy.ndarray of object; the distinct paths.
+    """
+    chunked = arrow_array(paths)
+    if chunked is None:
+        path_codes, distinct_paths = pd.factorize(
+            np.asarray(paths, dtype=object), use_na_sentinel=False
+        )
+        return path_codes.astype(np.int64), distinct_paths
+
+    refactorize = pa.types.is_dictionary(chunked.type)
+    if refactorize:
+        chunked = chunked.unify_dictionaries()
+    else:
+        # the chunks are encoded with one memo table, so the dictionary
+        # of the last chunk holds the paths of all of them
+        chunked = chunked.dictionary_encode(null_encoding="encode")
+    if chunked.num_chunks == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=object)
+
+    path_codes = np.concatenate([
+        chunk.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+        for chunk in chunked.chunks
+    ]).astype(np.int64)
+    dictionary = chunked.chunk(chunked.num_chunks - 1).dictionary
+    if refactorize:
+        # a dictionary column may hold unused entries in any order, and
+        # its missing paths are missing indices
+        path_codes, used = pd.factorize(path_codes)
+        path_codes = path_codes.astype(np.int64)
+        dictionary = dictionary.take(pa.array(used, mask=used < 0))
+    distinct_paths = dictionary.to_numpy(zero_copy_only=False)
+    return path_codes, np.asarray(distinct_paths, dtype=object)
+
+
+def path_tokens(paths):
+    """
+    The channels of pre-tokenized paths, or None when `paths` are
+    strings to be split.
+
+    Pre-tokenized paths are given either as a tuple `(codes, offsets)`
+    or `(codes, offsets, channels)` of flat integer codes, where the
+    channels of path `i` are `codes[offsets[i]:offsets[i + 1]]` and
+    `channels` names the codes; or as a list-typed column holding the
+    channels of every path as a sequence of names or of integer codes,
+    e.g. a pyarrow list array or a pandas column of lists. Integer
+    codes without `channels` are named by their string form. Missing
+    paths are empty, as `tokenize_paths` encodes missing strings.
+
+    Returns
+    -------
+    codes: numpy.ndarray of int64; the channel of every touch, as an
+      index into `channels`.
+
+    offsets: numpy.ndarray of int64; the touches of path `i` are
+      `codes[offsets[i]:offsets[i + 1]]`.
+
+    channels: sequence of str; the name of each code.
+    """
+    if isinstance(paths, tuple):
+        codes = np.asarray(paths[0], dtype=np.int64)
+        offsets = np.asarray(paths[1], dtype=np.int64)
+        if len(paths) > 2:
+            return codes, offsets, paths[2]
+        return _name_codes(codes, offsets)
+
+    chunked = arrow_array(paths)
+    if chunked is not None:
+        if pa.types.is_list(chunked.type) or \
+                pa.types.is_large_list(chunked.type):
+            return _arrow_tokens(chunked)
+        return None
+
+    values = pd.Series(paths, copy=False).to_numpy(dtype=object)
+    valid = np.flatnonzero(pd.notna(values))
+    if len(valid) == 0 or isinstance(values[valid[0]], str):
+        return None
+
+    lengths = np.zeros(len(values), dtype=np.int64)
+    lengths[valid] = np.fromiter(map(len, values[valid]), dtype=np.int64,
+                                 count=len(valid))
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    flat = np.fromiter(itertools.chain.from_iterable(values[valid]),
+                       dtype=object, count=offsets[-1])
+    if pd.api.types.infer_dtype(flat) == "integer":
+        return _name_codes(flat.astype(np.int64), offsets)
+    codes, channels = pd.factorize(flat)
+    return codes.astype(np.int64), offsets, channels
+
+
+def _name_codes(codes, offsets):
+    """Name integer codes by their string form, in order of first
+    appearance."""
+    codes, used = pd.factorize(codes)
+    return (codes.astype(np.int64), offsets,
+            [str(code) for code in used.tolist()])
+
+
+def _arrow_tokens(chunked):
+    """The flat codes, offsets and channel names of an Arrow list
+    column."""
+    import pyarrow.compute as pc
+
+    lengths = pc.list_value_length(chunked).fill_null(0)
+    offsets = np.zeros(len(chunked) + 1, dtype=np.int64)
+    np.cumsum(lengths.to_numpy(), out=offsets[1:])
+
+    # the touches of every path, without the sub-lists hidden behind
+    # missing paths or slicing
+    value_type = chunked.type.value_type
+    values = [chunk.flatten() for chunk in chunked.chunks]
+    if pa.types.is_dictionary(value_type):
+        values = [chunk.dictionary_decode() for chunk in values]
+        value_type = value_type.value_type
+    values = pa.chunked_array(values, type=value_type)
+
+    if pa.types.is_integer(value_type):
+        return _name_codes(values.to_numpy(), offsets)
+    # the chunks are encoded with one memo table, so the dictionary of
+    # the last chunk holds the channels of all of them
+    encoded = values.dictionary_encode()
+    if encoded.num_chunks == 0:
+        return np.zeros(0, dtype=np.int64), offsets, []
+    codes = np.concatenate([
+        chunk.indices.to_numpy() for chunk in encoded.chunks
+    ]).astype(np.int64)
+    channels = encoded.chunk(encoded.num_chunks - 1).dictionary
+    return codes, offsets, channels.to_pylist()
+
+
+def remap_tokens(codes, channels, vocabulary):
+    """
+    Map codes indexing the names `channels` to the codes of
+    `vocabulary`, adding the new channels to it in order of first
+    appearance, as `tokenize_paths` would add them.
+    """
+    inverse, used = pd.factorize(np.asarray(codes, dtype=np.int64))
+    table = np.array([vocabulary.setdefault(channels[c], len(vocabulary))
+                      for c in used.tolist()], dtype=np.int64)
+    return table[inverse]
+
+
+def factorize_tokens(codes, offsets, n_codes):
+    """
+    Find the distinct paths of a ragged array of codes in
+    `range(n_codes)`.
+
+    The paths short enough are packed into a single integer, their
+    codes being its digits in base `n_codes + 1`, and factorized as
+    such; the longer ones are compared as bytes.
+
+    Returns
+    -------
+    path_codes: numpy.ndarray of int64; the distinct path of every
+      path, numbered in order of first appearance like
+      pandas.factorize.
+
+    codes, offsets: numpy.ndarray of int64; the distinct paths.
+    """
+    lengths = offsets[1:] - offsets[:-1]
+    # without codes every path is empty, but the base must still grow
+    base = max(n_codes + 1, 2)
+    digits = 1
+    while base ** (digits + 1) < 2 ** 63:
+        digits += 1
+
+    keys = np.zeros(len(lengths), dtype=np.int64)
+    short = lengths <= digits
+    rows = np.flatnonzero(short & (lengths > 0))
+    if len(rows):
+        short_codes, short_offsets = take_paths(codes, offsets, rows)
+        positions = np.arange(len(short_codes)) - \
+            np.repeat(short_offsets[:-1], lengths[rows])
+        powers = base ** np.arange(digits, dtype=np.int64)
+        keys[rows] = np.add.reduceat((short_codes + 1) * powers[positions],
+                                     short_offsets[:-1])
+
+    rows = np.flatnonzero(~short)
+    if len(rows):
+        bounds = zip(offsets[rows].tolist(), offsets[rows + 1].tolist())
+        blobs = np.array([codes[lo:hi].tobytes() for lo, hi in bounds],
+                         dtype=object)
+        keys[rows] = -1 - pd.factorize(blobs)[0]
+
+    path_codes = pd.factorize(keys)[0].astype(np.int64)
+    # the codes are numbered in order of first appearance, so each path
+    # seen for the first time raises the largest code so far
+    first = np.flatnonzero(np.diff(np.maximum.accumulate(path_codes),
+                                   prepend=-1))
+    return (path_codes,) + take_paths(codes, offsets, first)
+
+
+def tokenize_paths(paths, sep, vocabulary=None, chunk_size=2 ** 20,
+                   keep_empty=False):
+    """
+    Encode a column of path strings as a ragged array of channel codes.
+
+    Each path is split on the full separator, the surrounding whitespace
+    is removed from every channel name and empty channel names are
+    dropped unless `keep_empty` is set. Missing paths (None or NaN) are
+    empty. The work is done in bulk on blocks of paths so that no
+    per-character Python loop is needed.
+
+    Parameters
+    ----------
+    paths: sequence of str; required.
+      The paths to encode, e.g. a pandas.Series.
+
+    sep: str; required.
+      The symbol used to separate the channels in each path.
+
+    vocabulary: dict; default=None; optional.
+      Mapping of channel name to channel code. New channels are added
+      to it in order of first appearance.
+
+    chunk_size: int; default=2 ** 20.
+      The number of paths encoded at once.
+
+    keep_empty: bool; default=False.
+      Whether to keep empty channel names as channels.
+
+    Returns
+    -------
+    codes: numpy.ndarray of int64; the channel codes of every path,
+      concatenated.
+
+    offsets: numpy.ndarray of int64; the channels of path `i` are
+      `codes[offsets[i]:offsets[i + 1]]`.
+
+    vocabulary: dict; mapping of channel name to channel code.
+    """
+    if vocabulary is None:
+        vocabulary = {}
+
+    paths = np.asarray(paths, dtype=object)
+    n_paths = len(paths)
+    count_sep = operator.methodcaller("count", sep)
+    split_sep = operator.methodcaller("split", sep)
+
+    v_codes = []
+    v_lengths = []
+    for start in range(0, n_paths, chunk_size):
+        chunk = paths[start:start + chunk_size]
+        present = ~pd.isna(chunk)
+        n_raw = np.zeros(len(chunk), dtype=np.int64)
+        if not present.all():
+            chunk = chunk[present]
+
+        # split each path on its own, so that no separator is found
+        # across the end of a path and the start of the next; path i
+        # owns the next (number of separators + 1) raw tokens, and a
+        # missing path none
+        n_raw[present] = np.fromiter(map(count_sep, chunk), dtype=np.int64,
+                                     count=len(chunk)) + 1
+        raw = np.fromiter(itertools.chain.from_iterable(map(split_sep,
+                                                            chunk)),
+                          dtype=object, count=n_raw.sum())
+
+        # only the distinct raw tokens need to be cleaned up and looked
+        # up in the vocabulary
+        raw_codes, uniques = pd.factorize(raw)
+        table = np.empty(len(uniques), dtype=np.int64)
+        for k, token in enumerate(uniques):
+            channel = token.strip()
+            if channel or keep_empty:
+                table[k] = vocabulary.setdefault(channel, len(vocabulary))
+            else:
+                table[k] = -1
+        codes = table[raw_codes]
+
+        keep = codes >= 0
+        raw_path = np.repeat(np.arange(len(n_raw)), n_raw)
+        v_lengths.append(np.bincount(raw_path[keep], minlength=len(n_raw)))
+        v_codes.append(codes[keep])
+
+    if n_paths == 0:
+        return (np.zeros(0, dtype=np.int64), np.zeros(1, dtype=np.int64),
+                vocabulary)
+
+    codes = np.concatenate(v_codes)
+    offsets = np.zeros(n_paths + 1, dtype=np.int64)
+    np.cumsum(np.concatenate(v_lengths), out=offsets[1:])
+
+    return codes, offsets, vocabulary
+
+
+def take_paths(codes, offsets, idx):
+    """
+    Select paths `idx` of a ragged array of channel codes.
+
+    Returns the codes and offsets of the selected paths, in the order
+    of `idx`.
+    """
+    idx = np.asarray(idx, dtype=np.int64)
+    lengths = (offsets[1:] - offsets[:-1])[idx]
+    new_offsets = np.zeros(len(idx) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_offsets[1:])
+    positions = np.repeat(offsets[idx] - new_offsets[:-1], lengths) + \
+        np.arange(new_offsets[-1])
+    return codes[positions], new_offsets
@@ -0,0 +1,129 @@
+"""
+Contains the instrumentation of the model fits.
+"""
+# Author: Jason Wolosonovich <jason@refinerynet.com>
+# License: BSD 3-clause
+
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+
+# the least number of seconds between two progress events
+PROGRESS_INTERVAL = 1.0
+
+
+def peak_rss_mb():
+    """The peak resident memory of the process in MB, or None when it
+    can not be measured."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+class FitProfiler(object):
+    """
+    Records the wall time and the sizes of the phases of a fit, and
+    reports them to callbacks as the fit goes.
+
+    Every callback is called as `callback(event, info)`, where `event`
+    is one of:
+
+    "phase_start": a phase begins; `info` holds its "phase".
+
+    "phase_end": a phase ends; `info` holds its "phase", its
+      "seconds" and the "peak_rss_mb" of the process so far.
+
+    "progress": sent periodically while the paths are simulated (or
+      the removal effects solved for); `info` holds the "phase", the
+      "seconds" since the phase began and the progress so far, e.g.
+      "n_walks", "n_steps" and "steps_per_second". Two progress events
+      are at least `interval` seconds apart.
+
+    "fit_end": the fit is done; `info` is the `fit_stats_` of the
+      model.
+
+    Attributes
+    ----------
+    phases: The seconds spent in each phase, summed over the times the
+      phase was entered.
+
+    counts: The sizes recorded during the fit, e.g. the number of rows
+      and distinct paths.
+    """
+
+    def __init__(self, callbacks=None, interval=PROGRESS_INTERVAL):
+        if callbacks is None:
+            callbacks = []
+        elif callable(callbacks):
+            callbacks = [callbacks]
+        self.callbacks = list(callbacks)
+        self.interval = interval
+        self.phases = {}
+        self.counts = {}
+        self._start = time.perf_counter()
+        self._phase = None
+        self._phase_start = self._last_progress = self._start
+
+    def _emit(self, event, info):
+        for callback in self.callbacks:
+            callback(event, info)
+
+    @contextmanager
+    def phase(self, name):
+        """Time the statements of the `with` block as the phase
+        `name`; the phase ends, and is recorded, even when the block
+        raises."""
+        self._emit("phase_start", {"phase": name})
+        self._phase = name
+        start = self._phase_start = self._last_progress = \
+            time.perf_counter()
+        try:
+            yield self
+        finally:
+            seconds = time.perf_counter() - start
+            self._phase = None
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+            if self.callbacks:
+                self._emit("phase_end", {"phase": name, "seconds": seconds,
+                                         "peak_rss_mb": peak_rss_mb()})
+
+    def progress(self, **info):
+        """Report the progress of the current phase, unless the last
+        report is less than `interval` seconds old."""
+        now = time.perf_counter()
+        if not self.callbacks or now - self._last_progress < self.interval:
+            return
+        self._last_progress = now
+        seconds = now - self._phase_start
+        info = dict(info, phase=self._phase, seconds=seconds)
+        if "n_steps" in info:
+            info["steps_per_second"] = info["n_steps"] / seconds \
+                if seconds > 0 else None
+        self._emit("progress", info)
+
+    def count(self, **counts):
+        """Add to the sizes recorded so far."""
+        for name, value in counts.items():
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def finish(self, **stats):
+        """Return the statistics of the fit and send the "fit_end"
+        event."""
+        fit_stats = {
+            "seconds": time.perf_counter() - self._start,
+            "phases": dict(self.phases)
+        }
+        fit_stats.update(self.counts)
+        fit_stats.update(stats)
+        fit_stats["peak_rss_mb"] = peak_rss_mb()
+        self._emit("fit_end", fit_stats)
+        return fit_stats
@@ -0,0 +1,200 @@
+"""
+Contains the vectorized scoring of individual paths with a fitted
+Markov model.
+"""
+# Author: Jason Wolosonovich <jason@refinerynet.com>
+# License: BSD 3-clause
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from ._corpus import PathCorpus
+from ._paths import (factorize_paths, factorize_tokens, path_tokens,
+                     remap_tokens, tokenize_paths)
+
+
+def encode_batch(paths, sep, vocabulary, coded=False):
+    """
+    Tokenize a batch of paths with a copy of the fitted vocabulary.
+
+    The paths are read as `fit` reads them: strings, Arrow-backed
+    strings, pre-tokenized paths (see `path_tokens`) or a `PathCorpus`.
+    Identical paths are tokenized once. Channels that are not in the
+    vocabulary get new codes, after the fitted channels. With `coded`,
+    a tuple `(codes, offsets)` holds codes of the fitted vocabulary
+    rather than integer channel names.
+
+    Returns the distinct path of every row, the channel codes and
+    offsets of the distinct paths, and the extended vocabulary.
+    """
+    vocabulary = dict(vocabulary)
+    if coded and isinstance(paths, tuple) and len(paths) == 2:
+        codes, offsets = (np.asarray(a, dtype=np.int64) for a in paths)
+        n_paths = len(offsets) - 1
+        return (np.arange(n_paths), codes, offsets,
+                list(vocabulary.keys()))
+
+    if isinstance(paths, PathCorpus):
+        codes, offsets = paths.markov_tokens()
+        codes = remap_tokens(codes, paths.channels, vocabulary)
+        return (paths.path_codes, codes, offsets,
+                list(vocabulary.keys()))
+
+    tokens = path_tokens(paths)
+    if tokens is not None:
+        codes, offsets, channels = tokens
+        codes = remap_tokens(codes, channels, vocabulary)
+        path_codes, codes, offsets = factorize_tokens(codes, offsets,
+                                                      len(vocabulary))
+        return path_codes, codes, offsets, list(vocabulary.keys())
+
+    path_codes, distinct_paths = factorize_paths(paths)
+    codes, offsets, vocabulary = tokenize_paths(distinct_paths, sep,
+                                                vocabulary=vocabulary)
+    return path_codes, codes, offsets, list(vocabulary.keys())
+
+
+def path_credit(codes, offsets, weights):
+    """
+    Share the credit of every path between its distinct channels in
+    proportion to `weights[channel]`.
+
+    Returns the path, channel and credit share of every distinct
+    (path, channel) pair, ordered by path and channel, and the pair of
+    every touch. The shares of a path sum to 1 unless none of its
+    channels has a positive weight, in which case they are all 0.
+    """
+    n_paths = len(offsets) - 1
+    ncodes = max(len(weights), int(codes.max()) + 1 if len(codes) else 0)
+    w = np.zeros(ncodes)
+    w[:len(weights)] = weights
+
+    path_id = np.repeat(np.arange(n_paths, dtype=np.int64),
+                        np.diff(offsets))
+    keys, touch_pair = np.unique(path_id * ncodes + codes,
+                                 return_inverse=True)
+    pair_path = keys // ncodes
+    pair_channel = keys % ncodes
+    pair_w = w[pair_channel]
+    total = np.bincount(pair_path, weights=pair_w, minlength=n_paths)
+    share = np.divide(pair_w, total[pair_path],
+                      out=np.zeros(len(keys)), where=total[pair_path] > 0)
+    return pair_path, pair_channel, share, touch_pair.ravel()
+
+
+def _gather(row_paths, starts, lengths):
+    """The entries of the distinct path of every row, as indices into
+    the per-path arrays, and the row of each entry."""
+    n = lengths[row_paths]
+    rows = np.repeat(np.arange(len(row_paths), dtype=np.int64), n)
+    row_starts = np.zeros(len(row_paths), dtype=np.int64)
+    np.cumsum(n[:-1], out=row_starts[1:])
+    entries = np.repeat(starts[row_paths], n) + \
+        np.arange(len(rows)) - np.repeat(row_starts, n)
+    return entries, rows
+
+
+def score_paths(path_codes, codes, offsets, vocabulary, weights,
+                value_weights=None, conversions=None, revenues=None,
+                by="channel"):
+    """
+    Per-path credit of a batch of encoded paths.
+
+    Parameters
+    ----------
+    path_codes, codes, offsets, vocabulary: as returned by
+      `encode_batch`.
+
+    weights: numpy.ndarray; required.
+      The weight of each fitted channel, by channel code.
+
+    value_weights: numpy.ndarray; default=None; optional.
+      The weights used to share `revenues`; defaults to `weights`.
+
+    conversions, revenues: array-like; default=None; optional.
+      The conversions and revenue of every row, shared between its
+      channels.
+
+    by: one of {"channel", "touchpoint"}; default="channel".
+      Whether to return one row per distinct channel of each path, or
+      one row per touch, the credit of a channel being split evenly
+      between its touches.
+
+    Returns
+    -------
+    credit: pandas.DataFrame
+    """
+    if by not in ("channel", "touchpoint"):
+        raise ValueError(f"Unknown scoring level: {by!r}")
+
+    n_paths = len(offsets) - 1
+    pair_path, pair_channel, share, touch_pair = path_credit(
+        codes, offsets, weights
+    )
+    if revenues is not None and value_weights is not None:
+        value_share = path_credit(codes, offsets, value_weights)[2]
+    else:
+        value_share = share
+
+    if by == "channel":
+        starts = np.searchsorted(pair_path, np.arange(n_paths))
+        lengths = np.bincount(pair_path, minlength=n_paths)
+        entries, rows = _gather(path_codes, starts, lengths)
+        channel = pair_channel[entries]
+        share_rows = share[entries]
+        value_rows = value_share[entries]
+        columns = {"path": rows}
+    else:
+        # split the credit of each channel between its touches
+        touches = np.bincount(touch_pair, minlength=len(share))
+        touch_share = share[touch_pair] / touches[touch_pair]
+        touch_value = value_share[touch_pair] / touches[touch_pair]
+        lengths = np.diff(offsets)
+        entries, rows = _gather(path_codes, offsets[:-1], lengths)
+        channel = codes[entries]
+        share_rows = touch_share[entries]
+        value_rows = touch_value[entries]
+        columns = {"path": rows,
+                   "position": entries - offsets[path_codes[rows]]}
+
+    columns["channel_name"] = np.asarray(vocabulary, dtype=object)[channel]
+    columns["credit"] = share_rows
+    if conversions is not None:
+        columns["conversions"] = share_rows * \
+            np.asarray(conversions, dtype=float)[rows]
+    if revenues is not None:
+        columns["revenue"] = value_rows * \
+            np.asarray(revenues, dtype=float)[rows]
+    return pd.DataFrame(columns)
+
+
+def credit_matrix(path_codes, codes, offsets, weights, nchannels,
+                  conversions=None):
+    """
+    The credit of every row as a sparse (rows, channels) CSR matrix,
+    each row holding the shares of its path times its conversions;
+    channels that are not among the first `nchannels` codes get no
+    credit, and zero credits are not stored.
+    """
+    n_paths = len(offsets) - 1
+    pair_path, pair_channel, share, _ = path_credit(codes, offsets, weights)
+    known = pair_channel < nchannels
+    pair_path, pair_channel, share = \
+        pair_path[known], pair_channel[known], share[known]
+
+    starts = np.searchsorted(pair_path, np.arange(n_paths))
+    lengths = np.bincount(pair_path, minlength=n_paths)
+    entries, rows = _gather(path_codes, starts, lengths)
+    credit = share[entries]
+    if conversions is not None:
+        credit = credit * np.asarray(conversions, dtype=float)[rows]
+
+    nonzero = credit != 0
+    indptr = np.zeros(len(path_codes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows[nonzero], minlength=len(path_codes)),
+              out=indptr[1:])
+    return sparse.csr_matrix(
+        (credit[nonzero], pair_channel[entries[nonzero]], indptr),
+        shape=(len(path_codes), nchannels)
+    )
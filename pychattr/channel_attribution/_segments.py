@@ -0,0 +1,41 @@
+"""
+Contains the helpers used to fit the models on many segments of the
+data at once.
+"""
+# Author: Jason Wolosonovich <jason@refinerynet.com>
+# License: BSD 3-clause
+
+import numpy as np
+import pandas as pd
+
+
+def segment_ids(df, by):
+    """
+    Number the segments of `df`.
+
+    Returns the segment of every row and the keys of the segments, one
+    row per segment, sorted by key.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    gb = df.groupby(by, sort=True, dropna=False)
+    keys = gb.size().index.to_frame(index=False)
+    return gb.ngroup().to_numpy(dtype=np.int64), keys
+
+
+def segment_rows(ids, n_segments):
+    """The rows of every segment, in their original order."""
+    order = np.argsort(ids, kind="stable")
+    bounds = np.searchsorted(ids[order], np.arange(n_segments + 1))
+    return [order[bounds[g]:bounds[g + 1]] for g in range(n_segments)]
+
+
+def long_frame(keys, frames):
+    """Stack the results of every segment, prefixed with the segment
+    keys."""
+    if not frames:
+        return keys.copy()
+    lengths = [len(f) for f in frames]
+    results = pd.concat(frames, ignore_index=True)
+    prefix = keys.iloc[np.repeat(np.arange(len(keys)), lengths)] \
+        .reset_index(drop=True)
+    return pd.concat([prefix, results], axis=1)
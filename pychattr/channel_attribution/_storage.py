@@ -0,0 +1,178 @@
+"""
+Contains the helpers used to save fitted models to a single binary file
+that can be memory-mapped.
+
+The file holds a short prefix, a JSON header and the raw bytes of every
+array, each aligned to 64 bytes:
+
+    magic (8 bytes) | version (uint32) | header length (uint64) |
+    header (JSON) | padding | array | padding | array | ...
+
+The header records the dtype, shape and offset of every array, so the
+arrays are read back as views of the mapped file, without copying.
+Arrays of strings are stored as their UTF-8 bytes and the offset of
+each string, and are decoded when the file is read.
+"""
+# Author: Jason Wolosonovich <jason@refinerynet.com>
+# License: BSD 3-clause
+
+import json
+import mmap
+import struct
+
+import numpy as np
+import pandas as pd
+
+
+MAGIC = b"PYCHATTR"
+VERSION = 1
+
+_PREFIX = struct.Struct("<8sIQ")
+_ALIGN = 64
+
+
+def _aligned(n):
+    return -(-n // _ALIGN) * _ALIGN
+
+
+def _json_default(o):
+    if isinstance(o, np.generic):
+        return o.item()
+    raise TypeError(f"Object of type {type(o).__name__} cannot be saved")
+
+
+def _encode_strings(values):
+    encoded = [str(v).encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return data, offsets
+
+
+def _decode_strings(data, offsets):
+    buf = data.tobytes()
+    offsets = offsets.tolist()
+    return np.asarray([buf[lo:hi].decode("utf-8")
+                       for lo, hi in zip(offsets[:-1], offsets[1:])],
+                      dtype=object)
+
+
+def write_arrays(path, arrays, meta):
+    """
+    Write `arrays` and the JSON-serializable `meta` to `path`.
+
+    Parameters
+    ----------
+    path: str or os.PathLike; required.
+      The file to write.
+
+    arrays: dict; required.
+      Mapping of name to numpy.ndarray. Arrays of object dtype are
+      stored as strings.
+
+    meta: dict; required.
+      Scalars, strings, lists and dicts stored in the header.
+    """
+    specs = {}
+    blobs = []
+    offset = 0
+    for name, v in arrays.items():
+        v = np.asarray(v)
+        if v.dtype == object or v.dtype.kind == "U":
+            data, offsets = _encode_strings(v.ravel())
+            parts = {"data": data, "offsets": offsets}
+            spec = {"kind": "str", "shape": list(v.shape)}
+        else:
+            parts = {"data": np.ascontiguousarray(v)}
+            spec = {"kind": "array"}
+        for part, a in parts.items():
+            spec[part] = {"dtype": a.dtype.str, "shape": list(a.shape),
+                          "offset": offset}
+            blobs.append((offset, a))
+            offset = _aligned(offset + a.nbytes)
+        specs[name] = spec
+
+    header = json.dumps({"meta": meta, "arrays": specs},
+                        default=_json_default).encode("utf-8")
+    start = _aligned(_PREFIX.size + len(header))
+    with open(path, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        for pos, a in blobs:
+            f.seek(start + pos)
+            f.write(a.tobytes())
+        # make the file cover the padding of the last array
+        f.truncate(start + offset)
+
+
+def read_arrays(path, mmap_mode="r"):
+    """
+    Read the arrays and metadata written by `write_arrays`.
+
+    Parameters
+    ----------
+    path: str or os.PathLike; required.
+      The file to read.
+
+    mmap_mode: one of {"r", None}; default="r".
+      With "r" the numeric arrays are read-only views of the memory-
+      mapped file, so processes opening the same file share its pages
+      and only the pages that are used are read. With None the file is
+      read into memory and the arrays are writable.
+
+    Returns
+    -------
+    arrays: dict; mapping of name to numpy.ndarray.
+
+    meta: dict
+    """
+    if mmap_mode not in ("r", None):
+        raise ValueError(f"Unsupported mmap_mode: {mmap_mode!r}")
+
+    with open(path, "rb") as f:
+        magic, version, header_len = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a pychattr model file")
+        if version > VERSION:
+            raise ValueError(f"{path} was written by a newer version of "
+                             f"pychattr (format version {version})")
+        header = json.loads(f.read(header_len).decode("utf-8"))
+        if mmap_mode == "r":
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            f.seek(0)
+            buf = bytearray(f.read())
+
+    start = _aligned(_PREFIX.size + header_len)
+
+    def view(spec):
+        dtype = np.dtype(spec["dtype"])
+        shape = tuple(spec["shape"])
+        count = int(np.prod(shape))
+        if count == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.frombuffer(buf, dtype=dtype, count=count,
+                             offset=start + spec["offset"]).reshape(shape)
+
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        if spec["kind"] == "str":
+            arrays[name] = _decode_strings(view(spec["data"]),
+                                           view(spec["offsets"])) \
+                .reshape(spec["shape"])
+        else:
+            arrays[name] = view(spec["data"])
+    return arrays, header["meta"]
+
+
+def frame_arrays(df, prefix):
+    """The columns of `df` as arrays named "{prefix}.{column}", and the
+    column names."""
+    columns = [str(c) for c in df.columns]
+    arrays = {f"{prefix}.{c}": df[c].to_numpy() for c in columns}
+    return arrays, columns
+
+
+def read_frame(arrays, prefix, columns):
+    """Rebuild the DataFrame stored by `frame_arrays`."""
+    return pd.DataFrame({c: arrays[f"{prefix}.{c}"] for c in columns})
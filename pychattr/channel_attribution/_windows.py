@@ -0,0 +1,45 @@
+"""
+Contains the helpers used to fit the models over sliding windows of
+days.
+"""
+# Author: Jason Wolosonovich <jason@refinerynet.com>
+# License: BSD 3-clause
+
+import numpy as np
+import pandas as pd
+
+
+def _as_days(length):
+    if isinstance(length, (int, np.integer)):
+        return int(length)
+    return pd.Timedelta(length).days
+
+
+def day_numbers(dates):
+    """The day of every row, counted from the first day, and the first
+    day."""
+    days = pd.to_datetime(pd.Series(dates)).dt.normalize()
+    first = days.min()
+    return (days - first).dt.days.to_numpy(dtype=np.int64), first
+
+
+def windows(first, n_days, window, step=1):
+    """
+    The windows of `window` days, every `step` days, that fit in the
+    `n_days` days from `first`.
+
+    Returns the last day of every window, counted from the first day,
+    the window length in days and the keys of the windows: their first
+    and last day.
+    """
+    window = _as_days(window)
+    step = _as_days(step)
+    if window < 1 or step < 1:
+        raise ValueError("window and step must be at least one day")
+    ends = np.arange(window - 1, n_days, step)
+    keys = pd.DataFrame({
+        "window_start": first + pd.to_timedelta(ends - window + 1,
+                                                unit="D"),
+        "window_end": first + pd.to_timedelta(ends, unit="D")
+    })
+    return ends, window, keys
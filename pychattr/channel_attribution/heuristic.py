@@ -6,7 +6,9 @@ attribution.
 # License: BSD 3-clause
 
 from ._mixins import HeuristicModelMixin
-from ._heuristic import fit_heuristic_models
+from ._heuristic import (bootstrap_heuristic_models, fit_heuristic_models,
+                         fit_heuristic_segments, fit_heuristic_windows)
+from ._profiling import FitProfiler
 
 
 class HeuristicModel(HeuristicModelMixin):
@@ -18,6 +20,16 @@ class HeuristicModel(HeuristicModelMixin):
     path_feature: string; required.
       The name of the feature containing the paths.
 
+      NOTE: The paths are strings of channels joined by `separator`,
+      or pre-tokenized, which skips the parsing: a list-typed feature
+      holding the channels of each path as names or integer codes
+      (e.g. a pyarrow list column), or, when the data is a dict of
+      columns, a tuple `(codes, offsets, channels)` of flat integer
+      codes, where the channels of path `i` are
+      `codes[offsets[i]:offsets[i + 1]]` and `channels` names the
+      codes. Missing paths (None or NaN) are empty paths, whichever
+      the form.
+
     conversion_feature: string; required.
       The name of the feature indicating whether the path resulted in a
       conversion.
@@ -55,10 +67,32 @@ class HeuristicModel(HeuristicModelMixin):
     ensemble_results: boolean; default=True.
       Whether to create an ensemble of the resulting models.
 
+    callbacks: one of {callable, list of callables, None}; default=None.
+      Called as `callback(event, info)` when a phase of `fit` starts
+      ("phase_start") and ends ("phase_end"), and when the fit is done
+      ("fit_end", with `fit_stats_` as `info`), e.g. to feed a metrics
+      system.
+
     Attributes
     ----------
     attribution_model_: The attribution model output.
 
+    fit_stats_: The statistics of the last `fit`: the wall time of the
+      whole fit ("seconds") and of each phase ("phases": "prepare",
+      "parse", "credit" and "assemble"), the number of rows, distinct
+      paths, channels and touches, and the peak resident memory of the
+      process in MB ("peak_rss_mb"; None on Windows).
+
+    attribution_intervals_: The bootstrap percentile intervals of the
+      attribution of each channel, set by `bootstrap`.
+
+    segment_attribution_: The attribution of every segment in long
+      format, keyed by the segment features, set by `fit_segments`.
+
+    window_attribution_: The attribution of every sliding window in
+      long format, keyed by the first and last day of the window, set
+      by `fit_windows`.
+
     References
     ----------
     https://www.bizible.com/blog/multi-touch-attribution-full-debrief
@@ -75,7 +109,7 @@ class HeuristicModel(HeuristicModelMixin):
                  revenue_feature=None, cost_feature=None,
                  null_feature=None, separator=">>>", first_touch=True,
                  last_touch=True, linear_touch=True,
-                 ensemble_results=True):
+                 ensemble_results=True, callbacks=None):
         super().__init__(path_feature, conversion_feature,
                          null_feature=null_feature,
                          revenue_feature=revenue_feature,
@@ -84,12 +118,34 @@ class HeuristicModel(HeuristicModelMixin):
                          first_touch=first_touch,
                          last_touch=last_touch,
                          linear_touch=linear_touch,
-                         ensemble_results=ensemble_results)
+                         ensemble_results=ensemble_results,
+                         callbacks=callbacks)
 
     def fit(self, df):
+        """
+        Fit the heuristic models.
+
+        Parameters
+        ----------
+        df: one of {pandas.DataFrame, pyarrow.Table, dict, PathCorpus};
+            required.
+            The dataframe, or dict of feature name to column,
+            containing the path data to be modeled. It is not copied;
+            Arrow-backed paths are parsed from their buffers, so only
+            the distinct paths become Python strings. A `PathCorpus`
+            of the data skips the parsing, e.g. when fitting several
+            models on the same data.
+
+        Returns
+        -------
+        self: returns a fitted instance of self.
+        """
+        profiler = FitProfiler(self.callbacks)
+
         # derive internal attributes that will be used during model
         # construction
-        super().fit(df)
+        with profiler.phase("prepare"):
+            super().fit(df)
 
         # attempt to convert the values to the types required for
         # modeling
@@ -104,7 +160,160 @@ class HeuristicModel(HeuristicModelMixin):
             revenues=self.revenues,
             costs=self.costs,
             has_rev=self._has_rev,
-            has_cost=self._has_cost
+            has_cost=self._has_cost,
+            sep=self.sep,
+            profiler=profiler
+        )
+        self.fit_stats_ = profiler.finish()
+
+        return self
+
+    def bootstrap(self, df, n_boot=200, ci=0.95, method="poisson",
+                  random_state=None, n_jobs=None):
+        """
+        Fit the models and compute bootstrap intervals of the
+        attribution.
+
+        The rows of `df` are resampled through random weights on the
+        distinct rows, so the paths are parsed once and each replicate
+        only re-weights the credits.
+
+        Parameters
+        ----------
+        df: pandas.DataFrame; required.
+            The dataframe containing the path data to be modeled.
+
+        n_boot: int; default=200.
+            The number of bootstrap replicates.
+
+        ci: float; default=0.95.
+            The coverage of the intervals.
+
+        method: one of {"poisson", "multinomial"}; default="poisson".
+            "multinomial" resamples the rows with replacement, exactly
+            like resampling the DataFrame; "poisson" draws each row a
+            Poisson(1) number of times.
+
+        random_state: int; default=None; optional.
+            Seeds the replicates.
+
+        n_jobs: one of {int, None}; default=None.
+            The number of processes the replicates are split over; the
+            results do not depend on it.
+
+        Returns
+        -------
+        self: returns a fitted instance of self, with the intervals in
+            `attribution_intervals_`.
+        """
+        self.fit(df)
+        self.attribution_intervals_ = bootstrap_heuristic_models(
+            self._heuristics,
+            df,
+            self.paths,
+            self.conversions,
+            revenues=self.revenues,
+            costs=self.costs,
+            has_rev=self._has_rev,
+            has_cost=self._has_cost,
+            sep=self.sep,
+            n_boot=n_boot,
+            ci=ci,
+            method=method,
+            random_state=random_state,
+            n_jobs=n_jobs
+        )
+
+        return self
+
+    def fit_segments(self, df, by):
+        """
+        Fit the models on every segment of `df` in one call.
+
+        The paths are tokenized once with a global vocabulary and the
+        credits of all the segments are summed in a single vectorized
+        pass; each segment gets the results of fitting it on its own.
+
+        Parameters
+        ----------
+        df: pandas.DataFrame; required.
+            The dataframe containing the path data to be modeled.
+
+        by: one of {str, list of str}; required.
+            The features whose values define the segments, e.g.
+            ["country", "product_line"].
+
+        Returns
+        -------
+        self: returns self, with the results in
+            `segment_attribution_`, one row per segment and channel,
+            sorted by segment and channel.
+        """
+        self._init_features()
+        self._get_heuristics()
+        self._df = None
+
+        self.segment_attribution_ = fit_heuristic_segments(
+            self._heuristics,
+            df,
+            by,
+            self.paths,
+            self.conversions,
+            revenues=self.revenues,
+            costs=self.costs,
+            has_rev=self._has_rev,
+            has_cost=self._has_cost,
+            sep=self.sep
+        )
+
+        return self
+
+    def fit_windows(self, df, date_feature, window, step=1):
+        """
+        Fit the models on every sliding window of days of `df`.
+
+        The credits of every day are computed in one pass and each
+        window adds the day that enters it and subtracts the day that
+        leaves it, so all the windows cost about one pass over the
+        data.
+
+        Parameters
+        ----------
+        df: pandas.DataFrame; required.
+            The dataframe containing the path data to be modeled.
+
+        date_feature: string; required.
+            The name of the feature containing the date of each path.
+
+        window: one of {int, str, pandas.Timedelta}; required.
+            The length of the windows in days, e.g. 28 or "28D".
+
+        step: one of {int, str, pandas.Timedelta}; default=1.
+            The number of days between the ends of consecutive windows.
+
+        Returns
+        -------
+        self: returns self, with the results in `window_attribution_`,
+            one row per window and channel. Only the windows that fit
+            entirely within the days of `df` are fitted.
+        """
+        self._init_features()
+        self._get_heuristics()
+        self._df = None
+
+        self.window_attribution_ = fit_heuristic_windows(
+            self._heuristics,
+            df,
+            date_feature,
+            window,
+            step,
+            self.paths,
+            self.conversions,
+            revenues=self.revenues,
+            costs=self.costs,
+            has_rev=self._has_rev,
+            has_cost=self._has_cost,
+            sep=self.sep
         )
 
         return self
@@ -5,8 +5,51 @@ attribution.
 # Author: Jason Wolosonovich <jason@refinerynet.com>
 # License: BSD 3-clause
 
+import numbers
+
+from ._corpus import PathCorpus
 from ._mixins import MarkovModelMixin
-from ._markov import fit_markov
+from ._io import get_column, iter_frames, numeric_values
+from ._markov import (TransitionCounts, TransitionProbs, attribute_markov,
+                      bootstrap_markov, fit_markov_segments,
+                      fit_markov_windows, markov_order_statistics)
+from ._profiling import FitProfiler
+from ._scoring import credit_matrix, encode_batch, score_paths
+from ._storage import frame_arrays, read_arrays, read_frame, write_arrays
+
+
+# the constructor parameters and the attributes holding them; the
+# callbacks are not saved
+_PARAMS = {
+    "path_feature": "paths",
+    "conversion_feature": "conversions",
+    "null_feature": "nulls",
+    "revenue_feature": "revenues",
+    "cost_feature": "costs",
+    "separator": "sep",
+    "k_order": "order",
+    "n_simulations": "n_sim",
+    "max_steps": "max_steps",
+    "return_transition_probs": "trans_probs",
+    "random_state": "random_state",
+    "loops": "loops",
+    "engine": "engine",
+    "batch_size": "batch_size",
+    "sampler": "sampler",
+    "n_jobs": "n_jobs",
+    "revenue_bins": "revenue_bins",
+    "tol": "tol",
+    "n_batches": "n_batches",
+    "backend": "backend"
+}
+
+# the fitted DataFrames written by `save`
+_SAVED_FRAMES = ("attribution_model_", "removal_effects_",
+                 "attribution_error_", "attribution_intervals_",
+                 "order_selection_")
+
+# the order selection criteria, and whether larger values are better
+_CRITERIA = {"heldout": True, "aic": False, "bic": False}
 
 
 class MarkovModel(MarkovModelMixin):
@@ -18,21 +61,31 @@ class MarkovModel(MarkovModelMixin):
     path_feature: string; required.
       The name of the feature containing the paths.
 
+      NOTE: The paths are strings of channels joined by `separator`,
+      or pre-tokenized, which skips the parsing: a list-typed feature
+      holding the channels of each path as names or integer codes
+      (e.g. a pyarrow list column), or, when the data is a dict of
+      columns, a tuple `(codes, offsets, channels)` of flat integer
+      codes, where the channels of path `i` are
+      `codes[offsets[i]:offsets[i + 1]]` and `channels` names the
+      codes. Missing paths (None or NaN) are empty paths, whichever
+      the form.
+
     conversion_feature: string; required.
       The name of the feature indicating whether the path resulted in a
       conversion.
 
-      NOTE: When using Markov attribution, do not pre-aggregate
-      conversions by path as this will effect the outcome of the
-      simulation.
+      NOTE: Rows with identical paths are aggregated internally
+      before the transitions are counted, so there is no need to
+      pre-aggregate conversions by path.
 
     null_feature: string; default=None; optional.
       The name of the feature indicating whether the path resulted in a
       non-conversion.
 
-      NOTE: When using Markov attribution, do not pre-aggregate
-      non-conversions by path as this will effect the outcome of the
-      simulation.
+      NOTE: Rows with identical paths are aggregated internally
+      before the transitions are counted, so there is no need to
+      pre-aggregate non-conversions by path.
 
     revenue_feature: string; default=None; optional.
       The name of the feature containing the revenue generated
@@ -72,13 +125,129 @@ class MarkovModel(MarkovModelMixin):
       whether to estimate loops, i.e., going from state A
       to state A.
 
+    engine : one of {"loop", "batch", "exact"}; default="loop".
+      the simulation engine. "loop" simulates one path at a time,
+      "batch" advances `batch_size` paths at once with vectorized
+      NumPy operations. "exact" does not simulate: the conversion
+      probabilities with and without each channel are solved for
+      directly from the absorbing Markov chain, which is deterministic
+      and ignores `n_simulations`, `max_steps` and `random_state`.
+
+    batch_size : int; default=100000.
+      the number of paths simulated at once by the "batch" engine.
+
+    sampler : one of {"cdf", "alias"}; default="cdf".
+      how the next state of a simulated path is drawn. "cdf" searches
+      the cumulative transition counts of the current state, "alias"
+      builds an alias table per state once after counting so that
+      every draw takes constant time.
+
+    n_jobs : one of {int, None}; default=None.
+      the number of processes the simulations are split over; -1 uses
+      all CPUs. The transition tables are shared between the processes
+      and each process draws from its own random stream derived from
+      `random_state`, so results are reproducible for a given
+      `random_state` and `n_jobs`.
+
+    revenue_bins : one of {int, None}; default=None.
+      when set, the revenue per conversion of each state is compressed
+      into at most this many quantile bins, each drawn as the mean
+      revenue of the state within the bin. This bounds the size of the
+      revenue sampler when revenues are continuous while keeping the
+      mean revenue of every state unchanged. By default every distinct
+      revenue per conversion is kept.
+
+    tol : one of {float, None}; default=None.
+      when set, the "loop" and "batch" engines split the budget of
+      `n_simulations` paths into `n_batches` batches and stop once the
+      standard error of every channel's total conversions is within
+      `tol` of the estimate (e.g. 0.01 for 1%). The errors are
+      estimated by batch means, so the simulation runs at least 4
+      batches.
+
+    n_batches : int; default=20.
+      the number of batches the `n_simulations` paths are split into
+      when `tol` is set; at least 4. More batches can stop earlier,
+      but give noisier error estimates.
+
+    backend : one of {"python", "numba"}; default="python".
+      "numba" compiles the simulation loop of the "loop" engine and the
+      alias tables with Numba, giving the same results as "python" for
+      a given `random_state`; the simulation runs about 20x faster.
+      Falls back to "python" with a warning when Numba is not
+      installed.
+
+    callbacks : one of {callable, list of callables, None}; default=None.
+      called as `callback(event, info)` when a phase of a fit starts
+      ("phase_start") and ends ("phase_end"), about once a second while
+      the paths are simulated or the removal effects solved for
+      ("progress", with the walks, steps and steps per second so far,
+      or the solves done), and when the fit is done ("fit_end", with
+      `fit_stats_` as `info`), e.g. to feed a metrics system. Progress
+      is reported between blocks of one million random draws, or
+      between batches, and only as the worker processes finish when
+      `n_jobs` > 1.
+
     Attributes
     ----------
     attribution_model_: The attribution model output.
 
-    transition_matrix_: The transition probability matrix.
+    transition_matrix_: The transition probability matrix, as a
+      DataFrame of labeled transitions. It is built from
+      `transition_probs_` when first accessed.
+
+    transition_probs_: The transition probabilities as sparse arrays:
+      `rows`, `cols` and `probs` hold one entry per observed transition
+      and `states` names the state indices; `to_sparse()` returns a
+      scipy.sparse matrix. None when `return_transition_probs` is
+      False.
+
+    removal_effects_: The removal effects for each channel; None when
+      `return_transition_probs` is False.
+
+    transition_counts_: The transition counts accumulated by `fit` and
+      `partial_fit`.
+
+    simulation_stats_: The number of simulated paths and steps, the
+      time spent simulating and the resulting throughput (or the number
+      of linear solves for the "exact" engine). With `tol` set, also
+      the number of batches, whether the tolerance was reached and the
+      largest relative error.
+
+    fit_stats_: The statistics of the last `fit`, `partial_fit` or
+      `fit_chunks`: the wall time of the whole fit ("seconds") and of
+      each phase ("phases": "prepare", "read", "parse", "count",
+      "transition_matrix", "samplers", "simulate" or "solve", and
+      "assemble"), the number of rows and distinct paths parsed (with
+      `fit_chunks`, the distinct paths of each chunk, summed over the
+      chunks), of channels, states and observed transitions, the
+      simulated walks, steps and steps per second (or the linear
+      solves), and the peak resident memory of the process in MB
+      ("peak_rss_mb"; None on Windows).
+
+    attribution_intervals_: The bootstrap percentile intervals of the
+      attribution of each channel, set by `bootstrap`.
+
+    attribution_error_: The batch-means standard errors of the
+      attributed totals of each channel when `tol` is set, else None.
+
+    segment_attribution_: The attribution of every segment in long
+      format, keyed by the segment features, set by `fit_segments`.
+
+    segment_removal_effects_: The removal effects of every segment in
+      long format, set by `fit_segments`; None when
+      `return_transition_probs` is False.
 
-    removal_effects_: The removal effects for each channel.
+    window_attribution_: The attribution of every sliding window in
+      long format, keyed by the first and last day of the window, set
+      by `fit_windows`.
+
+    window_removal_effects_: The removal effects of every sliding
+      window in long format, set by `fit_windows`; None when
+      `return_transition_probs` is False.
+
+    order_selection_: The log-likelihood, AIC, BIC and held-out
+      log-likelihood of every order compared by `select_order`.
 
     References
     ----------
@@ -92,7 +261,10 @@ class MarkovModel(MarkovModelMixin):
                  null_feature=None, revenue_feature=None,
                  cost_feature=None, separator=">>>", k_order=1,
                  n_simulations=10000, max_steps=None,
-                 return_transition_probs=True, random_state=None, loops=True):
+                 return_transition_probs=True, random_state=None, loops=True,
+                 engine="loop", batch_size=100000, sampler="cdf",
+                 n_jobs=None, revenue_bins=None, tol=None,
+                 n_batches=20, backend="python", callbacks=None):
         super().__init__(path_feature, conversion_feature,
                          null_feature=null_feature,
                          revenue_feature=revenue_feature,
@@ -102,41 +274,661 @@ class MarkovModel(MarkovModelMixin):
                          max_steps=max_steps,
                          return_transition_probs=return_transition_probs,
                          random_state=random_state,
-                         loops=loops)
+                         loops=loops,
+                         engine=engine,
+                         batch_size=batch_size,
+                         sampler=sampler,
+                         n_jobs=n_jobs,
+                         revenue_bins=revenue_bins,
+                         tol=tol,
+                         n_batches=n_batches,
+                         backend=backend,
+                         callbacks=callbacks)
 
     def fit(self, df):
         """
 
+        Parameters
+        ----------
+        df: one of {pandas.DataFrame, pyarrow.Table, dict, PathCorpus};
+            required.
+            The dataframe, or dict of feature name to column,
+            containing the path data to be modeled. It is not copied;
+            Arrow-backed paths are parsed from their buffers, so only
+            the distinct paths become Python strings. A `PathCorpus`
+            of the data skips the parsing, e.g. when fitting several
+            models on the same data.
+
+        Returns
+        -------
+        self: returns a fitted instance of self.
+        """
+        profiler = FitProfiler(self.callbacks)
+
+        # derive the feature attributes; the rows of identical paths
+        # are aggregated while counting the transitions
+        with profiler.phase("prepare"):
+            super().fit(df)
+
+        self.transition_counts_ = TransitionCounts(
+            self.order, self.loops, self.sep, has_value=self._has_rev
+        )
+        self._update_counts(self._df, profiler)
+
+        return self._attribute(profiler)
+
+    def partial_fit(self, df, decay=None):
+        """
+        Update the model with a new batch of paths.
+
+        The transitions of the batch are added to the transition counts
+        accumulated by the previous calls to `fit` or `partial_fit`, and
+        the attribution is recomputed from the updated counts. Only the
+        new batch is parsed.
+
+        Parameters
+        ----------
+        df: one of {pandas.DataFrame, pyarrow.Table, dict, PathCorpus};
+            required.
+            The dataframe containing the new path data.
+
+        decay: float; default=None; optional.
+            When given, the counts accumulated so far are multiplied
+            by `decay` before the batch is added, e.g. 0.97 applied to
+            daily batches gives older days exponentially less weight.
+
+        Returns
+        -------
+        self: returns a fitted instance of self.
+        """
+        if getattr(self, "transition_counts_", None) is None:
+            return self.fit(df)
+
+        profiler = FitProfiler(self.callbacks)
+        with profiler.phase("prepare"):
+            super().fit(df)
+        self._update_counts(self._df, profiler, decay=decay)
+
+        return self._attribute(profiler)
+
+    def fit_chunks(self, source, chunksize=1000000):
+        """
+        Fit the model on data that is read and counted chunk by chunk.
+
+        The channel vocabulary and the transition counts grow with each
+        chunk and the attribution is computed once at the end, so peak
+        memory is bounded by the chunk size plus the transition counts.
+        The result is the same as fitting on all the chunks at once.
+
+        Parameters
+        ----------
+        source: one of {str, os.PathLike, iterable}; required.
+            A path to a CSV or Parquet file, or an iterable of
+            DataFrames or pyarrow Tables. Only the modeled features are
+            read from files; reading Parquet files requires pyarrow,
+            and their paths are parsed from the Arrow buffers.
+
+        chunksize: int; default=1000000.
+            The number of rows read from a file at a time.
+
+        Returns
+        -------
+        self: returns a fitted instance of self.
+        """
+        profiler = FitProfiler(self.callbacks)
+        self._init_features()
+        self._df = None
+
+        self.transition_counts_ = TransitionCounts(
+            self.order, self.loops, self.sep, has_value=self._has_rev
+        )
+        columns = [self.paths, self.conversions]
+        columns += [f for f in (self.nulls, self.revenues) if f]
+        chunks = iter_frames(source, columns, chunksize=chunksize)
+        while True:
+            with profiler.phase("read"):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            self._update_counts(chunk, profiler)
+
+        return self._attribute(profiler)
+
+    def bootstrap(self, df, n_boot=200, ci=0.95, method="poisson",
+                  random_state=None, n_jobs=None):
+        """
+        Fit the model and compute bootstrap intervals of the attribution.
+
+        The rows of `df` are resampled through random weights on the
+        distinct rows, so the paths are parsed once and each replicate
+        only re-accumulates the weighted transition counts before
+        attributing them with the model's settings. The "exact" engine
+        gives intervals free of simulation noise.
+
+        Parameters
+        ----------
+        df: pandas.DataFrame; required.
+            The dataframe containing the path data to be modeled.
+
+        n_boot: int; default=200.
+            The number of bootstrap replicates.
+
+        ci: float; default=0.95.
+            The coverage of the intervals.
+
+        method: one of {"poisson", "multinomial"}; default="poisson".
+            "multinomial" resamples the rows with replacement, exactly
+            like resampling the DataFrame; "poisson" draws each row a
+            Poisson(1) number of times.
+
+        random_state: int; default=None; optional.
+            Seeds the replicates; defaults to the model's
+            `random_state`.
+
+        n_jobs: one of {int, None}; default=None.
+            The number of processes the replicates are split over;
+            defaults to the model's `n_jobs`. The results do not depend
+            on it.
+
+        Returns
+        -------
+        self: returns a fitted instance of self, with the intervals in
+            `attribution_intervals_`.
+        """
+        self.fit(df)
+        self.attribution_intervals_ = bootstrap_markov(
+            df, self.paths, self.conversions, self.revenues, self.nulls,
+            self.order, self.loops, self.sep,
+            n_boot=n_boot,
+            ci=ci,
+            method=method,
+            random_state=self.random_state if random_state is None
+            else random_state,
+            n_jobs=self.n_jobs if n_jobs is None else n_jobs,
+            nsim=self.n_sim,
+            max_step=self.max_steps,
+            engine=self.engine,
+            batch_size=self.batch_size,
+            sampler=self.sampler,
+            revenue_bins=self.revenue_bins,
+            tol=self.tol,
+            n_batches=self.n_batches,
+            backend=self.backend
+        )
+
+        return self
+
+    def fit_segments(self, df, by):
+        """
+        Fit a model on every segment of `df` in one call.
+
+        The paths are tokenized once with a global vocabulary, the
+        transition counts of each segment are built from the shared
+        tokens and the segments are attributed in parallel over
+        `n_jobs` processes. Each segment gets the results of fitting it
+        on its own with this model's parameters, whatever `n_jobs`.
+
         Parameters
         ----------
         df: pandas.DataFrame; required.
             The dataframe containing the path data to be modeled.
 
+        by: one of {str, list of str}; required.
+            The features whose values define the segments, e.g.
+            ["country", "product_line"].
+
         Returns
         -------
-        self: returns a fitted instance of self.
+        self: returns self, with the results in
+            `segment_attribution_` and `segment_removal_effects_`, one
+            row per segment and channel, sorted by segment.
+        """
+        self._init_features()
+        self._df = None
+
+        self.segment_attribution_, self.segment_removal_effects_ = \
+            fit_markov_segments(
+                df, by, self.paths, self.conversions,
+                self.revenues if self._has_rev else None, self.nulls,
+                self.order, self.loops, self.sep,
+                out_more=self.trans_probs,
+                n_jobs=self.n_jobs,
+                nsim=self.n_sim,
+                max_step=self.max_steps,
+                random_state=self.random_state,
+                engine=self.engine,
+                batch_size=self.batch_size,
+                sampler=self.sampler,
+                revenue_bins=self.revenue_bins,
+                tol=self.tol,
+                n_batches=self.n_batches,
+                backend=self.backend
+            )
+
+        return self
+
+    def fit_windows(self, df, date_feature, window, step=1):
+        """
+        Fit a model on every sliding window of days of `df`.
+
+        The paths are encoded once and the transition counts of a
+        window are kept as a running sum, adding the counts of the day
+        that enters the window and subtracting those of the day that
+        leaves it. All the windows therefore cost about one pass over
+        the data plus one simulation (or solve) per window; the windows
+        are attributed in parallel over `n_jobs` processes. Every
+        window starts from the model's `random_state`.
+
+        Parameters
+        ----------
+        df: pandas.DataFrame; required.
+            The dataframe containing the path data to be modeled.
+
+        date_feature: string; required.
+            The name of the feature containing the date of each path.
+
+        window: one of {int, str, pandas.Timedelta}; required.
+            The length of the windows in days, e.g. 28 or "28D".
+
+        step: one of {int, str, pandas.Timedelta}; default=1.
+            The number of days between the ends of consecutive windows.
+
+        Returns
+        -------
+        self: returns self, with the results in `window_attribution_`
+            and `window_removal_effects_`, one row per window and
+            channel. Only the windows that fit entirely within the days
+            of `df` are fitted.
+        """
+        self._init_features()
+        self._df = None
+
+        self.window_attribution_, self.window_removal_effects_ = \
+            fit_markov_windows(
+                df, date_feature, window, step, self.paths,
+                self.conversions,
+                self.revenues if self._has_rev else None, self.nulls,
+                self.order, self.loops, self.sep,
+                out_more=self.trans_probs,
+                n_jobs=self.n_jobs,
+                nsim=self.n_sim,
+                max_step=self.max_steps,
+                random_state=self.random_state,
+                engine=self.engine,
+                batch_size=self.batch_size,
+                sampler=self.sampler,
+                revenue_bins=self.revenue_bins,
+                tol=self.tol,
+                n_batches=self.n_batches,
+                backend=self.backend
+            )
+
+        return self
+
+    def select_order(self, df, max_order=4, criterion="heldout",
+                     test_size=0.2, alpha=1.0, random_state=None):
+        """
+        Choose the order of the model and fit the model with it.
+
+        The paths are tokenized once, and the transitions of the orders
+        1 to `max_order` are counted from the shared tokens, so the
+        comparison costs about one pass over the data per order before
+        a single fit with the chosen order.
+
+        Parameters
+        ----------
+        df: one of {pandas.DataFrame, pyarrow.Table, dict, PathCorpus};
+            required.
+            The dataframe containing the path data to be modeled.
+
+        max_order: int; default=4.
+            The largest order compared.
+
+        criterion: one of {"heldout", "aic", "bic"}; default="heldout".
+            "heldout" chooses the order with the largest log-likelihood
+            of the transitions of a random `test_size` fraction of the
+            rows, with the probabilities counted on the other rows;
+            "aic" and "bic" choose the order with the smallest AIC or
+            BIC of the transitions of all the rows.
+
+            NOTE: Without `loops`, the repeated states collapsed differ
+            between the orders, so their likelihoods are of slightly
+            different transitions.
+
+        test_size: float; default=0.2.
+            The fraction of the rows held out.
+
+        alpha: float; default=1.0.
+            The additive smoothing of the held-out probabilities, so
+            that transitions never seen in the other rows keep a
+            positive probability.
+
+        random_state: int; default=None; optional.
+            Seeds the rows held out; defaults to the model's
+            `random_state`.
+
+        Returns
+        -------
+        self: returns self fitted with the chosen order as `k_order`,
+            with the statistics of every order in `order_selection_`.
+        """
+        if criterion not in _CRITERIA:
+            raise ValueError(f"Unknown criterion: {criterion!r}")
+        if criterion == "heldout" and not 0 < test_size < 1:
+            raise ValueError("test_size must be between 0 and 1.")
+
+        self._init_features()
+        corpus = df if isinstance(df, PathCorpus) \
+            else PathCorpus(df, self.paths, separator=self.sep)
+        corpus.check(self.paths, self.sep)
+        codes, offsets = corpus.markov_tokens()
+        stats = markov_order_statistics(
+            corpus.path_codes, codes, offsets, corpus.channels,
+            corpus.column(self.conversions),
+            corpus.column(self.nulls) if self.nulls else None,
+            max_order, self.loops, self.sep,
+            test_size=test_size,
+            alpha=alpha,
+            random_state=self.random_state if random_state is None
+            else random_state
+        )
+
+        values = stats[criterion if criterion != "heldout"
+                       else "heldout_log_likelihood"]
+        best = values.idxmax() if _CRITERIA[criterion] else values.idxmin()
+        self.order = int(stats.loc[best, "order"])
+        self.fit(corpus)
+        self.order_selection_ = stats
+
+        return self
+
+    def score_paths(self, paths, conversions=None, revenues=None,
+                    by="channel"):
+        """
+        Credit individual paths with the fitted model.
+
+        The credit of each path is shared between its distinct channels
+        in proportion to their removal effects, which are looked up in
+        the fitted channel totals (the totals are proportional to the
+        removal effects), so no refitting or simulation is involved.
+        Identical paths are parsed once. Channels that were not seen
+        during fitting get no credit.
+
+        Parameters
+        ----------
+        paths: one of {sequence, pyarrow array, tuple, PathCorpus};
+            required.
+            The paths to score, in any of the forms `fit` reads (see
+            `path_feature`), or a pre-coded batch `(codes, offsets)`
+            where the channels of path `i` are
+            `codes[offsets[i]:offsets[i + 1]]` and the codes index the
+            rows of `attribution_model_`.
+
+        conversions: array-like; default=None; optional.
+            The conversions of each path, shared between its channels.
+
+        revenues: array-like; default=None; optional.
+            The revenue of each path, shared in proportion to the
+            revenue removal effects when the model tracks revenue.
+
+        by: one of {"channel", "touchpoint"}; default="channel".
+            "channel" returns one row per distinct channel of each
+            path; "touchpoint" returns one row per touch, the credit of
+            a channel being split evenly between its touches.
+
+        Returns
+        -------
+        credit: pandas.DataFrame; the position of the path in `paths`,
+            the channel (and the position of the touch in the path),
+            the share of the path's credit, and the credited
+            conversions and revenue when given.
+        """
+        if isinstance(paths, PathCorpus):
+            paths.check(self.paths, self.sep)
+        path_codes, codes, offsets, vocabulary = encode_batch(
+            paths, self.sep, self.transition_counts_.mp_channels,
+            coded=True
+        )
+        weights, value_weights = self._channel_weights()
+        return score_paths(path_codes, codes, offsets, vocabulary, weights,
+                           value_weights=value_weights,
+                           conversions=conversions, revenues=revenues,
+                           by=by)
+
+    def transform(self, df):
+        """
+        Credit the conversions of every row of `df` to its channels.
+
+        Parameters
+        ----------
+        df: one of {pandas.DataFrame, pyarrow.Table, dict, PathCorpus};
+            required.
+            The path data, with the path and conversion features, read
+            as `fit` reads it.
+
+        Returns
+        -------
+        credit: scipy.sparse.csr_matrix; one row per row of `df` and one
+            column per fitted channel, in the order of
+            `attribution_model_`, holding the conversions credited to
+            the channel (see `score_paths`). Only the channels of each
+            row's path are stored.
+        """
+        if isinstance(df, PathCorpus):
+            df.check(self.paths, self.sep)
+            paths, conversions = df, df.column(self.conversions)
+        else:
+            paths = get_column(df, self.paths)
+            conversions = numeric_values(get_column(df, self.conversions))
+        path_codes, codes, offsets, _ = encode_batch(
+            paths, self.sep, self.transition_counts_.mp_channels
+        )
+        weights, _ = self._channel_weights()
+        return credit_matrix(path_codes, codes, offsets, weights,
+                             len(weights), conversions=conversions)
+
+    def _channel_weights(self):
+        """The credit weights of the channels, by channel code."""
+        df = self.attribution_model_
+        weights = df["total_conversions"].to_numpy(dtype=float)
+        value_weights = df["total_revenue"].to_numpy(dtype=float) \
+            if "total_revenue" in df.columns else None
+        return weights, value_weights
+
+    def save(self, path):
+        """
+        Save the fitted model to a single binary file.
+
+        The parameters, the channel vocabulary, the compound states,
+        the transition counts and the fitted results are written as
+        flat arrays that `load` can memory-map; the training data is
+        not saved.
+
+        Parameters
+        ----------
+        path: str or os.PathLike; required.
+            The file to write.
+
+        Returns
+        -------
+        self
+        """
+        arrays, counts_meta = self.transition_counts_.to_arrays()
+        arrays = {"counts." + k: v for k, v in arrays.items()}
+        frames = {}
+        for name in _SAVED_FRAMES:
+            df = getattr(self, name, None)
+            if df is not None:
+                frame, frames[name] = frame_arrays(df, name)
+                arrays.update(frame)
+        if self.transition_probs_ is not None:
+            arrays.update({
+                "transition_probs_.rows": self.transition_probs_.rows,
+                "transition_probs_.cols": self.transition_probs_.cols,
+                "transition_probs_.probs": self.transition_probs_.probs
+            })
+
+        params = {name: getattr(self, attr)
+                  for name, attr in _PARAMS.items()}
+        for name, value in params.items():
+            # numpy integers, e.g. seeds, are saved as Python integers
+            if isinstance(value, numbers.Integral) and \
+                    not isinstance(value, bool):
+                params[name] = int(value)
+        if not isinstance(params["random_state"], (int, type(None))):
+            # generators can not be saved; the counts do not depend on
+            # them
+            params["random_state"] = None
+        meta = {
+            "model": type(self).__name__,
+            "params": params,
+            "counts": counts_meta,
+            "frames": frames,
+            "simulation_stats": self.simulation_stats_,
+            "fit_stats": self.fit_stats_
+        }
+        write_arrays(path, arrays, meta)
+        return self
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """
+        Load a model saved by `save`.
+
+        Parameters
+        ----------
+        path: str or os.PathLike; required.
+            The file to read.
+
+        mmap_mode: one of {"r", None}; default="r".
+            With "r" the arrays are read-only views of the memory-mapped
+            file, so loading is nearly free and the processes that load
+            the same file share its pages. The model can still be
+            updated with `partial_fit`, which replaces the arrays
+            rather than writing into them. With None the file is read
+            into memory.
+
+        Returns
+        -------
+        model: MarkovModel; the fitted model.
         """
-        # derive the feature attributes and aggregate the dataset by
-        # path
-        super().fit(df)
+        arrays, meta = read_arrays(path, mmap_mode=mmap_mode)
+        if meta["model"] != cls.__name__:
+            raise ValueError(f"{path} holds a {meta['model']}, "
+                             f"not a {cls.__name__}")
+
+        model = cls(**meta["params"])
+        model._init_features()
+        model._df = None
+        model.transition_counts_ = TransitionCounts.from_arrays(
+            {k[len("counts."):]: v for k, v in arrays.items()
+             if k.startswith("counts.")},
+            meta["counts"]
+        )
+        for name in _SAVED_FRAMES:
+            columns = meta["frames"].get(name)
+            if columns is not None:
+                setattr(model, name, read_frame(arrays, name, columns))
+            elif name not in ("attribution_intervals_",
+                              "order_selection_"):
+                # set by every fit, possibly to None
+                setattr(model, name, None)
+        if "transition_probs_.rows" in arrays:
+            model.transition_probs_ = TransitionProbs(
+                arrays["transition_probs_.rows"],
+                arrays["transition_probs_.cols"],
+                arrays["transition_probs_.probs"],
+                model.transition_counts_
+            )
+        else:
+            model.transition_probs_ = None
+        model.simulation_stats_ = meta["simulation_stats"]
+        model.fit_stats_ = meta.get("fit_stats")
+        return model
+
+    @property
+    def transition_matrix_(self):
+        trans_probs = self.transition_probs_
+        if trans_probs is None:
+            return None
+        return trans_probs.to_frame()
+
+    def _update_counts(self, df, profiler, decay=None):
+        counts = self.transition_counts_
+        if decay is not None:
+            counts.scale(decay)
 
-        df, re_df, tmat = fit_markov(
-            df,
-            self.paths,
-            self.conversions,
-            self.revenues,
-            self.nulls,
+        if isinstance(df, PathCorpus):
+            return self._update_corpus_counts(df, profiler)
+
+        with profiler.phase("parse"):
+            path_codes, states, state_offsets = counts.encode(
+                get_column(df, self.paths)
+            )
+        with profiler.phase("count"):
+            vc = numeric_values(get_column(df, self.conversions))
+            vn = numeric_values(get_column(df, self.nulls)) \
+                if self.nulls else None
+            vv = numeric_values(get_column(df, self.revenues)) \
+                if self._has_rev else None
+            counts.add(path_codes, states, state_offsets, vc, vn=vn, vv=vv)
+        profiler.count(n_rows=len(path_codes),
+                       n_paths=len(state_offsets) - 1)
+        return self
+
+    def _update_corpus_counts(self, corpus, profiler):
+        # the paths are already tokenized and the conversions and nulls
+        # summed by distinct path, possibly by an earlier fit
+        counts = self.transition_counts_
+        corpus.check(self.paths, self.sep)
+        with profiler.phase("parse"):
+            codes, offsets = corpus.markov_tokens()
+            states, state_offsets = counts.encode_tokens(codes, offsets,
+                                                         corpus.channels)
+        with profiler.phase("count"):
+            vc = corpus.column(self.conversions)
+            vn = corpus.column(self.nulls) if self.nulls else None
+            vv = corpus.column(self.revenues) if self._has_rev else None
+            counts.add(corpus.path_codes, states, state_offsets, vc, vn=vn,
+                       vv=vv,
+                       totals=corpus.path_weights(self.conversions,
+                                                  self.nulls))
+        profiler.count(n_rows=corpus.n_rows, n_paths=corpus.n_paths)
+        return self
+
+    def _attribute(self, profiler):
+        sim_stats = {}
+        result = attribute_markov(
+            self.transition_counts_,
             self.n_sim,
             self.max_steps,
             self.trans_probs,
-            self.sep,
-            self.order,
             self.random_state,
-            self.loops
+            engine=self.engine,
+            batch_size=self.batch_size,
+            sampler=self.sampler,
+            n_jobs=self.n_jobs,
+            sim_stats=sim_stats,
+            revenue_bins=self.revenue_bins,
+            tol=self.tol,
+            n_batches=self.n_batches,
+            backend=self.backend,
+            profiler=profiler
         )
 
+        if self.trans_probs:
+            df, re_df, trans_probs = result
+        else:
+            df, re_df, trans_probs = result, None, None
+
         self.attribution_model_ = df
         self.removal_effects_ = re_df
-        self.transition_matrix_ = tmat
+        self.transition_probs_ = trans_probs
+        self.attribution_error_ = sim_stats.pop("attribution_error", None)
+        self.simulation_stats_ = sim_stats
+        self.fit_stats_ = profiler.finish(**{
+            k: v for k, v in sim_stats.items()
+            if k in ("n_walks", "n_steps", "steps_per_second", "n_solves")
+        })
 
         return self
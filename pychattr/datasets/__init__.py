@@ -0,0 +1,11 @@
+"""
+Synthetic datasets for trying out and testing the attribution models.
+"""
+# Author: Jason Wolosonovich <jason@refinerynet.com>
+# License: BSD 3-clause
+
+from ._journeys import generate_journeys
+
+__all__ = [
+    "generate_journeys",
+]
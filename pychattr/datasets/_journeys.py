@@ -0,0 +1,184 @@
+"""
+Contains the seeded generator of synthetic customer journeys, used by
+the tests and the benchmarks.
+"""
+# Author: Jason Wolosonovich <jason@refinerynet.com>
+# License: BSD 3-clause
+
+import numpy as np
+import pandas as pd
+
+
+LENGTH_DISTRIBUTIONS = ("geometric", "poisson", "uniform")
+REVENUE_DISTRIBUTIONS = ("lognormal", "constant", None)
+
+# the largest transition table generated for higher orders
+_MAX_CONTEXTS = 2 ** 20
+
+
+def _path_lengths(rng, n_paths, distribution, mean_length, max_length):
+    if distribution == "geometric":
+        lengths = rng.geometric(1.0 / mean_length, n_paths)
+    elif distribution == "poisson":
+        lengths = rng.poisson(mean_length - 1, n_paths) + 1
+    elif distribution == "uniform":
+        lengths = rng.integers(1, 2 * mean_length, n_paths)
+    else:
+        raise ValueError(f"Unknown length distribution: {distribution!r}")
+    return np.minimum(lengths, max_length).astype(np.int64)
+
+
+def _walk(rng, lengths, n_channels, order, concentration):
+    """
+    Draw the channels of every path from a random Markov chain of the
+    given order; the next channel depends on the last `order` channels
+    of the path.
+    """
+    n_contexts = (n_channels + 1) ** order
+    if n_contexts > _MAX_CONTEXTS:
+        raise ValueError("Too many contexts; lower `order` or "
+                         "`n_channels`.")
+    # the cumulative transition probabilities of every context, offset
+    # by the context, so that one searchsorted draws for all the paths
+    probs = rng.dirichlet(np.full(n_channels, concentration), n_contexts)
+    cum = (np.cumsum(probs, axis=1) +
+           np.arange(n_contexts)[:, None]).ravel()
+    cum[n_channels - 1::n_channels] = np.arange(1, n_contexts + 1)
+
+    n_paths = len(lengths)
+    offsets = np.zeros(n_paths + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    channels = np.empty(offsets[-1], dtype=np.int64)
+    # the last `order` channels of every path, 0 meaning none yet
+    context = np.zeros(n_paths, dtype=np.int64)
+    weight = (n_channels + 1) ** max(order - 1, 0)
+    for step in range(int(lengths.max(initial=0))):
+        active = np.flatnonzero(lengths > step)
+        u = context[active] + rng.random(len(active))
+        nxt = np.searchsorted(cum, u, side="right") - \
+            context[active] * n_channels
+        nxt = np.minimum(nxt, n_channels - 1)
+        channels[offsets[active] + step] = nxt
+        if order > 0:
+            # drop the oldest channel of the context and append `nxt`
+            context[active] = (context[active] % weight) * \
+                (n_channels + 1) + nxt + 1
+    return channels, offsets
+
+
+def _calibrate(log_odds, rate):
+    """The intercept giving a mean conversion probability of `rate`,
+    found by bisection."""
+    lo, hi = -50.0, 50.0
+    for _ in range(60):
+        mid = (lo + hi) / 2
+        if np.mean(1.0 / (1.0 + np.exp(-(mid + log_odds)))) < rate:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2
+
+
+def generate_journeys(n_paths, n_channels=10, length_distribution="geometric",
+                      mean_length=4, max_length=50, conversion_rate=0.05,
+                      revenue_distribution="lognormal", revenue_mean=50.0,
+                      revenue_sigma=1.0, order=1, concentration=0.5,
+                      separator=" >>> ", random_state=None):
+    """
+    Generate synthetic customer journeys.
+
+    The channels of each path follow a random Markov chain of the given
+    order, and the chance that a path converts depends on the channels
+    it touched, so the attribution models have a signal to find.
+
+    Parameters
+    ----------
+    n_paths: int; required.
+      The number of paths (rows) to generate.
+
+    n_channels: int; default=10.
+      The number of channels.
+
+    length_distribution: one of {"geometric", "poisson", "uniform"};
+      default="geometric".
+      The distribution of the number of touches of a path.
+
+    mean_length: float; default=4.
+      The mean number of touches of a path, before truncation.
+
+    max_length: int; default=50.
+      The largest number of touches of a path.
+
+    conversion_rate: float; default=0.05.
+      The mean fraction of paths that convert.
+
+    revenue_distribution: one of {"lognormal", "constant", None};
+      default="lognormal".
+      The distribution of the revenue of a conversion; None gives no
+      revenue column.
+
+    revenue_mean: float; default=50.0.
+      The mean revenue of a conversion.
+
+    revenue_sigma: float; default=1.0.
+      The standard deviation of the log of the revenue.
+
+    order: int; default=1.
+      The order of the Markov chain the channels are drawn from; 0
+      draws every touch independently.
+
+    concentration: float; default=0.5.
+      The Dirichlet concentration of the transition probabilities;
+      lower values give more predictable journeys.
+
+    separator: str; default=" >>> ".
+      The symbol joining the channels of a path.
+
+    random_state: int; default=None; optional.
+      Seeds the generator; the same seed gives the same journeys.
+
+    Returns
+    -------
+    df: pandas.DataFrame; with the columns "path", "conversions",
+      "nulls", "revenue" (unless `revenue_distribution` is None) and
+      "cost".
+    """
+    if revenue_distribution not in REVENUE_DISTRIBUTIONS:
+        raise ValueError(f"Unknown revenue distribution: "
+                         f"{revenue_distribution!r}")
+    rng = np.random.default_rng(random_state)
+
+    lengths = _path_lengths(rng, n_paths, length_distribution, mean_length,
+                            max_length)
+    channels, offsets = _walk(rng, lengths, n_channels, order,
+                              concentration)
+
+    # every channel lifts the odds of converting by its own factor
+    lift = rng.lognormal(0.0, 0.5, n_channels)
+    path_id = np.repeat(np.arange(n_paths), lengths)
+    log_odds = np.bincount(path_id, weights=np.log(lift[channels]),
+                           minlength=n_paths)
+    base = _calibrate(log_odds[:100000], conversion_rate)
+    p = 1.0 / (1.0 + np.exp(-(base + log_odds)))
+    conversions = (rng.random(n_paths) < p).astype(np.int64)
+
+    names = np.asarray([f"channel_{c}" for c in range(n_channels)],
+                       dtype=object)
+    tokens = names[channels].tolist()
+    bounds = offsets.tolist()
+    paths = [separator.join(tokens[lo:hi])
+             for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+    df = pd.DataFrame({
+        "path": paths,
+        "conversions": conversions,
+        "nulls": 1 - conversions
+    })
+    if revenue_distribution == "lognormal":
+        mu = np.log(revenue_mean) - revenue_sigma ** 2 / 2
+        df["revenue"] = conversions * rng.lognormal(mu, revenue_sigma,
+                                                    n_paths).round(2)
+    elif revenue_distribution == "constant":
+        df["revenue"] = conversions * float(revenue_mean)
+    df["cost"] = (lengths * rng.uniform(0.1, 2.0, n_paths)).round(2)
+    return df
@@ -17,8 +17,13 @@ setup(name="pychattr",
       long_description="Marketing Attribution for Python",
       install_requires=[
           "numpy",
-          "pandas"
+          "pandas>=1.5",
+          "scipy"
       ],
+      extras_require={
+          "arrow": ["pyarrow"],
+          "numba": ["numba"]
+      },
       classifiers=[
           "Development Status :: 3 - Alpha",
           "Programming Language :: Python :: 3",
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pychattr.datasets import generate_journeys
+
+
+@pytest.fixture(scope="session")
+def journeys():
+    """Small seeded journeys, with revenue and cost, and paths joined
+    by " >>> "."""
+    return generate_journeys(3000, n_channels=6, mean_length=4,
+                             conversion_rate=0.2, random_state=0)
+
+
+@pytest.fixture(scope="session")
+def markov_params():
+    """Build the parameters of a MarkovModel fitted on `journeys`."""
+    def params(**kwargs):
+        defaults = {"path_feature": "path",
+                    "conversion_feature": "conversions",
+                    "null_feature": "nulls", "n_simulations": 20000,
+                    "random_state": 0}
+        defaults.update(kwargs)
+        return defaults
+    return params
+
+
+@pytest.fixture(scope="session")
+def dated(journeys):
+    """`journeys` with a random segment and day, over ten days."""
+    rng = np.random.RandomState(1)
+    return journeys.assign(
+        segment=rng.choice(["a", "b", "c"], len(journeys)),
+        date=pd.Timestamp("2024-01-01") +
+        pd.to_timedelta(rng.randint(0, 10, len(journeys)), unit="D")
+    )
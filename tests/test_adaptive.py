@@ -0,0 +1,32 @@
+import pytest
+
+from pychattr.channel_attribution import MarkovModel
+
+
+@pytest.mark.parametrize("engine", ["loop", "batch"])
+def test_tol_stops_early_with_the_default_budget(journeys, markov_params,
+                                                 engine):
+    params = markov_params(engine=engine, tol=0.2)
+    del params["n_simulations"]
+    model = MarkovModel(**params).fit(journeys)
+
+    stats = model.simulation_stats_
+    assert stats["converged"]
+    assert 4 <= stats["n_batches"] < 20
+    assert stats["n_walks"] == stats["n_batches"] * 500
+    assert model.attribution_error_ is not None
+
+
+def test_tol_not_reached_uses_the_whole_budget(journeys, markov_params):
+    model = MarkovModel(**markov_params(tol=1e-6, n_batches=5))
+    model.fit(journeys)
+
+    stats = model.simulation_stats_
+    assert not stats["converged"]
+    assert stats["n_batches"] == 5
+    assert stats["n_walks"] == 20000
+
+
+def test_n_batches_below_the_minimum(journeys, markov_params):
+    with pytest.raises(ValueError):
+        MarkovModel(**markov_params(tol=0.1, n_batches=3)).fit(journeys)
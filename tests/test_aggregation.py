@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+
+from pychattr.channel_attribution import MarkovModel
+
+
+def _sorted(df):
+    return df.sort_values(list(df.columns[:2])).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("order", [1, 2])
+def test_duplicate_paths_equal_aggregated_paths(journeys, markov_params,
+                                                order):
+    params = markov_params(engine="exact", k_order=order,
+                           revenue_feature="revenue")
+    aggregated = journeys.groupby("path", sort=False, as_index=False)[
+        ["conversions", "nulls", "revenue"]
+    ].sum()
+    assert len(aggregated) < len(journeys)
+
+    expected = MarkovModel(**params).fit(aggregated)
+    model = MarkovModel(**params).fit(journeys)
+    pd.testing.assert_frame_equal(model.attribution_model_,
+                                  expected.attribution_model_)
+    pd.testing.assert_frame_equal(model.removal_effects_,
+                                  expected.removal_effects_)
+    # the successors are kept in the order the rows meet them, so only
+    # the set of transitions is the same
+    pd.testing.assert_frame_equal(_sorted(model.transition_matrix_),
+                                  _sorted(expected.transition_matrix_))
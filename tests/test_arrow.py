@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+
+from pychattr.channel_attribution import HeuristicModel, MarkovModel
+
+pa = pytest.importorskip("pyarrow")
+
+
+INPUTS = {
+    "arrow_table": lambda df: pa.Table.from_pandas(df),
+    "string_pyarrow": lambda df: df.astype({"path": "string[pyarrow]"}),
+    "arrow_dtype": lambda df: df.astype(
+        {"path": pd.ArrowDtype(pa.large_string())}
+    ),
+    "chunked_table": lambda df: pa.concat_tables([
+        pa.Table.from_pandas(df.iloc[:1000]),
+        pa.Table.from_pandas(df.iloc[1000:])
+    ]),
+    "dictionary_path": lambda df: pa.Table.from_pandas(df).set_column(
+        0, "path", pa.chunked_array([
+            pa.array(df["path"]).dictionary_encode()
+        ])
+    ),
+    "dict": lambda df: {c: df[c].to_numpy() for c in df.columns},
+}
+
+
+@pytest.mark.parametrize("kind", INPUTS)
+@pytest.mark.parametrize("order", [1, 2])
+def test_markov_arrow_inputs_equal_pandas(journeys, markov_params, kind,
+                                          order):
+    params = markov_params(k_order=order, revenue_feature="revenue")
+    expected = MarkovModel(**params).fit(journeys)
+    model = MarkovModel(**params).fit(INPUTS[kind](journeys))
+    pd.testing.assert_frame_equal(model.attribution_model_,
+                                  expected.attribution_model_)
+    pd.testing.assert_frame_equal(model.removal_effects_,
+                                  expected.removal_effects_)
+
+
+@pytest.mark.parametrize("kind", INPUTS)
+def test_heuristic_arrow_inputs_equal_pandas(journeys, kind):
+    params = dict(path_feature="path", conversion_feature="conversions",
+                  revenue_feature="revenue", cost_feature="cost")
+    expected = HeuristicModel(**params).fit(journeys)
+    model = HeuristicModel(**params).fit(INPUTS[kind](journeys))
+    pd.testing.assert_frame_equal(model.attribution_model_,
+                                  expected.attribution_model_)
+
+
+def test_fit_leaves_the_frame_unchanged(journeys, markov_params):
+    df = journeys.copy()
+    before = df.copy()
+    MarkovModel(**markov_params()).fit(df)
+    pd.testing.assert_frame_equal(df, before)
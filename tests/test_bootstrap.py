@@ -0,0 +1,32 @@
+import pandas as pd
+import pytest
+
+from pychattr.channel_attribution import HeuristicModel, MarkovModel
+
+
+def test_markov_bootstrap_does_not_depend_on_n_jobs(journeys,
+                                                    markov_params):
+    params = markov_params(engine="exact")
+    one = MarkovModel(**params).bootstrap(journeys, n_boot=8, n_jobs=1,
+                                          random_state=1)
+    two = MarkovModel(**params).bootstrap(journeys, n_boot=8, n_jobs=2,
+                                          random_state=1)
+    pd.testing.assert_frame_equal(one.attribution_intervals_,
+                                  two.attribution_intervals_)
+
+
+@pytest.mark.parametrize("method", ["poisson", "multinomial"])
+def test_heuristic_bootstrap_does_not_depend_on_n_jobs(journeys, method):
+    params = dict(path_feature="path", conversion_feature="conversions",
+                  revenue_feature="revenue")
+    one = HeuristicModel(**params).bootstrap(journeys, n_boot=10,
+                                             method=method, n_jobs=1,
+                                             random_state=2)
+    two = HeuristicModel(**params).bootstrap(journeys, n_boot=10,
+                                             method=method, n_jobs=2,
+                                             random_state=2)
+    pd.testing.assert_frame_equal(one.attribution_intervals_,
+                                  two.attribution_intervals_)
+    intervals = one.attribution_intervals_
+    assert (intervals.filter(like="lower").values <=
+            intervals.filter(like="upper").values).all()
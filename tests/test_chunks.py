@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+
+from pychattr.channel_attribution import MarkovModel
+
+
+def _assert_same_fit(model, expected):
+    pd.testing.assert_frame_equal(model.attribution_model_,
+                                  expected.attribution_model_)
+    pd.testing.assert_frame_equal(model.removal_effects_,
+                                  expected.removal_effects_)
+
+
+def test_fit_chunks_of_frames_equals_fit(journeys, markov_params):
+    params = markov_params(revenue_feature="revenue")
+    expected = MarkovModel(**params).fit(journeys)
+    chunks = (journeys.iloc[i:i + 700] for i in range(0, len(journeys), 700))
+    _assert_same_fit(MarkovModel(**params).fit_chunks(chunks), expected)
+
+
+def test_fit_chunks_of_csv_equals_fit(journeys, markov_params, tmp_path):
+    source = tmp_path / "journeys.csv"
+    journeys.to_csv(source, index=False)
+    params = markov_params(revenue_feature="revenue")
+    expected = MarkovModel(**params).fit(pd.read_csv(source))
+    model = MarkovModel(**params).fit_chunks(source, chunksize=700)
+    _assert_same_fit(model, expected)
+
+
+def test_fit_chunks_of_parquet_equals_fit(journeys, markov_params,
+                                          tmp_path):
+    pytest.importorskip("pyarrow")
+    source = tmp_path / "journeys.parquet"
+    journeys.to_parquet(source, row_group_size=700)
+    params = markov_params(k_order=2)
+    expected = MarkovModel(**params).fit(journeys)
+    model = MarkovModel(**params).fit_chunks(source, chunksize=700)
+    _assert_same_fit(model, expected)
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from pychattr.channel_attribution._markov import CompoundStates
+
+# a vocabulary too large for the windows of 3 channels to be packed into
+# 64-bit keys, so they are hashed as raw bytes
+LARGE = range(2 ** 21 + 1)
+
+
+def _paths(seed, n_paths=500, n_channels=5):
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(0, 7, n_paths)
+    offsets = np.zeros(n_paths + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return rng.integers(0, n_channels, offsets[-1]), offsets
+
+
+def _encode(vocabularies, order=3):
+    states = CompoundStates(order)
+    encoded = [states.encode(*_paths(seed), vchannels)
+               for seed, vchannels in enumerate(vocabularies)]
+    return states, encoded
+
+
+@pytest.mark.parametrize("vocabularies", [[LARGE, LARGE], [range(5), LARGE]])
+def test_byte_keys_give_the_integer_key_states(vocabularies):
+    assert len(LARGE) ** 3 >= 2 ** 63
+    expected_states, expected = _encode([range(5), range(5)])
+    states, encoded = _encode(vocabularies)
+
+    assert states.n_states == expected_states.n_states
+    np.testing.assert_array_equal(states.member_array(),
+                                  expected_states.member_array())
+    for (ids, offsets), (expected_ids, expected_offsets) in \
+            zip(encoded, expected):
+        np.testing.assert_array_equal(ids, expected_ids)
+        np.testing.assert_array_equal(offsets, expected_offsets)
+
+
+def test_states_are_the_windows_of_the_paths():
+    channels, offsets = _paths(0)
+    states = CompoundStates(2)
+    ids, state_offsets = states.encode(channels, offsets, range(5))
+    members = states.member_array()
+    for i in range(len(offsets) - 1):
+        path = channels[offsets[i]:offsets[i + 1]].tolist()
+        windows = [tuple(c for c in members[s] if c >= 0)
+                   for s in ids[state_offsets[i]:state_offsets[i + 1]]]
+        expected = [tuple(path[j:j + 2])
+                    for j in range(max(len(path) - 1, min(len(path), 1)))]
+        assert windows == expected
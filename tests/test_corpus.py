@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pychattr.channel_attribution import (HeuristicModel, MarkovModel,
+                                          PathCorpus)
+
+
+def test_heuristic_corpus_equals_strings(journeys):
+    params = dict(path_feature="path", conversion_feature="conversions",
+                  revenue_feature="revenue", cost_feature="cost")
+    expected = HeuristicModel(**params).fit(journeys)
+    model = HeuristicModel(**params).fit(PathCorpus(journeys, "path"))
+    pd.testing.assert_frame_equal(model.attribution_model_,
+                                  expected.attribution_model_)
+
+
+def test_corpus_sums_by_distinct_path(journeys):
+    corpus = PathCorpus(journeys, "path")
+    assert corpus.n_rows == len(journeys)
+    assert corpus.n_paths == journeys["path"].nunique()
+
+    sums = journeys.groupby("path", sort=False)["revenue"].sum()
+    np.testing.assert_allclose(corpus.path_sums("revenue"), sums)
+    assert corpus.path_sums("revenue") is corpus.path_sums("revenue")
+    with pytest.raises(ValueError):
+        corpus.column("missing")
+
+
+def test_corpus_is_shared_between_models(journeys, markov_params):
+    corpus = PathCorpus(journeys, "path")
+    for order in (1, 2, 3):
+        for loops in (True, False):
+            params = markov_params(k_order=order, loops=loops)
+            expected = MarkovModel(**params).fit(journeys)
+            model = MarkovModel(**params).fit(corpus)
+            pd.testing.assert_frame_equal(model.attribution_model_,
+                                          expected.attribution_model_)
+
+
+def test_corpus_rejects_other_paths(journeys, markov_params):
+    corpus = PathCorpus(journeys, "path")
+    with pytest.raises(ValueError):
+        MarkovModel(**markov_params(separator="|")).fit(corpus)
+    with pytest.raises(ValueError):
+        MarkovModel(**markov_params(null_feature="missing")).fit(corpus)
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pychattr.datasets import generate_journeys
+
+
+def test_journeys_are_seeded():
+    pd.testing.assert_frame_equal(generate_journeys(1000, random_state=4),
+                                  generate_journeys(1000, random_state=4))
+    assert not generate_journeys(1000, random_state=5)["path"] \
+        .equals(generate_journeys(1000, random_state=4)["path"])
+
+
+@pytest.mark.parametrize("order", [0, 1, 2])
+def test_journeys_follow_the_parameters(order):
+    df = generate_journeys(20000, n_channels=4, max_length=6,
+                           conversion_rate=0.2, order=order,
+                           separator="|", random_state=0)
+    assert list(df.columns) == ["path", "conversions", "nulls", "revenue",
+                                "cost"]
+    paths = df["path"].str.split("|")
+    lengths = paths.str.len()
+    assert lengths.between(1, 6).all()
+    assert set(np.concatenate(paths.to_numpy())) == \
+        {f"channel_{c}" for c in range(4)}
+    assert (df["conversions"] + df["nulls"] == 1).all()
+    assert df["conversions"].mean() == pytest.approx(0.2, abs=0.02)
+    assert (df.loc[df["conversions"] == 0, "revenue"] == 0).all()
+    assert (df.loc[df["conversions"] == 1, "revenue"] > 0).all()
+
+
+def test_journeys_without_revenue():
+    df = generate_journeys(100, revenue_distribution=None, random_state=0)
+    assert "revenue" not in df.columns
+    with pytest.raises(ValueError):
+        generate_journeys(100, revenue_distribution="normal")
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from pychattr.channel_attribution import MarkovModel
+
+
+def _totals(model):
+    return model.attribution_model_.set_index("channel_name") \
+        .sort_index()["total_conversions"]
+
+
+@pytest.mark.parametrize("order", [1, 2])
+@pytest.mark.parametrize("engine", ["loop", "batch"])
+def test_simulation_agrees_with_exact(journeys, markov_params, order,
+                                      engine):
+    exact = MarkovModel(**markov_params(k_order=order, engine="exact"))
+    simulated = MarkovModel(**markov_params(k_order=order, engine=engine,
+                                            n_simulations=400000,
+                                            batch_size=50000))
+    exact.fit(journeys)
+    simulated.fit(journeys)
+
+    np.testing.assert_allclose(_totals(simulated), _totals(exact),
+                               rtol=0.05)
+    removal = [m.removal_effects_.set_index("channel_name").sort_index()
+               for m in (simulated, exact)]
+    np.testing.assert_allclose(removal[0]["removal_effect"],
+                               removal[1]["removal_effect"], atol=0.02)
+
+
+def test_exact_totals_sum_to_conversions(journeys, markov_params):
+    model = MarkovModel(**markov_params(engine="exact",
+                                        revenue_feature="revenue"))
+    model.fit(journeys)
+    results = model.attribution_model_
+    assert results["total_conversions"].sum() == \
+        pytest.approx(journeys["conversions"].sum())
+    assert results["total_revenue"].sum() == \
+        pytest.approx(journeys["revenue"].sum())
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from pychattr.channel_attribution._markov import Fx
+
+
+def _dense(fx):
+    fx._compact()
+    dense = np.zeros((fx.nrows, fx.ncols))
+    np.add.at(dense, (fx.row_indices(), fx.indices), fx.data)
+    return dense
+
+
+def _random_counts(rng, nrows, ncols, n):
+    rows = rng.integers(0, nrows, n)
+    cols = rng.integers(0, ncols, n)
+    vals = rng.integers(1, 5, n).astype(float)
+    expected = np.zeros((nrows, ncols))
+    np.add.at(expected, (rows, cols), vals)
+    return rows, cols, vals, expected
+
+
+def test_add_sums_scalars_and_arrays():
+    rng = np.random.default_rng(0)
+    rows, cols, vals, expected = _random_counts(rng, 7, 5, 200)
+    fx = Fx(7, 5)
+    for r, c, v in zip(rows[:50], cols[:50], vals[:50]):
+        fx.add(int(r), int(c), float(v))
+    fx.add(rows[50:120], cols[50:120], vals[50:120])
+    fx._compact()
+    fx.add(rows[120:], cols[120:], vals[120:])
+
+    np.testing.assert_array_equal(_dense(fx), expected)
+    assert fx.non_zeros == np.count_nonzero(expected)
+    # one entry per stored transition
+    keys = fx.row_indices() * fx.ncols + fx.indices
+    assert len(np.unique(keys)) == len(keys)
+
+
+def test_compact_keeps_successors_in_insertion_order():
+    fx = Fx(2, 4)
+    fx.add(0, 3, 1.0).add(1, 2, 1.0).add(0, 1, 1.0)
+    fx.add(np.array([0, 0]), np.array([3, 2]), np.array([2.0, 1.0]))
+    fx._compact()
+    np.testing.assert_array_equal(fx.indptr, [0, 3, 4])
+    np.testing.assert_array_equal(fx.indices, [3, 1, 2, 2])
+    np.testing.assert_array_equal(fx.data, [3.0, 1.0, 1.0, 1.0])
+
+
+def test_resize_moves_the_columns():
+    rng = np.random.default_rng(1)
+    rows, cols, vals, expected = _random_counts(rng, 4, 3, 50)
+    fx = Fx(4, 3).add(rows, cols, vals)
+    col_map = np.array([0, 2, 4])
+    fx.resize(6, 5, col_map=col_map)
+    fx.add(np.array([5]), np.array([1]), np.array([2.0]))
+
+    grown = np.zeros((6, 5))
+    grown[:4, col_map] = expected
+    grown[5, 1] = 2.0
+    np.testing.assert_array_equal(_dense(fx), grown)
+
+
+def test_scale_and_transition_probabilities():
+    rng = np.random.default_rng(2)
+    rows, cols, vals, expected = _random_counts(rng, 5, 5, 60)
+    fx = Fx(5, 5).add(rows, cols, vals).scale(0.5)
+    np.testing.assert_allclose(_dense(fx), expected * 0.5)
+
+    r, c, p = fx.tran_matx()
+    probs = np.zeros((5, 5))
+    probs[r, c] = p
+    totals = expected.sum(axis=1, keepdims=True)
+    np.testing.assert_allclose(
+        probs, np.divide(expected, totals, out=np.zeros_like(expected),
+                         where=totals > 0)
+    )
+
+
+@pytest.mark.parametrize("alias", [False, True])
+def test_sampling_follows_the_counts(alias):
+    rng = np.random.default_rng(3)
+    rows, cols, vals, expected = _random_counts(rng, 6, 8, 40)
+    fx = Fx(6, 8).add(rows, cols, vals).cum(alias=alias)
+    n = 200000
+
+    for row in np.flatnonzero(expected.sum(axis=1)):
+        probs = expected[row] / expected[row].sum()
+        draws = fx.sim_batch(np.full(n, row), rng.random(n))
+        freq = np.bincount(draws, minlength=8) / n
+        # within 5 standard errors of every probability
+        tolerance = 5 * np.sqrt(probs * (1 - probs) / n) + 1e-12
+        np.testing.assert_array_less(np.abs(freq - probs), tolerance)
+
+        scalar = [fx.sim(row, u) for u in rng.random(2000)]
+        assert set(scalar) <= set(np.flatnonzero(probs))
@@ -0,0 +1,57 @@
+import collections
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pychattr.channel_attribution import HeuristicModel
+
+
+EDGE_PATHS = ["A> >>> B", "B >>> A>", "A>", "A >>", "B", ">> B >>> C",
+              "C >>> C >>> A>", "A >>> >>> B"]
+
+
+def _reference(df, sep):
+    """The heuristic credits computed one path at a time, splitting the
+    paths with str.split."""
+    credit = collections.defaultdict(lambda: collections.defaultdict(float))
+    for path, conv, rev, cost in df.itertuples(index=False):
+        channels = [c.strip() for c in path.split(sep)]
+        for metric, value in (("conversions", conv), ("revenue", rev),
+                              ("cost", cost)):
+            credit[channels[0]][f"first_touch_{metric}"] += value
+            credit[channels[-1]][f"last_touch_{metric}"] += value
+            for channel in channels:
+                credit[channel][f"linear_touch_{metric}"] += \
+                    value / len(channels)
+    results = pd.DataFrame.from_dict(credit, orient="index").fillna(0.0)
+    for metric in ("conversions", "revenue", "cost"):
+        results[f"ensemble_{metric}"] = sum(
+            results[f"{h}_{metric}"]
+            for h in ("first_touch", "last_touch", "linear_touch")
+        )
+    return results.sort_index()
+
+
+@pytest.fixture
+def edge_df():
+    rng = np.random.RandomState(0)
+    n = 4 * len(EDGE_PATHS)
+    return pd.DataFrame({
+        "path": EDGE_PATHS * 4,
+        "conversions": rng.randint(0, 3, n),
+        "revenue": rng.uniform(0, 10, n).round(2),
+        "cost": rng.uniform(0, 2, n).round(2)
+    })
+
+
+def test_heuristic_matches_str_split_on_edge_case_paths(edge_df):
+    model = HeuristicModel("path", "conversions", revenue_feature="revenue",
+                           cost_feature="cost")
+    model.fit(edge_df)
+    results = model.attribution_model_.set_index("channel")
+    expected = _reference(edge_df, ">>>")
+
+    assert list(results.index) == list(expected.index)
+    pd.testing.assert_frame_equal(results.loc[:, expected.columns],
+                                  expected, check_names=False)
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pychattr.channel_attribution import HeuristicModel, MarkovModel
+
+
+PATHS = ["A >>> B", None, "B >>> C", np.nan, "A >>> B", "C", None]
+CONVERSIONS = [1, 1, 0, 1, 0, 1, 0]
+NULLS = [0, 0, 1, 0, 1, 0, 1]
+
+
+def _frame(paths):
+    return pd.DataFrame({"path": pd.Series(paths, dtype=object),
+                         "conversions": CONVERSIONS, "nulls": NULLS})
+
+
+def _lists(paths):
+    return [p.split(" >>> ") if isinstance(p, str) else None
+            for p in paths]
+
+
+def _markov(df):
+    model = MarkovModel("path", "conversions", null_feature="nulls",
+                        engine="exact")
+    return model.fit(df)
+
+
+@pytest.mark.parametrize("dtype", [object, "string[pyarrow]"])
+def test_markov_missing_string_paths_are_empty(dtype):
+    missing = _frame(PATHS)
+    missing["path"] = missing["path"].astype(dtype)
+    empty = _frame([p if isinstance(p, str) else "" for p in PATHS])
+
+    result = _markov(missing)
+    expected = _markov(empty)
+    pd.testing.assert_frame_equal(result.attribution_model_,
+                                  expected.attribution_model_)
+    pd.testing.assert_frame_equal(result.removal_effects_,
+                                  expected.removal_effects_)
+
+
+def test_markov_missing_paths_agree_between_input_kinds():
+    strings = _markov(_frame(PATHS))
+    lists = _markov(_frame(_lists(PATHS)))
+    pd.testing.assert_frame_equal(strings.attribution_model_,
+                                  lists.attribution_model_)
+
+
+def test_heuristic_missing_paths_get_no_credit():
+    df = _frame(PATHS)
+    present = df.loc[df["path"].notna()].reset_index(drop=True)
+
+    expected = HeuristicModel("path", "conversions").fit(present)
+    for paths in (PATHS, _lists(PATHS)):
+        model = HeuristicModel("path", "conversions").fit(_frame(paths))
+        pd.testing.assert_frame_equal(model.attribution_model_,
+                                      expected.attribution_model_)
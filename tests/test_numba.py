@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+from pychattr.channel_attribution import MarkovModel
+
+pytest.importorskip("numba")
+
+
+@pytest.mark.parametrize("order", [1, 2, 3])
+@pytest.mark.parametrize("loops", [True, False])
+@pytest.mark.parametrize("revenue", [None, "revenue"])
+@pytest.mark.parametrize("sampler", ["cdf", "alias"])
+def test_numba_matches_python(journeys, markov_params, order, loops,
+                              revenue, sampler):
+    kwargs = dict(k_order=order, loops=loops, revenue_feature=revenue,
+                  sampler=sampler)
+    python = MarkovModel(**markov_params(backend="python", **kwargs))
+    numba = MarkovModel(**markov_params(backend="numba", **kwargs))
+    python.fit(journeys)
+    numba.fit(journeys)
+
+    pd.testing.assert_frame_equal(numba.attribution_model_,
+                                  python.attribution_model_)
+    pd.testing.assert_frame_equal(numba.removal_effects_,
+                                  python.removal_effects_)
+    assert numba.simulation_stats_["n_steps"] == \
+        python.simulation_stats_["n_steps"]
+
+
+def test_numba_matches_python_across_random_blocks(journeys,
+                                                   markov_params):
+    # more than one block of 1e6 uniforms is drawn
+    kwargs = dict(revenue_feature="revenue", n_simulations=300000)
+    python = MarkovModel(**markov_params(backend="python", **kwargs))
+    numba = MarkovModel(**markov_params(backend="numba", **kwargs))
+    python.fit(journeys)
+    numba.fit(journeys)
+
+    assert python.simulation_stats_["n_steps"] > 1e6
+    pd.testing.assert_frame_equal(numba.attribution_model_,
+                                  python.attribution_model_)
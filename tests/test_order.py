@@ -0,0 +1,34 @@
+import pandas as pd
+
+from pychattr.channel_attribution import MarkovModel
+from pychattr.datasets import generate_journeys
+
+
+def test_select_order_finds_the_order_of_the_journeys(markov_params):
+    df = generate_journeys(50000, n_channels=5, order=2, mean_length=5,
+                           random_state=3)
+    for criterion in ("heldout", "aic", "bic"):
+        model = MarkovModel(**markov_params(engine="exact"))
+        model.select_order(df, max_order=3, criterion=criterion,
+                           random_state=0)
+        assert model.order == 2
+        assert list(model.order_selection_["order"]) == [1, 2, 3]
+
+    expected = MarkovModel(**markov_params(engine="exact", k_order=2))
+    pd.testing.assert_frame_equal(model.attribution_model_,
+                                  expected.fit(df).attribution_model_)
+
+
+def test_order_statistics_match_the_fitted_counts(journeys, markov_params):
+    model = MarkovModel(**markov_params(engine="exact"))
+    stats = model.select_order(journeys, max_order=3, criterion="aic") \
+        .order_selection_
+    for order, row in stats.set_index("order").iterrows():
+        fitted = MarkovModel(**markov_params(engine="exact",
+                                             k_order=order)).fit(journeys)
+        assert row["n_states"] == fitted.fit_stats_["n_states"]
+        assert row["n_transitions"] == fitted.fit_stats_["n_transitions"]
+    # higher orders fit the transitions at least as well
+    assert stats["log_likelihood"].is_monotonic_increasing
+    assert (stats["aic"] == 2 * stats["n_parameters"] -
+            2 * stats["log_likelihood"]).all()
@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pychattr.channel_attribution import MarkovModel
+
+
+@pytest.mark.parametrize("engine", ["loop", "batch"])
+def test_n_jobs_is_reproducible(journeys, markov_params, engine):
+    params = markov_params(engine=engine, n_jobs=2, batch_size=5000)
+    first = MarkovModel(**params).fit(journeys)
+    second = MarkovModel(**params).fit(journeys)
+    pd.testing.assert_frame_equal(first.attribution_model_,
+                                  second.attribution_model_)
+    assert first.simulation_stats_["n_walks"] == 20000
+
+
+def test_n_jobs_agrees_with_one_process(journeys, markov_params):
+    params = markov_params(n_simulations=200000, batch_size=20000)
+    one = MarkovModel(**params).fit(journeys).attribution_model_
+    two = MarkovModel(**params, n_jobs=2).fit(journeys).attribution_model_
+    np.testing.assert_allclose(two["total_conversions"],
+                               one["total_conversions"], rtol=0.05)
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pychattr.channel_attribution import MarkovModel
+
+
+def _assert_same_fit(model, expected):
+    pd.testing.assert_frame_equal(model.attribution_model_,
+                                  expected.attribution_model_)
+    pd.testing.assert_frame_equal(model.removal_effects_,
+                                  expected.removal_effects_)
+
+
+@pytest.mark.parametrize("order", [1, 2])
+@pytest.mark.parametrize("revenue", [None, "revenue"])
+def test_partial_fit_equals_fit(journeys, markov_params, order, revenue):
+    params = markov_params(k_order=order, revenue_feature=revenue)
+    expected = MarkovModel(**params).fit(journeys)
+
+    model = MarkovModel(**params)
+    for rows in np.array_split(np.arange(len(journeys)), 3):
+        model.partial_fit(journeys.iloc[rows].reset_index(drop=True))
+    _assert_same_fit(model, expected)
+
+
+def test_partial_fit_decay_scales_the_old_counts(journeys, markov_params):
+    params = markov_params(engine="exact")
+    half = len(journeys) // 2
+    old, new = journeys.iloc[:half], journeys.iloc[half:]
+
+    model = MarkovModel(**params).fit(old).partial_fit(new, decay=0.5)
+    weighted = pd.concat([old.assign(conversions=old["conversions"] * 0.5,
+                                     nulls=old["nulls"] * 0.5), new])
+    expected = MarkovModel(**params).fit(weighted)
+    pd.testing.assert_frame_equal(model.attribution_model_,
+                                  expected.attribution_model_)
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from pychattr.channel_attribution._paths import tokenize_paths
+
+
+def _split(paths, sep, keep_empty=False):
+    """The channels of every path, split one path at a time."""
+    split = []
+    for path in paths:
+        channels = [c.strip() for c in path.split(sep)]
+        split.append([c for c in channels if c or keep_empty])
+    return split
+
+
+def _decode(codes, offsets, vocabulary):
+    names = list(vocabulary)
+    return [[names[c] for c in codes[lo:hi]]
+            for lo, hi in zip(offsets[:-1], offsets[1:])]
+
+
+@pytest.mark.parametrize("paths", [
+    ["A >>", "B"],
+    ["A> >>> B", "B >>> A>", "A>"],
+    ["A >", ">> B >>> C", ">>> A", ""],
+    ["A >>>", ">>> B", "C"],
+])
+@pytest.mark.parametrize("keep_empty", [False, True])
+def test_tokenize_paths_ending_in_part_of_the_separator(paths, keep_empty):
+    codes, offsets, vocabulary = tokenize_paths(paths, ">>>",
+                                                keep_empty=keep_empty)
+    assert _decode(codes, offsets, vocabulary) == \
+        _split(paths, ">>>", keep_empty)
+
+
+def test_tokenize_paths_in_chunks():
+    paths = ["A >>", "B >>> A", "A> >>> B", "C"] * 5
+    codes, offsets, vocabulary = tokenize_paths(paths, ">>>", chunk_size=3)
+    assert _decode(codes, offsets, vocabulary) == _split(paths, ">>>")
+    assert np.array_equal(np.diff(offsets),
+                          [len(p) for p in _split(paths, ">>>")])
@@ -0,0 +1,90 @@
+import pytest
+
+from pychattr.channel_attribution import HeuristicModel, MarkovModel
+from pychattr.channel_attribution._profiling import FitProfiler
+
+
+class Recorder(object):
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event, info):
+        self.events.append((event, info))
+
+    def names(self, event):
+        return [info["phase"] for e, info in self.events if e == event]
+
+
+def test_phase_ends_when_its_block_raises():
+    recorder = Recorder()
+    profiler = FitProfiler(recorder)
+    with pytest.raises(KeyError):
+        with profiler.phase("parse"):
+            raise KeyError("path")
+
+    assert profiler._phase is None
+    assert "parse" in profiler.phases
+    assert recorder.names("phase_end") == ["parse"]
+
+
+def test_profiler_sums_phases_and_counts():
+    recorder = Recorder()
+    profiler = FitProfiler(recorder, interval=0.0)
+    for _ in range(2):
+        with profiler.phase("count"):
+            profiler.progress(n_walks=10, n_steps=40)
+        profiler.count(n_rows=5)
+    stats = profiler.finish(n_states=3)
+
+    assert recorder.names("phase_start") == ["count", "count"]
+    assert recorder.names("progress") == ["count", "count"]
+    progress = [info for e, info in recorder.events if e == "progress"]
+    assert all("steps_per_second" in info for info in progress)
+    assert stats["n_rows"] == 10 and stats["n_states"] == 3
+    assert list(stats["phases"]) == ["count"]
+    assert recorder.events[-1] == ("fit_end", stats)
+
+
+def test_progress_is_throttled():
+    recorder = Recorder()
+    profiler = FitProfiler(recorder, interval=3600.0)
+    with profiler.phase("simulate"):
+        for _ in range(100):
+            profiler.progress(n_walks=1)
+    assert recorder.names("progress") == []
+
+
+@pytest.mark.parametrize("engine, phase", [("loop", "simulate"),
+                                           ("exact", "solve")])
+def test_markov_fit_stats(journeys, markov_params, engine, phase):
+    recorder = Recorder()
+    model = MarkovModel(**markov_params(engine=engine, callbacks=recorder))
+    stats = model.fit(journeys).fit_stats_
+
+    assert {"prepare", "parse", "count", phase} <= set(stats["phases"])
+    assert stats["n_rows"] == len(journeys)
+    assert stats["n_paths"] == journeys["path"].nunique()
+    assert stats["seconds"] >= sum(stats["phases"].values()) * 0.99
+    assert recorder.names("phase_start") == recorder.names("phase_end")
+    assert recorder.events[-1] == ("fit_end", stats)
+
+
+def test_fit_chunks_sums_the_paths_of_each_chunk(journeys, markov_params):
+    chunks = [journeys.iloc[i:i + 1000] for i in range(0, len(journeys),
+                                                         1000)]
+    stats = MarkovModel(**markov_params()).fit_chunks(chunks).fit_stats_
+    assert stats["n_rows"] == len(journeys)
+    assert stats["n_paths"] == sum(c["path"].nunique() for c in chunks)
+    assert "read" in stats["phases"]
+
+
+def test_heuristic_fit_stats(journeys):
+    recorder = Recorder()
+    model = HeuristicModel("path", "conversions", callbacks=[recorder])
+    stats = model.fit(journeys).fit_stats_
+
+    assert list(stats["phases"]) == ["prepare", "parse", "credit",
+                                     "assemble"]
+    assert stats["n_rows"] == len(journeys)
+    assert stats["n_paths"] == journeys["path"].nunique()
+    assert recorder.names("phase_end") == list(stats["phases"])
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from pychattr.channel_attribution import MarkovModel
+from pychattr.channel_attribution._markov import Fx, _bin_values
+
+
+@pytest.mark.parametrize("n_bins", [1, 3, 8])
+def test_bins_keep_the_mean_value_of_every_state(n_bins):
+    rng = np.random.default_rng(0)
+    v_vui = rng.lognormal(3.0, 1.0, 40)
+    rows = rng.integers(0, 6, 300)
+    cols = rng.integers(0, len(v_vui), 300)
+    fV = Fx(6, len(v_vui)).add(rows, cols, rng.integers(1, 4, 300))
+    binned, values = _bin_values(fV, v_vui, n_bins)
+
+    assert (np.diff(binned.indptr) <= n_bins).all()
+    fV_rows, binned_rows = fV.row_indices(), binned.row_indices()
+    counts = np.bincount(fV_rows, weights=fV.data, minlength=6)
+    np.testing.assert_allclose(
+        np.bincount(binned_rows, weights=binned.data, minlength=6), counts
+    )
+    np.testing.assert_allclose(
+        np.bincount(binned_rows, weights=binned.data *
+                    values[binned.indices], minlength=6),
+        np.bincount(fV_rows, weights=fV.data * v_vui[fV.indices],
+                    minlength=6)
+    )
+
+
+def test_revenue_bins_keep_the_revenue(journeys, markov_params):
+    revenues = {}
+    for engine in ("exact", "loop"):
+        for bins in (None, 4):
+            model = MarkovModel(**markov_params(
+                engine=engine, revenue_feature="revenue", revenue_bins=bins,
+                n_simulations=200000
+            )).fit(journeys)
+            revenues[engine, bins] = \
+                model.attribution_model_["total_revenue"].to_numpy()
+
+    np.testing.assert_allclose(revenues["exact", 4],
+                               revenues["exact", None])
+    np.testing.assert_allclose(revenues["loop", 4], revenues["exact", None],
+                               rtol=0.05)
+    assert revenues["loop", 4].sum() == \
+        pytest.approx(journeys["revenue"].sum())
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+
+from pychattr.channel_attribution import MarkovModel, PathCorpus
+
+pa = pytest.importorskip("pyarrow")
+
+
+def _lists(df):
+    return [path.split(" >>> ") for path in df["path"]]
+
+
+INPUTS = {
+    "arrow_table": lambda df: pa.Table.from_pandas(df),
+    "dict": lambda df: {c: df[c].to_numpy() for c in df.columns},
+    "list_column": lambda df: df.assign(path=_lists(df)),
+    "arrow_list_table": lambda df: pa.Table.from_pandas(
+        df.assign(path=_lists(df))
+    ),
+    "corpus": lambda df: PathCorpus(df, "path"),
+}
+
+
+@pytest.fixture(scope="module")
+def model(journeys, markov_params):
+    return MarkovModel(**markov_params(engine="exact",
+                                       revenue_feature="revenue")) \
+        .fit(journeys)
+
+
+def test_transform_is_sparse_score_paths(journeys, model):
+    credit = model.transform(journeys)
+    assert sparse.issparse(credit)
+    assert credit.shape == (len(journeys), len(model.attribution_model_))
+    assert (credit.data != 0).all()
+
+    scores = model.score_paths(journeys["path"],
+                               conversions=journeys["conversions"])
+    channels = model.attribution_model_["channel_name"]
+    expected = scores.pivot_table(index="path", columns="channel_name",
+                                  values="conversions", aggfunc="sum") \
+        .reindex(index=range(len(journeys)), columns=channels) \
+        .fillna(0.0)
+    np.testing.assert_allclose(credit.toarray(), expected.to_numpy())
+    np.testing.assert_allclose(np.asarray(credit.sum(axis=1)).ravel(),
+                               journeys["conversions"])
+
+
+@pytest.mark.parametrize("kind", INPUTS)
+def test_transform_inputs_equal_strings(journeys, model, kind):
+    expected = model.transform(journeys)
+    credit = model.transform(INPUTS[kind](journeys))
+    assert (credit != expected).nnz == 0
+
+
+def test_unseen_channels_get_no_credit(journeys, model):
+    df = pd.DataFrame({"path": ["channel_0 >>> new", "new", None],
+                       "conversions": [2.0, 1.0, 1.0]})
+    credit = model.transform(df).toarray()
+    assert credit[0].sum() == pytest.approx(2.0)
+    assert not credit[1:].any()
+
+
+def test_score_paths_reads_tokenized_paths(journeys, model):
+    expected = model.score_paths(journeys["path"])
+    pd.testing.assert_frame_equal(model.score_paths(_lists(journeys)),
+                                  expected)
+    pd.testing.assert_frame_equal(
+        model.score_paths(PathCorpus(journeys, "path")), expected
+    )
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pychattr.channel_attribution import HeuristicModel, MarkovModel
+from pychattr.channel_attribution import _markov
+
+
+HEURISTIC = dict(path_feature="path", conversion_feature="conversions",
+                 revenue_feature="revenue", cost_feature="cost")
+
+
+def _by_channel(df, key="channel_name"):
+    return df.set_index(key).sort_index()
+
+
+def _assert_same(long, keys, expected, key="channel_name"):
+    mask = np.logical_and.reduce([long[k] == v for k, v in keys.items()])
+    result = long.loc[mask].drop(columns=list(keys))
+    pd.testing.assert_frame_equal(_by_channel(result, key),
+                                  _by_channel(expected, key))
+
+
+@pytest.mark.parametrize("engine", ["exact", "loop"])
+def test_markov_segments_equal_slice_and_fit(dated, markov_params,
+                                             engine):
+    params = markov_params(engine=engine, revenue_feature="revenue")
+    model = MarkovModel(**params).fit_segments(dated, "segment")
+    for segment, rows in dated.groupby("segment"):
+        expected = MarkovModel(**params).fit(rows.reset_index(drop=True))
+        _assert_same(model.segment_attribution_, {"segment": segment},
+                     expected.attribution_model_)
+        _assert_same(model.segment_removal_effects_, {"segment": segment},
+                     expected.removal_effects_)
+
+
+def test_heuristic_segments_equal_slice_and_fit(dated):
+    model = HeuristicModel(**HEURISTIC).fit_segments(dated, "segment")
+    for segment, rows in dated.groupby("segment"):
+        expected = HeuristicModel(**HEURISTIC).fit(
+            rows.reset_index(drop=True)
+        )
+        _assert_same(model.segment_attribution_, {"segment": segment},
+                     expected.attribution_model_, key="channel")
+
+
+def test_segment_counts_are_built_lazily(dated, markov_params, monkeypatch):
+    built, seen = [], []
+
+    class Counts(_markov.TransitionCounts):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            built.append(self)
+
+    def attribute_task(args):
+        seen.append(len(built))
+        return attribute(args)
+
+    attribute = _markov._attribute_task
+    monkeypatch.setattr(_markov, "TransitionCounts", Counts)
+    monkeypatch.setattr(_markov, "_attribute_task", attribute_task)
+    MarkovModel(**markov_params(engine="exact", n_jobs=1)) \
+        .fit_segments(dated, "segment")
+    assert seen == [1, 2, 3]
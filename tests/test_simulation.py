@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pychattr.channel_attribution import MarkovModel
+
+
+def _totals(model):
+    return model.attribution_model_.set_index("channel_name") \
+        .sort_index()["total_conversions"]
+
+
+def test_batch_engine_agrees_with_loop(journeys, markov_params):
+    loop = MarkovModel(**markov_params(engine="loop", n_simulations=200000))
+    batch = MarkovModel(**markov_params(engine="batch", n_simulations=200000,
+                                        batch_size=30000))
+    loop.fit(journeys)
+    batch.fit(journeys)
+
+    assert batch.simulation_stats_["n_walks"] == 200000
+    np.testing.assert_allclose(_totals(batch), _totals(loop), rtol=0.05)
+    np.testing.assert_allclose(_totals(batch).sum(),
+                               journeys["conversions"].sum())
+
+
+@pytest.mark.parametrize("sampler", ["cdf", "alias"])
+def test_fit_is_reproducible(journeys, markov_params, sampler):
+    results = [MarkovModel(**markov_params(sampler=sampler))
+               .fit(journeys).attribution_model_ for _ in range(2)]
+    pd.testing.assert_frame_equal(results[0], results[1])
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pychattr.channel_attribution import MarkovModel
+from pychattr.channel_attribution.markov import _PARAMS
+
+
+@pytest.mark.parametrize("order", [1, 2])
+@pytest.mark.parametrize("mmap_mode", ["r", None])
+def test_save_load_round_trip(journeys, markov_params, tmp_path, order,
+                              mmap_mode):
+    model = MarkovModel(**markov_params(k_order=order,
+                                        revenue_feature="revenue"))
+    model.fit(journeys)
+    model.save(tmp_path / "model.bin")
+    loaded = MarkovModel.load(tmp_path / "model.bin", mmap_mode=mmap_mode)
+
+    for attr in _PARAMS.values():
+        assert getattr(loaded, attr) == getattr(model, attr)
+    for name in ("attribution_model_", "removal_effects_"):
+        pd.testing.assert_frame_equal(getattr(loaded, name),
+                                      getattr(model, name))
+    pd.testing.assert_frame_equal(loaded.transition_matrix_,
+                                  model.transition_matrix_)
+    assert loaded.fit_stats_ == model.fit_stats_
+
+    arrays, meta = model.transition_counts_.to_arrays()
+    loaded_arrays, loaded_meta = loaded.transition_counts_.to_arrays()
+    assert loaded_meta == meta
+    for name, values in arrays.items():
+        np.testing.assert_array_equal(loaded_arrays[name], values)
+
+
+def test_partial_fit_after_load(journeys, markov_params, tmp_path):
+    params = markov_params(k_order=2, revenue_feature="revenue")
+    half = len(journeys) // 2
+    model = MarkovModel(**params).fit(journeys.iloc[:half])
+    model.save(tmp_path / "model.bin")
+
+    loaded = MarkovModel.load(tmp_path / "model.bin")
+    loaded.partial_fit(journeys.iloc[half:])
+    expected = MarkovModel(**params).fit(journeys)
+    pd.testing.assert_frame_equal(loaded.attribution_model_,
+                                  expected.attribution_model_)
+
+
+def test_load_rejects_other_models(journeys, markov_params, tmp_path):
+    class OtherModel(MarkovModel):
+        pass
+
+    MarkovModel(**markov_params()).fit(journeys).save(tmp_path / "m.bin")
+    with pytest.raises(ValueError):
+        OtherModel.load(tmp_path / "m.bin")
+
+
+def test_numpy_seeds_are_saved(journeys, markov_params, tmp_path):
+    params = markov_params(random_state=np.int64(7),
+                           n_simulations=np.int64(5000))
+    model = MarkovModel(**params).fit(journeys)
+    model.save(tmp_path / "model.bin")
+    loaded = MarkovModel.load(tmp_path / "model.bin")
+
+    assert loaded.random_state == 7 and type(loaded.random_state) is int
+    assert loaded.n_sim == 5000
+    refit = loaded.fit(journeys)
+    pd.testing.assert_frame_equal(refit.attribution_model_,
+                                  model.attribution_model_)
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pychattr.channel_attribution import (HeuristicModel, MarkovModel,
+                                          PathCorpus)
+from pychattr.channel_attribution._paths import factorize_tokens
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+def _lists(df):
+    return [path.split(" >>> ") for path in df["path"]]
+
+
+def _tuple(df):
+    codes, channels = pd.factorize(np.concatenate(_lists(df)))
+    offsets = np.zeros(len(df) + 1, dtype=np.int64)
+    np.cumsum([len(p) for p in _lists(df)], out=offsets[1:])
+    return codes, offsets, list(channels)
+
+
+INPUTS = {
+    "list_column": lambda df: df.assign(path=_lists(df)),
+    "tuple": lambda df: dict({c: df[c].to_numpy() for c in df.columns},
+                             path=_tuple(df)),
+}
+if pa is not None:
+    INPUTS["arrow_list_table"] = lambda df: pa.Table.from_pandas(
+        df.assign(path=_lists(df))
+    )
+
+
+@pytest.mark.parametrize("kind", INPUTS)
+@pytest.mark.parametrize("order", [1, 2])
+def test_markov_inputs_equal_strings(journeys, markov_params, kind, order):
+    params = markov_params(k_order=order, revenue_feature="revenue")
+    expected = MarkovModel(**params).fit(journeys)
+    model = MarkovModel(**params).fit(INPUTS[kind](journeys))
+    pd.testing.assert_frame_equal(model.attribution_model_,
+                                  expected.attribution_model_)
+    pd.testing.assert_frame_equal(model.removal_effects_,
+                                  expected.removal_effects_)
+
+
+@pytest.mark.parametrize("kind", INPUTS)
+def test_heuristic_inputs_equal_strings(journeys, kind):
+    params = dict(path_feature="path", conversion_feature="conversions",
+                  revenue_feature="revenue", cost_feature="cost")
+    expected = HeuristicModel(**params).fit(journeys)
+    model = HeuristicModel(**params).fit(INPUTS[kind](journeys))
+    pd.testing.assert_frame_equal(model.attribution_model_,
+                                  expected.attribution_model_)
+
+
+def test_integer_coded_paths_are_named_by_their_codes(journeys,
+                                                      markov_params):
+    codes = [[int(c.rsplit("_", 1)[1]) for c in path]
+             for path in _lists(journeys)]
+    params = markov_params(engine="exact")
+    expected = MarkovModel(**params).fit(journeys).attribution_model_
+    result = MarkovModel(**params).fit(journeys.assign(path=codes)) \
+        .attribution_model_
+    result["channel_name"] = "channel_" + result["channel_name"]
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_factorize_tokens_without_codes():
+    path_codes, codes, offsets = factorize_tokens(
+        np.zeros(0, dtype=np.int64), np.zeros(4, dtype=np.int64), 0
+    )
+    np.testing.assert_array_equal(path_codes, [0, 0, 0])
+    assert len(codes) == 0
+    np.testing.assert_array_equal(offsets, [0, 0])
+
+
+EMPTY = {
+    "list_column": pd.DataFrame({"path": [[], []], "conv": [1, 0]}),
+    "tuple": {"path": (np.zeros(0, dtype=np.int64),
+                       np.zeros(3, dtype=np.int64)),
+              "conv": np.array([1, 0])},
+}
+
+
+@pytest.mark.parametrize("kind", EMPTY)
+def test_all_empty_tokenized_paths(kind):
+    # the empty vocabulary used to hang the path factorization
+    df = EMPTY[kind]
+    model = HeuristicModel("path", "conv").fit(df)
+    assert model.attribution_model_.empty
+    with pytest.raises(ValueError, match="no channels"):
+        MarkovModel("path", "conv", engine="exact").fit(df)
+    if kind == "list_column":
+        assert PathCorpus(df, "path").n_paths == 1
+
+
+def test_score_all_empty_tokenized_paths(journeys, markov_params):
+    model = MarkovModel(**markov_params(engine="exact")).fit(journeys)
+    assert model.score_paths([[], []]).empty
+    df = pd.DataFrame({"path": [[], []], "conversions": [1, 0]})
+    assert model.transform(df).nnz == 0
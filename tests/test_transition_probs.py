@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+
+from pychattr.channel_attribution import MarkovModel
+
+
+@pytest.mark.parametrize("order", [1, 2])
+def test_to_sparse_matches_the_frame(journeys, markov_params, order):
+    model = MarkovModel(**markov_params(k_order=order, engine="exact"))
+    probs = model.fit(journeys).transition_probs_
+    matrix = probs.to_sparse()
+
+    assert sparse.issparse(matrix)
+    assert matrix.shape == (probs.n_states, probs.n_states)
+    sums = np.asarray(matrix.sum(axis=1)).ravel()
+    np.testing.assert_allclose(sums[sums > 0], 1.0)
+
+    index = {name: k for k, name in enumerate(probs.states)}
+    frame = model.transition_matrix_
+    rows = frame["channel_from"].map(index).to_numpy()
+    cols = frame["channel_to"].map(index).to_numpy()
+    np.testing.assert_allclose(np.asarray(matrix[rows, cols]).ravel(),
+                               frame["transition_probability"])
+
+
+def test_states_are_named_lazily(journeys, markov_params):
+    params = markov_params(engine="exact")
+    model = MarkovModel(**params).fit(journeys)
+    probs = model.transition_probs_
+    assert probs._states is None and probs._frame is None
+
+    # new channels added by a later update do not shift the names
+    new = journeys.assign(path=journeys["path"] + " >>> new_channel")
+    model.partial_fit(new)
+    expected = MarkovModel(**params).fit(journeys)
+    np.testing.assert_array_equal(probs.states,
+                                  expected.transition_probs_.states)
+    pd.testing.assert_frame_equal(probs.to_frame(),
+                                  expected.transition_matrix_)
+    assert "new_channel" in model.transition_probs_.states
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pychattr.channel_attribution import HeuristicModel, MarkovModel
+from pychattr.channel_attribution import _markov
+
+
+HEURISTIC = dict(path_feature="path", conversion_feature="conversions",
+                 revenue_feature="revenue", cost_feature="cost")
+
+
+def _by_channel(df, key="channel_name"):
+    return df.set_index(key).sort_index()
+
+
+def _assert_same(long, keys, expected, key="channel_name"):
+    mask = np.logical_and.reduce([long[k] == v for k, v in keys.items()])
+    result = long.loc[mask].drop(columns=list(keys))
+    pd.testing.assert_frame_equal(_by_channel(result, key),
+                                  _by_channel(expected, key))
+
+
+def _windows(dated, window, step):
+    days = pd.date_range(dated["date"].min(), dated["date"].max())
+    for end in range(window - 1, len(days), step):
+        first, last = days[end - window + 1], days[end]
+        rows = dated.loc[dated["date"].between(first, last)]
+        yield first, last, rows.reset_index(drop=True)
+
+
+@pytest.mark.parametrize("order", [1, 2])
+@pytest.mark.parametrize("window, step", [(4, 3), (2, 3), (5, 1)])
+def test_markov_windows_equal_slice_and_fit(dated, markov_params, order,
+                                            window, step):
+    params = markov_params(engine="exact", k_order=order,
+                           revenue_feature="revenue")
+    model = MarkovModel(**params).fit_windows(dated, "date", window,
+                                              step=step)
+    n_windows = 0
+    for first, last, rows in _windows(dated, window, step):
+        expected = MarkovModel(**params).fit(rows)
+        keys = {"window_start": first, "window_end": last}
+        _assert_same(model.window_attribution_, keys,
+                     expected.attribution_model_)
+        _assert_same(model.window_removal_effects_, keys,
+                     expected.removal_effects_)
+        n_windows += 1
+    assert model.window_attribution_["window_start"].nunique() == n_windows
+
+
+@pytest.mark.parametrize("window, step, n_days", [(4, 3, 10), (2, 3, 6),
+                                                  (5, 1, 10)])
+def test_each_day_is_counted_once(dated, markov_params, monkeypatch,
+                                  window, step, n_days):
+    calls = []
+
+    def take_paths(*args):
+        calls.append(1)
+        return take(*args)
+
+    take = _markov.take_paths
+    monkeypatch.setattr(_markov, "take_paths", take_paths)
+    MarkovModel(**markov_params(engine="exact", n_jobs=1)) \
+        .fit_windows(dated, "date", window, step=step)
+    assert len(calls) == n_days
+
+
+def test_heuristic_windows_equal_slice_and_fit(dated):
+    model = HeuristicModel(**HEURISTIC).fit_windows(dated, "date", 4,
+                                                    step=3)
+    for first, last, rows in _windows(dated, 4, 3):
+        expected = HeuristicModel(**HEURISTIC).fit(rows)
+        keys = {"window_start": first, "window_end": last}
+        _assert_same(model.window_attribution_, keys,
+                     expected.attribution_model_, key="channel")